@@ -0,0 +1,274 @@
+from AssetTypes import Money, Percent
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from datetime import date
+from functools import lru_cache
+from itertools import islice
+import gc
+import io
+import locale
+import os
+
+# the number of comma-separated fields on each line of an asset file:
+# Asset Description, Location, Purchase Date, Purchase Price, End of Life (EOL), % Value at EOL
+FIELD_COUNT = 6
+
+# the size of the pieces an asset file is split into for a parallel import
+CHUNK_BYTES = 4 * 1024 * 1024
+# the most dates, prices or percents a parallel import keeps to share between records; past it,
+# they are forgotten before the next piece, since prices and percents may all differ
+SHARED_VALUES = 1 << 16
+
+class ImportReport:
+    '''
+    An ImportReport summarizes the import of an asset file: how many lines were read, how many
+    records were added, and which lines could not be parsed (and why), so that a few malformed
+    lines do not abort the whole import.
+    '''
+    def __init__(self) -> None:
+        self.lines_read: int = 0
+        self.records_added: int = 0
+        # (line_number, line, reason) for every malformed line
+        self.errors: list = list()
+    # END __init__()
+
+    def __str__(self) -> str:
+        lines = [f'Read {self.lines_read} lines, added {self.records_added} records, {len(self.errors)} malformed lines.']
+        for line_number, line, reason in self.errors:
+            lines.append(f'    line {line_number}: {reason}: {line!r}')
+        return '\n'.join(lines)
+
+@contextmanager
+def paused_garbage_collection():
+    '''
+    Pauses the cyclic garbage collector for the length of a bulk load.  A load allocates millions
+    of small tuples and none of them form reference cycles, but each allocation still counts
+    toward the next collection, and every collection walks the whole, growing table; pausing it
+    more than doubles the import speed.  Reference counting still frees memory as usual.
+    '''
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+@lru_cache(maxsize=1 << 16)
+def parse_date(text: str) -> date:
+    '''
+    Decodes a date written as year-month-day, such as 2018-4-12 or 2018-04-12.  Asset files
+    repeat the same few dates over and over, so decoded dates are cached.
+    '''
+    year, month, day = text.strip().split('-')
+    return date(int(year), int(month), int(day))
+
+def parse_money(text: str) -> Money:
+    return Money(int(text))
+
+def parse_percent(text: str) -> Percent:
+    return Percent(float(text))
+
+def parse_asset_line(line: str) -> tuple:
+    '''
+    Decodes one line of an asset file into a record for an AssetManagementTable.
+
+    Raises
+    ------
+    ValueError
+        when the line does not hold exactly FIELD_COUNT fields, or a field cannot be decoded
+    '''
+    fields = line.split(', ')
+    if len(fields) != FIELD_COUNT:
+        raise ValueError(f'expected {FIELD_COUNT} fields, found {len(fields)}')
+    description, location, purchase_date, purchase_price, eol_date, value_at_eol = fields
+    # int() and float() ignore the surrounding whitespace, including the newline on the last field
+    return (description, location, parse_date(purchase_date), Money(int(purchase_price)),
+            parse_date(eol_date), Percent(float(value_at_eol)))
+
+def format_asset_line(record: tuple) -> str:
+    '''
+    Encodes a record of an AssetManagementTable as one line of an asset file, the reverse of parse_asset_line().
+    '''
+    description, location, purchase_date, purchase_price, eol_date, value_at_eol = record
+    return f'{description}, {location}, {purchase_date.isoformat()}, {int(purchase_price)}, {eol_date.isoformat()}, {float(value_at_eol)}\n'
+
+def iter_asset_batches(input_file, batch_size: int = 10_000, report: ImportReport = None, first_line_number: int = 1):
+    '''
+    Reads an asset file lazily and yields its records in batches (lists of record tuples), so
+    that memory stays flat whatever the size of the file.  Blank lines are skipped, and
+    malformed lines are recorded in the report instead of stopping the import.
+
+    Parameters
+    ----------
+    input_file : iterable of str
+        an open text file, or any other iterable of lines
+    batch_size : int
+        the largest number of records in each batch
+    report : ImportReport
+        where to count the lines and record the malformed ones
+    first_line_number : int
+        the line number of the first line, for the error report
+    '''
+    if report is None:
+        report = ImportReport()
+    batch = list()
+    line_number = first_line_number - 1
+    for line_number, line in enumerate(input_file, first_line_number):
+        if not line.strip():
+            continue
+        try:
+            batch.append(parse_asset_line(line))
+        except (ValueError, TypeError) as error:
+            report.errors.append((line_number, line.rstrip('\r\n'), str(error)))
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = list()
+    report.lines_read += line_number - first_line_number + 1
+    if batch:
+        yield batch
+
+#######################################################
+# Parallel import
+#######################################################
+
+def split_file(file_name: str, chunk_bytes: int = CHUNK_BYTES) -> list:
+    '''
+    Splits a file into (start, end) byte ranges of roughly chunk_bytes each, with every range
+    starting at the beginning of a line and ending right after a newline (or at the end of the file).
+    '''
+    file_size = os.path.getsize(file_name)
+    chunks = list()
+    with open(file_name, 'rb') as input_file:
+        start = 0
+        while start < file_size:
+            # jump ahead, then move forward to the start of the next line
+            input_file.seek(min(start + chunk_bytes, file_size))
+            input_file.readline()
+            end = min(input_file.tell(), file_size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+@lru_cache(maxsize=1 << 16)
+def parse_ordinal(text: str) -> int:
+    return parse_date(text).toordinal()
+
+def parse_chunk(file_name: str, start: int, end: int, encoding: str = None) -> tuple:
+    '''
+    Decodes the lines in one byte range of an asset file.  This runs in a worker process, so it
+    returns compact columns, which are cheap to send back, rather than records of Money, Percent
+    and date objects: the dates and percents as arrays of raw values, the prices as ints, and the
+    text as strings, in which each Location is a single shared string, sent only once.
+
+    Returns
+    -------
+    tuple
+        (columns, line_count, errors): one column per field, with the dates as ordinals; the number
+        of lines in the range; and (line_number, line, reason) for each malformed line, numbered
+        from 1 at the start of the range
+    '''
+    with open(file_name, 'rb') as input_file:
+        input_file.seek(start)
+        data = input_file.read(end - start)
+    # decode the same way open() does for a serial import, including universal newlines
+    text = io.StringIO(data.decode(encoding or locale.getpreferredencoding(False)), newline=None)
+
+    # a price may be any int, as in a serial import, so only the dates and percents are arrays
+    columns = (list(), list(), array('q'), list(), array('q'), array('d'))
+    descriptions, locations, purchase_dates, purchase_prices, eol_dates, values_at_eol = columns
+    locations_seen = dict()
+    errors = list()
+    line_count = 0
+    for line_count, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = line.split(', ')
+            if len(fields) != FIELD_COUNT:
+                raise ValueError(f'expected {FIELD_COUNT} fields, found {len(fields)}')
+            description, location, purchase_date, purchase_price, eol_date, value_at_eol = fields
+            parsed = (description, locations_seen.setdefault(location, location), parse_ordinal(purchase_date), int(purchase_price), parse_ordinal(eol_date), float(value_at_eol))
+        except (ValueError, TypeError) as error:
+            errors.append((line_count, line.rstrip('\r\n'), str(error)))
+            continue
+        for column, value in zip(columns, parsed):
+            column.append(value)
+    return (columns, line_count, errors)
+
+def iter_asset_batches_parallel(file_name: str, batch_size: int = 10_000, report: ImportReport = None, workers: int = None, chunk_bytes: int = CHUNK_BYTES):
+    '''
+    Reads an asset file in parallel and yields its records in batches, exactly like
+    iter_asset_batches() would for the same file: the same records, in file order, in batches
+    of the same size, and with the same line numbers in the report.
+
+    The file is split at line boundaries into byte ranges that are decoded by a pool of worker
+    processes.  Only a few ranges are in flight at any time, so memory stays bounded however
+    large the file is.  The records are assembled from the decoded columns in this process, in
+    file order, so the table they are added to assigns the same primary keys as a serial import.
+    Assembling them does no per-record work in Python: each distinct date, Money and Percent is
+    created once and shared by the records holding it (as parse_date() shares dates in a serial
+    import), and the columns are zipped into records by map() and zip().  The values kept for
+    sharing are capped at SHARED_VALUES of each kind, so they do not grow with the file.
+
+    Parameters
+    ----------
+    file_name : str
+        the path of the asset file
+    batch_size : int
+        the largest number of records in each batch
+    report : ImportReport
+        where to count the lines and record the malformed ones
+    workers : int
+        the number of worker processes
+        DEFAULT = the number of CPUs (via os.cpu_count())
+    chunk_bytes : int
+        the approximate size of the byte range given to a worker at a time
+    '''
+    if report is None:
+        report = ImportReport()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    encoding = locale.getpreferredencoding(False)
+    chunks = deque(split_file(file_name, chunk_bytes))
+
+    # the shared value for each raw date ordinal, price and percent seen so far, up to SHARED_VALUES of each
+    dates, prices, percents = dict(), dict(), dict()
+    def shared(values: dict, column, make: type) -> map:
+        for raw in set(column).difference(values):
+            values[raw] = make(raw)
+        return map(values.__getitem__, column)
+
+    # imported here, since it takes longer to import than a small file takes to read serially
+    from concurrent.futures import ProcessPoolExecutor
+    batch = list()
+    lines_before = 0
+    with ProcessPoolExecutor(workers) as executor:
+        # keep a couple of ranges per worker in flight, and collect the results in file order
+        pending = deque()
+        while chunks or pending:
+            while chunks and len(pending) < workers * 2:
+                start, end = chunks.popleft()
+                pending.append(executor.submit(parse_chunk, file_name, start, end, encoding))
+            columns, line_count, errors = pending.popleft().result()
+
+            for line_number, line, reason in errors:
+                report.errors.append((lines_before + line_number, line, reason))
+            lines_before += line_count
+
+            descriptions, locations, purchase_dates, purchase_prices, eol_dates, values_at_eol = columns
+            # only emptied between pieces, once the records of the last one are all assembled
+            for values in (dates, prices, percents):
+                if len(values) > SHARED_VALUES:
+                    values.clear()
+            records = zip(descriptions, locations, shared(dates, purchase_dates, date.fromordinal), shared(prices, purchase_prices, Money),
+                          shared(dates, eol_dates, date.fromordinal), shared(percents, values_at_eol, Percent))
+            batch.extend(islice(records, batch_size - len(batch)))
+            while len(batch) >= batch_size:
+                yield batch
+                batch = list(islice(records, batch_size))
+    report.lines_read += lines_before
+    if batch:
+        yield batch
@@ -1,53 +1,338 @@
 from KeyTable import KeyTable
+from Snapshot import TableSnapshot
 from KeySet import Key, KeySet
-from datetime import date
+from Summary import Summary
+from AssetTypes import Money, Percent
+from AssetImport import ImportReport, format_asset_line, iter_asset_batches, iter_asset_batches_parallel, paused_garbage_collection
+from datetime import date, timedelta
 import sys
 import os
 
+class ReplacementReport:
+    '''
+    A ReplacementReport lists the assets that reach their End of Life (EOL) within a window of
+    dates, and the projected cost of replacing them (the sum of their Purchase Prices).
+    '''
+    def __init__(self, start: date, end: date, primary_keys: list, total_cost: int, cost_by_location: dict = None, count: int = None) -> None:
+        '''
+        Parameters
+        ----------
+        start : date
+            the first day of the window
+        end : date
+            the last day of the window
+        primary_keys : list
+            the primary keys of the assets reaching EOL in the window, in EOL order
+        total_cost : int
+            the projected cost of replacing all of those assets
+        cost_by_location : dict
+            {location: projected cost}, or None if the report was not grouped by location
+        count : int
+            the number of leading primary_keys that are in the window, when the list is shared
+            by the reports of several windows; see AssetManagementTable.replacement_windows()
+            DEFAULT = all of them
+        '''
+        self.start: date = start
+        self.end: date = end
+        self.__primary_keys: list = primary_keys
+        self.__count: int = len(primary_keys) if count is None else count
+        self.total_cost = Money(total_cost)
+        self.cost_by_location: dict = None if cost_by_location is None else {location: Money(cost) for location, cost in cost_by_location.items()}
+    # END __init__()
+
+    @property
+    def primary_keys(self) -> list:
+        '''
+        The primary keys of the assets reaching EOL in the window, in EOL order.
+        '''
+        if self.__count == len(self.__primary_keys):
+            return self.__primary_keys
+        return self.__primary_keys[:self.__count]
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    def __str__(self) -> str:
+        lines = [f'Assets reaching EOL from {self.start} to {self.end}: {self.count}, projected cost {self.total_cost}']
+        if self.cost_by_location is not None:
+            for location, cost in sorted(self.cost_by_location.items(), key=lambda item: str(item[0])):
+                lines.append(f'    {str(location):20s}\t{cost}')
+        return '\n'.join(lines)
+
+def end_of_month(day: date, months_ahead: int = 0) -> date:
+    '''
+    Returns the last day of the month that is months_ahead months after the month of day.
+    '''
+    month_index = day.year * 12 + day.month - 1 + months_ahead + 1
+    return date(month_index // 12, month_index % 12 + 1, 1) - timedelta(days=1)
+
+def month_of(day: date) -> str:
+    '''
+    Returns the month of a date as 'YYYY-MM', which sorts in calendar order.
+    '''
+    return f'{day.year:04d}-{day.month:02d}'
+
 class AssetManagementTable(KeyTable):
-    def __init__(self, primary_key_set = KeySet(0, 99999)) -> None:
+    def __init__(self, primary_key_set = None, storage: str = 'rows', concurrent: bool = False) -> None:
         categories = ('Asset Description', 'Location', 'Purchase Date', 'Purchase Price', 'End of Life (EOL)', '% Value at EOL')
-        super().__init__(categories, primary_key_set=primary_key_set)
+        super().__init__(categories, primary_key_set=primary_key_set, storage=storage, concurrent=concurrent)
+
+        # replacement reports walk the assets in EOL order instead of scanning every record
+        self.create_index('End of Life (EOL)', 'sorted')
+
+        # roll-ups kept current with every change, by name; see register_summary()
+        self.__summaries = dict()
+        self.register_summary('eol_by_month', sum='Purchase Price', month=('End of Life (EOL)', month_of))
+        self.register_summary('cost_by_location', 'Location', sum='Purchase Price')
+
+    @classmethod
+    def new_empty(cls, categories: tuple, primary_key_set: KeySet, storage: str = 'rows', concurrent: bool = False) -> 'AssetManagementTable':
+        # the categories of an AssetManagementTable are always the same
+        return cls(primary_key_set, storage, concurrent)
+
+    def register_summary(self, name: str, *categories: str, sum = (), mean = (), **derived: tuple) -> Summary:
+        '''
+        Registers a roll-up of the assets that is kept current as assets are added, updated and
+        removed, so that reading it costs O(1) whatever the number of assets; see Summary.
+        To replace a summary, drop it first with drop_summary().  Every AssetManagementTable
+        starts with two summaries:
+            'eol_by_month'       the count and cost of the assets reaching EOL in each month ('YYYY-MM')
+            'cost_by_location'   the count and cost of the assets at each Location
+
+        Parameters
+        ----------
+        name : str
+            the name to read the summary back with; see summary()
+        *categories : str
+            the categories whose values make up the groups
+        sum : str or tuple of str
+            the categories to total
+        mean : str or tuple of str
+            the categories to average
+        **derived : tuple
+            {name: (category, function)} for groups made of function(value of category)
+
+        Raises
+        ------
+        ValueError
+            when the name is empty, or a summary is already registered under it
+        '''
+        if not isinstance(name, str) or not name:
+            raise ValueError(f'ERROR: {name!r} is not a summary name, expected a non-empty string.')
+        # the summary starts out with every asset, so no change may slip in before it is registered
+        with self.paused_writes():
+            if name in self.__summaries:
+                raise ValueError(f'ERROR: {name!r} is already a summary of this table; drop it first to replace it.')
+            summary = Summary(self, categories, derived, sum=sum, mean=mean)
+            self.__summaries[name] = summary
+            self.add_listener(summary)
+        return summary
+
+    def drop_summary(self, name: str) -> None:
+        summary = self.__summaries.pop(name, None)
+        if summary is not None:
+            self.remove_listener(summary)
+
+    def summary(self, name: str) -> Summary:
+        '''
+        Returns a registered summary by name.
+
+        Raises
+        ------
+        KeyError
+            when no summary was registered under that name
+        '''
+        if name not in self.__summaries:
+            raise KeyError(f'ERROR: {name!r} is not a summary of this table, expected one of {tuple(self.__summaries)}.')
+        return self.__summaries[name]
+
+    @property
+    def summaries(self) -> dict:
+        return dict(self.__summaries)
+
+    def rebuild_summaries(self) -> None:
+        '''
+        Computes every registered summary again from the current assets.
+        '''
+        with self.paused_writes():
+            for summary in self.__summaries.values():
+                summary.rebuild(self)
+
+    def replacement_report(self, end: date, start: date = None, by_location: bool = False, snapshot: TableSnapshot = None) -> ReplacementReport:
+        '''
+        Reports the assets reaching their End of Life (EOL) between start and end (both inclusive),
+        and the projected cost of replacing them.
+
+        Parameters
+        ----------
+        end : date
+            the deadline of the report
+        start : date
+            the first day of the report
+            DEFAULT = today
+        by_location : bool
+            also break the projected cost down by Location
+        snapshot : TableSnapshot
+            report on a snapshot of the table (see KeyTable.snapshot()) instead of the live table
+        '''
+        return self.replacement_windows(end, start=start, by_location=by_location, snapshot=snapshot)[0]
+
+    def replacement_windows(self, *deadlines: date, start: date = None, by_location: bool = False, snapshot: TableSnapshot = None) -> list:
+        '''
+        Reports on several rolling windows that all begin on the same day, such as "by the end of
+        this month" and "by the end of the quarter", in a single pass over the assets in EOL order.
+        Each window includes the assets of the shorter windows.
+
+        Parameters
+        ----------
+        *deadlines : date
+            the last day of each window
+        start : date
+            the first day of every window
+            DEFAULT = today
+        by_location : bool
+            also break the projected costs down by Location
+        snapshot : TableSnapshot
+            report on a snapshot of the table (see KeyTable.snapshot()) instead of the live table,
+            such as for a long report that should not see the changes made while it runs
+
+        Returns
+        -------
+        list
+            one ReplacementReport per deadline, in the order the deadlines were given
+        '''
+        if start is None:
+            start = date.today()
+        ordered_deadlines = sorted(set(deadlines))
+        if not ordered_deadlines or ordered_deadlines[-1] < start:
+            return [ReplacementReport(start, deadline, [], 0, dict() if by_location else None) for deadline in deadlines]
+
+        # sort every asset in the widest window into the first (shortest) window that holds it
+        window_keys = [list() for deadline in ordered_deadlines]
+        window_costs = [0] * len(ordered_deadlines)
+        window_locations = [dict() for deadline in ordered_deadlines]
+        window = 0
+        if snapshot is None:
+            records = self.records
+            primary_keys = self.indexes['End of Life (EOL)'].between(start, ordered_deadlines[-1])
+        else:
+            # a snapshot has no indexes, so the assets of the widest window are sorted by EOL here
+            records = snapshot.records
+            in_window = snapshot.find_between('End of Life (EOL)', start, ordered_deadlines[-1])
+            primary_keys = sorted(in_window, key=lambda primary_key: (in_window[primary_key]['End of Life (EOL)'], primary_key))
+        # the index of a concurrent table may list an asset removed or moved since the records were taken
+        for primary_key, record in records.pick(primary_keys).items():
+            eol = record['End of Life (EOL)']
+            if eol is None or not start <= eol <= ordered_deadlines[-1]:
+                continue
+            # the assets arrive in EOL order, so the window only ever moves forward
+            while eol > ordered_deadlines[window]:
+                window += 1
+            window_keys[window].append(primary_key)
+            price = record['Purchase Price'] or 0
+            window_costs[window] += price
+            if by_location:
+                location = record['Location']
+                window_locations[window][location] = window_locations[window].get(location, 0) + price
+
+        # each window also includes everything in the windows before it, so the reports share one
+        # list of primary keys in EOL order, each of them up to the end of its own window
+        reports = dict()
+        primary_keys = list()
+        total_cost = 0
+        cost_by_location = dict()
+        for window, deadline in enumerate(ordered_deadlines):
+            primary_keys.extend(window_keys[window])
+            total_cost += window_costs[window]
+            for location, cost in window_locations[window].items():
+                cost_by_location[location] = cost_by_location.get(location, 0) + cost
+            reports[deadline] = ReplacementReport(start, deadline, primary_keys, total_cost, dict(cost_by_location) if by_location else None,
+                                                  count=len(primary_keys))
+        return [reports[deadline] for deadline in deadlines]
+    # END replacement_windows()
+
+    def replacement_outlook(self, months: tuple = (1, 3, 6, 12), start: date = None, by_location: bool = False, snapshot: TableSnapshot = None) -> list:
+        '''
+        Reports on the assets reaching EOL by the end of this month, within 3 months, and so on.
+        A window of n months ends on the last day of the (n-1)th calendar month after the month of start.
+
+        Parameters
+        ----------
+        months : tuple
+            the length of each window, in calendar months
+        start : date
+            the first day of every window
+            DEFAULT = today
+        by_location : bool
+            also break the projected costs down by Location
+        snapshot : TableSnapshot
+            report on a snapshot of the table (see KeyTable.snapshot()) instead of the live table
+        '''
+        if start is None:
+            start = date.today()
+        return self.replacement_windows(*(end_of_month(start, month - 1) for month in months), start=start, by_location=by_location, snapshot=snapshot)
     
-    def append_records_from_txt_file(self, file_path:str, file_name:str) -> None:
+    def replacement_cost_rollup(self, by_location: bool = True, snapshot: TableSnapshot = None):
+        '''
+        Rolls up the assets by month of End of Life (EOL), and by Location unless by_location is
+        False, with the number of assets, their total replacement cost and their average
+        % Value at EOL in each group.  Returns a Table with one record per group; see GroupBy.
+        The roll-up is of a snapshot of the table instead, when one is given (see KeyTable.snapshot()).
+        '''
+        categories = ('Location',) if by_location else ()
+        return (self if snapshot is None else snapshot).group_by(*categories, month=('End of Life (EOL)', month_of)).agg(sum='Purchase Price', mean='% Value at EOL')
+
+    def append_records_from_txt_file(self, file_path:str, file_name:str, batch_size: int = 10_000, workers: int = 1) -> ImportReport:
+        '''
+        Appends the records of an asset file (file_path/file_name.txt) to the table.  The file is
+        read lazily and its records are added in batches through the bulk-insert path, so memory
+        stays flat whatever the size of the file.  Malformed lines are skipped and listed in the
+        returned ImportReport instead of aborting the load.
+
+        Parameters
+        ----------
+        file_path : str
+            the directory holding the file
+        file_name : str
+            the name of the file, without its .txt extension
+        batch_size : int
+            the number of records added to the table at a time
+        workers : int
+            the number of processes decoding the file; with more than one, the file is split at
+            line boundaries and decoded in parallel, and the resulting table (records, primary
+            keys and error report) is the same as with a serial import
+            DEFAULT = 1, a serial import
+        '''
+        report = ImportReport()
+        full_path = os.path.join(file_path, f'{file_name}.txt')
         try:
-            with open(f'{file_path}\\{file_name}.txt') as input_file:
-                raw_input = input_file.readlines()
-                for raw_line in raw_input:
-                    fields = raw_line.split(', ')
-                    description = fields[0]
-                    location = fields[1]
-                    raw_purchase_date = [int(number) for number in fields[2].split('-')]
-                    purchase_year = raw_purchase_date[0]
-                    purchase_month = raw_purchase_date[1]
-                    purchase_day = raw_purchase_date[2]
-                    purchase_date = date(purchase_year, purchase_month, purchase_day)
-                    purchase_price = Money(int(fields[3]))
-                    raw_eol = [int(number) for number in fields[4].split('-')]
-                    eol_year = raw_eol[0]
-                    eol_month = raw_eol[1]
-                    eol_day = raw_eol[2]
-                    eol_date = date(eol_year, eol_month, eol_day)
-                    value_at_eol = Percent(float(fields[5]))
-                    self.add_records((description, location, purchase_date, purchase_price, eol_date, value_at_eol))
+            if workers > 1:
+                # open the file here too, so that a missing file is reported the same way
+                open(full_path).close()
+                with paused_garbage_collection():
+                    for batch in iter_asset_batches_parallel(full_path, batch_size, report, workers):
+                        self.add_records(tuple(batch))
+                        report.records_added += len(batch)
+            else:
+                with open(full_path) as input_file, paused_garbage_collection():
+                    for batch in iter_asset_batches(input_file, batch_size, report):
+                        self.add_records(tuple(batch))
+                        report.records_added += len(batch)
         except FileNotFoundError:
             print(f'\nFailed to append from {file_path}{file_name}.txt, no such file was found!\n')
+        if report.errors:
+            print(f'\n{len(report.errors)} malformed lines in {file_name}.txt were skipped, see the import report.\n')
+        return report
     
     def write_table_to_txt_file(self, file_path:str, file_name:str) -> None:
         
-        for line, record in enumerate(self.__records.values()):
-            print f'{record}'
-        with open(f'{file_path}\\{file_name}', 'a') as output_file:
-            output_file.writelines(output)
-
-class Money(int):
-    def __str__(self) -> str:
-        return f'${self.__int__():>10,}'
-import datetime
-
-class Percent(float):
-    def __str__(self) -> str:
-        return f'{self.__float__():.2%}'
+        # write each record in the same format that append_records_from_txt_file() reads, from a
+        # snapshot, so that records may go on being added while the file is written; the lines are
+        # formatted as they are written, so the whole file is never held in memory
+        snapshot = self.snapshot()
+        with open(os.path.join(file_path, f'{file_name}.txt'), 'a') as output_file:
+            output_file.writelines(format_asset_line(record) for record in snapshot.records.values())
 
 
 #######################################################
@@ -67,6 +352,17 @@ if __name__ == '__main__':
     my_assets.add_records(some_records)
     print(my_assets)
 
+    print('\nReplacement report through 2022:')
+    print(my_assets.replacement_report(date(2022, 12, 31), start=date(2022, 1, 1), by_location=True))
+
+    print('\nReplacement cost by Location and month of EOL:')
+    print(my_assets.replacement_cost_rollup())
+
+    print('\nReplacement cost by month of EOL, kept current as assets change:')
+    print(my_assets.summary('eol_by_month'))
+    my_assets.update_record(1, {'Location': 'Accounting'})
+    print(my_assets.summary('cost_by_location')['Accounting'])
+
     print('\nAdding multiple records by appending from a .txt file:')
     my_assets.append_records_from_txt_file(os.path.realpath('.'), 'assets')
     print(my_assets)
@@ -0,0 +1,7 @@
+class Money(int):
+    def __str__(self) -> str:
+        return f'${self.__int__():>10,}'
+
+class Percent(float):
+    def __str__(self) -> str:
+        return f'{self.__float__():.2%}'
@@ -0,0 +1,465 @@
+from TableFile import _fsync_directory, decode_value, encode_value, load_table, read_header, write_table_file, TableFileError, UnsupportedValue
+from threading import Thread
+from zlib import crc32
+import glob
+import os
+import struct
+import time
+
+'''
+A ChangeLog makes a KeyTable durable without rewriting the whole table on every change.
+
+The table lives in two kinds of files next to each other:
+    <file_name>                  a snapshot of the table in the TableFile format, whose header
+                                 records the last change it includes (last_lsn) and the first
+                                 log segment that is newer than it (segment)
+    <file_name>.000001.log ...   log segments, each an append-only sequence of entries:
+        length   4 bytes   unsigned, little-endian, of the payload
+        crc      4 bytes   crc32 of the payload
+        payload            (lsn, operation, arguments), where operation is one of
+                               'add'     (primary_keys, records, next_key)
+                               'update'  (primary_key, record)
+                               'remove'  (primary_key,)
+                           see _encode_entry(); the values are stored with the tagged encoding of
+                           TableFile.encode_value(), so reading a log never unpickles anything
+
+Each change is written to the current segment as soon as it is made, and fsync'd in batches:
+once sync_every changes or sync_interval seconds have passed since the last fsync.  Opening the
+table loads the snapshot and replays only the entries written after it.  Compaction writes a new
+snapshot in a background thread, then deletes the segments it has made obsolete.
+
+A snapshot is written to a temporary file, fsync'd and renamed over the old one (see
+write_table_file()), and only then are the segments it makes obsolete deleted; until the rename,
+the old snapshot and its segments are untouched, and after it, the new snapshot's header tells
+which segments it makes obsolete, so a crash at any point loses no change that was fsync'd.
+'''
+
+MAGIC = b'PYTLOG02'
+# the signature of the segments written before entries were encoded without pickle
+PICKLED_MAGIC = b'PYTLOG01'
+ENTRY_HEADER = struct.Struct('<II')
+# the lsn and operation that start the payload of an entry, then the length of each value after them
+ENTRY_START = struct.Struct('<Qc')
+VALUE_LENGTH = struct.Struct('<I')
+OPERATION_CODES = {'add': b'a', 'update': b'u', 'remove': b'r'}
+OPERATIONS = {code: operation for operation, code in OPERATION_CODES.items()}
+
+class ChangeLog:
+    '''
+    A ChangeLog is a listener of a KeyTable (see KeyTable.add_listener()) that appends every add,
+    update and remove to a log file.  Use create() to start logging a table, and open() to load
+    a logged table again.
+    '''
+    def __init__(self, table, file_name: str, segment: int, lsn: int, sync_every: int = 64,
+                 sync_interval: float = 1.0, compact_bytes: int = 64 * 2**20) -> None:
+        '''
+        Parameters
+        ----------
+        table : KeyTable
+            the table to log, or None to append to the log directly
+        file_name : str
+            the path of the table's snapshot
+        segment : int
+            the number of the log segment to append to
+        lsn : int
+            the log sequence number of the last change already in the snapshot or the log
+        sync_every : int
+            the number of changes written between two fsyncs
+        sync_interval : float
+            the number of seconds after which written changes are fsync'd at the next change
+        compact_bytes : int
+            the size of the log above which compact() is started automatically, or None to never
+        '''
+        self.table = table
+        self.file_name: str = file_name
+        self.sync_every: int = sync_every
+        self.sync_interval: float = sync_interval
+        self.compact_bytes: int = compact_bytes
+        self._lsn: int = lsn
+        self._unsynced: int = 0
+        self._last_sync: float = time.monotonic()
+        self._compaction: Thread = None
+        self._log_bytes: int = sum(os.path.getsize(name) for name, number in _segments(file_name))
+        self._open_segment(segment)
+        # without a table, the log can only be appended to directly; see append_only()
+        if table is not None:
+            table.add_listener(self)
+    # END __init__()
+
+    @classmethod
+    def create(cls, table, file_name: str, **options) -> 'ChangeLog':
+        '''
+        Saves a snapshot of a table and starts logging its changes.  Any older snapshot and log
+        segments under the same file name are replaced, but only once the new snapshot is safely
+        on disk: the new log starts at a segment after all of the old ones, so that a crash at
+        any point leaves either the old snapshot with its whole log, or the new snapshot, which
+        ignores the old segments.
+        '''
+        old_segments = _segments(file_name)
+        segment = old_segments[-1][1] + 1 if old_segments else 1
+        # no change to a concurrent table may fall between the snapshot and the start of the log
+        with table.paused_writes():
+            write_table_file(file_name, table, *_rows_of(table.records), extra_header={'last_lsn': 0, 'segment': segment})
+            for name, number in old_segments:
+                os.remove(name)
+            return cls(table, file_name, segment, 0, **options)
+
+    @classmethod
+    def open(cls, file_name: str, storage: str = None, concurrent: bool = False, **options) -> 'ChangeLog':
+        '''
+        Loads a logged table from its snapshot and replays the changes logged since then.  A log
+        entry that was only partly written, as by a crash, ends the log and is discarded.
+        The table is available as the table attribute of the returned ChangeLog.
+        '''
+        table = load_table(file_name, storage, concurrent=concurrent)
+        header = read_header(file_name)
+        lsn = header.get('last_lsn', 0)
+        for segment, lsn, operation, arguments in _log_entries(file_name, header):
+            _replay(table, operation, arguments)
+        return cls(table, file_name, _last_segment(file_name, header), lsn, **options)
+    # END open()
+
+    @classmethod
+    def append_only(cls, file_name: str, **options) -> 'ChangeLog':
+        '''
+        Opens the log of a table for appending, without loading the table; see log_add().
+        '''
+        header = read_header(file_name)
+        lsn = header.get('last_lsn', 0)
+        for segment, lsn, operation, arguments in _log_entries(file_name, header):
+            pass
+        return cls(None, file_name, _last_segment(file_name, header), lsn, **options)
+
+    def _open_segment(self, segment: int) -> None:
+        self._segment: int = segment
+        segment_name = _segment_name(self.file_name, segment)
+        self._file = open(segment_name, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+            # a new segment only survives a crash once the directory entry for it does
+            os.fsync(self._file.fileno())
+            _fsync_directory(segment_name)
+
+    def _append(self, operation: str, arguments: tuple) -> None:
+        self._lsn += 1
+        payload = _encode_entry(self._lsn, operation, arguments)
+        self._file.write(ENTRY_HEADER.pack(len(payload), crc32(payload)) + payload)
+        # the entry reaches the operating system right away, so it survives the process crashing;
+        # the fsync that makes it survive the machine crashing is shared by a batch of entries
+        self._file.flush()
+        self._log_bytes += ENTRY_HEADER.size + len(payload)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        if self.table is not None and self.compact_bytes is not None and self._log_bytes > self.compact_bytes and not self.compacting:
+            self.compact()
+
+    def sync(self) -> None:
+        '''
+        Forces every change written so far onto the disk.
+        '''
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # the listener interface of KeyTable
+    def add_many(self, pairs) -> None:
+        primary_keys = [primary_key for primary_key, record in pairs]
+        records = [tuple(record) for primary_key, record in pairs]
+        self.log_add(primary_keys, records, self.table.primary_key_set.next_key)
+
+    def log_add(self, primary_keys: list, records: list, next_key: int) -> None:
+        '''
+        Logs records added under the given primary keys, and the next key of the table's KeySet after adding them.
+        '''
+        self._append('add', (primary_keys, records, next_key))
+
+    def update(self, primary_key: int, old_record, new_record) -> None:
+        self._append('update', (primary_key, tuple(new_record)))
+
+    def remove(self, primary_key: int, record) -> None:
+        self._append('remove', (primary_key,))
+
+    def compact(self, background: bool = True) -> None:
+        '''
+        Writes a new snapshot of the table and deletes the log segments it makes obsolete.
+        Changes go to a new log segment from now on; a snapshot of the records is taken as they
+        are now (see KeyTable.snapshot()), in O(1), and the snapshot file is written from it, in
+        a background thread unless background is False, while the table goes on changing.
+        A concurrent table may hold changes that are not logged yet, so its writers are paused
+        while the log is switched and the snapshot taken; in the background thread, since a
+        compaction can be started by one of the writers.
+        '''
+        self.wait_for_compaction()
+        if self.table.concurrent:
+            if background:
+                self._compaction = Thread(target=self._compact_paused, daemon=True)
+                self._compaction.start()
+            else:
+                self._compact_paused()
+            return
+        arguments = self._switch_segment()
+        if background:
+            self._compaction = Thread(target=_write_snapshot, args=arguments, daemon=True)
+            self._compaction.start()
+        else:
+            _write_snapshot(*arguments)
+    # END compact()
+
+    def _compact_paused(self) -> None:
+        with self.table.paused_writes():
+            arguments = self._switch_segment()
+        _write_snapshot(*arguments)
+
+    def _switch_segment(self) -> tuple:
+        '''
+        Starts a new log segment, and returns the arguments of _write_snapshot() for the records
+        and KeySet as of the end of the previous segment.
+        '''
+        self.sync()
+        self._file.close()
+        self._open_segment(self._segment + 1)
+        self._log_bytes = os.path.getsize(_segment_name(self.file_name, self._segment))
+
+        key_set = self.table.primary_key_set
+        extra_header = {
+            'last_lsn': self._lsn,
+            'segment': self._segment,
+            'key_set': {'minimum': key_set.minimum_valid_key, 'maximum': key_set.maximum_valid_key,
+                        'pad_to': key_set.pad_to, 'next_key': key_set.next_key},
+            'indexes': {category: index.kind for category, index in self.table.indexes.items()},
+        }
+        return (self.file_name, self.table, self.table.snapshot().records, extra_header, self._segment)
+
+    @property
+    def compacting(self) -> bool:
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def wait_for_compaction(self) -> None:
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    @property
+    def lsn(self) -> int:
+        return self._lsn
+
+    def close(self) -> None:
+        '''
+        Syncs the log, waits for a compaction in progress, and stops logging the table, returning
+        the primary keys that its threads reserved but did not use.
+        '''
+        self.sync()
+        self._file.close()
+        self.wait_for_compaction()
+        if self.table is not None:
+            self.table.remove_listener(self)
+            self.table.release_reserved_keys()
+
+    def __enter__(self) -> 'ChangeLog':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+def _segment_name(file_name: str, segment: int) -> str:
+    return f'{file_name}.{segment:06d}.log'
+
+def _segments(file_name: str) -> list:
+    '''
+    Returns (name, number) for each log segment of a snapshot, in order.
+    '''
+    segments = list()
+    for name in glob.glob(glob.escape(file_name) + '.*.log'):
+        number = name[len(file_name) + 1:-len('.log')]
+        if number.isdecimal():
+            segments.append((name, int(number)))
+    return sorted(segments, key=lambda segment: segment[1])
+
+def _log_entries(file_name: str, header: dict, repair: bool = True):
+    '''
+    Yields (segment, lsn, operation, arguments) for each change logged after a snapshot was
+    written, given the header of the snapshot.
+    '''
+    lsn = header.get('last_lsn', 0)
+    for name, number in _segments(file_name):
+        if number < header.get('segment', 1):
+            continue
+        for entry_lsn, operation, arguments in _read_segment(name, repair):
+            if entry_lsn > lsn:
+                lsn = entry_lsn
+                yield number, entry_lsn, operation, arguments
+
+def _last_segment(file_name: str, header: dict) -> int:
+    '''
+    Returns the number of the log segment that new changes are appended to.
+    '''
+    segments = _segments(file_name)
+    return max(header.get('segment', 1), segments[-1][1] if segments else 0)
+
+def read_changes(file_name: str, header: dict = None) -> tuple:
+    '''
+    Reads the changes logged after the snapshot of a table, without loading the table or
+    modifying the log, for looking records up straight from the files.
+
+    Returns
+    -------
+    changes : dict
+        {primary_key: record tuple, or None for a removed record}, for every record changed
+    next_key : int
+        the next key of the table's KeySet after the last record was added, or None if none were
+    '''
+    header = read_header(file_name) if header is None else header
+    changes = dict()
+    next_key = None
+    for segment, lsn, operation, arguments in _log_entries(file_name, header, repair=False):
+        if operation == 'add':
+            primary_keys, records, next_key = arguments
+            changes.update(zip(primary_keys, records))
+        elif operation == 'update':
+            primary_key, record = arguments
+            changes[primary_key] = record
+        elif operation == 'remove':
+            changes[arguments[0]] = None
+    return changes, next_key
+
+def _rows_of(records) -> tuple:
+    primary_keys = sorted(records)
+    return primary_keys, [records[primary_key] for primary_key in primary_keys]
+
+def _write_snapshot(file_name: str, table, records, extra_header: dict, segment: int) -> None:
+    write_table_file(file_name, table, *_rows_of(records), extra_header)
+    # the snapshot is on disk and holds everything logged before this segment, so the older segments can go
+    for name, number in _segments(file_name):
+        if number < segment:
+            os.remove(name)
+
+def _encode_entry(lsn: int, operation: str, arguments: tuple) -> bytes:
+    '''
+    Encodes the payload of a log entry: its lsn and operation, then its arguments as a flat
+    sequence of values, each its length and then its TableFile.encode_value() encoding:
+        'add'     next_key, the number of records, their primary keys, then for each record
+                  its number of fields and its fields
+        'update'  primary_key, then the fields of the record
+        'remove'  the primary keys
+
+    Raises
+    ------
+    UnsupportedValue : Exception
+        when a record holds a value that a table file cannot store
+    '''
+    if operation == 'add':
+        primary_keys, records, next_key = arguments
+        values = [next_key, len(primary_keys), *primary_keys]
+        for record in records:
+            values.append(len(record))
+            values.extend(record)
+    elif operation == 'update':
+        primary_key, record = arguments
+        values = [primary_key, *record]
+    else:
+        values = arguments
+    pieces = [ENTRY_START.pack(lsn, OPERATION_CODES[operation])]
+    for value in values:
+        piece = encode_value(value)
+        if piece is None:
+            raise UnsupportedValue('the change log', value)
+        pieces.append(VALUE_LENGTH.pack(len(piece)))
+        pieces.append(piece)
+    return b''.join(pieces)
+
+def _decode_entry(payload: bytes) -> tuple:
+    '''
+    Decodes the payload of a log entry into (lsn, operation, arguments), the reverse of
+    _encode_entry().  Raises ValueError (or a struct.error, KeyError or IndexError) for a
+    payload that is not one.
+    '''
+    lsn, code = ENTRY_START.unpack_from(payload)
+    operation = OPERATIONS[code]
+    view = memoryview(payload)
+    values = list()
+    position = ENTRY_START.size
+    while position < len(view):
+        length, = VALUE_LENGTH.unpack_from(view, position)
+        position += VALUE_LENGTH.size
+        if not length or position + length > len(view):
+            raise ValueError('a value runs past the end of the entry')
+        values.append(decode_value(view[position:position + length]))
+        position += length
+    if operation == 'add':
+        next_key, count = values[0], values[1]
+        primary_keys = values[2:2 + count]
+        records = list()
+        position = 2 + count
+        while position < len(values):
+            field_count = values[position]
+            records.append(tuple(values[position + 1:position + 1 + field_count]))
+            position += 1 + field_count
+        if len(primary_keys) != count or len(records) != count or position != len(values):
+            raise ValueError('the records do not match their primary keys')
+        return lsn, operation, (primary_keys, records, next_key)
+    if operation == 'update':
+        return lsn, operation, (values[0], tuple(values[1:]))
+    return lsn, operation, tuple(values)
+
+def _read_segment(segment_name: str, repair: bool = True):
+    '''
+    Yields the (lsn, operation, arguments) entries of a log segment.  Unless repair is False,
+    the segment is truncated after the last complete entry, so that new entries are not
+    appended after a torn one.
+    '''
+    with open(segment_name, 'r+b' if repair else 'rb') as segment:
+        magic = segment.read(len(MAGIC))
+        if magic == PICKLED_MAGIC:
+            raise TableFileError(segment_name, 'it is a change log whose entries were pickled, which is no longer read')
+        if magic != MAGIC:
+            raise TableFileError(segment_name, 'it does not start with the change log signature')
+        good_end = segment.tell()
+        while True:
+            entry_header = segment.read(ENTRY_HEADER.size)
+            if len(entry_header) < ENTRY_HEADER.size:
+                break
+            length, checksum = ENTRY_HEADER.unpack(entry_header)
+            payload = segment.read(length)
+            if len(payload) < length or crc32(payload) != checksum:
+                break
+            # a torn entry fails its checksum; one that passes it but does not decode was not written by a ChangeLog
+            try:
+                entry = _decode_entry(payload)
+            except (ValueError, TypeError, KeyError, IndexError, struct.error, UnicodeDecodeError) as error:
+                raise TableFileError(segment_name, f'the entry at byte {good_end} is not a change log entry ({error})') from None
+            yield entry
+            good_end = segment.tell()
+        if repair:
+            segment.truncate(good_end)
+
+def _replay(table, operation: str, arguments: tuple) -> None:
+    if operation == 'add':
+        primary_keys, records, next_key = arguments
+        table.restore_records(primary_keys, records)
+        table.primary_key_set.next_key = next_key
+    elif operation == 'update':
+        primary_key, record = arguments
+        table.update_record(primary_key, dict(zip(table.categories, record)))
+    elif operation == 'remove':
+        table.remove_records(*arguments)
+
+#######################################################
+#Testing code:
+#######################################################
+if __name__ == '__main__':
+    from AssetManagementTable import AssetManagementTable
+    from tempfile import gettempdir
+
+    file_name = os.path.join(gettempdir(), 'assets.table')
+    my_table = AssetManagementTable()
+    my_table.append_records_from_txt_file('', 'assets')
+    with ChangeLog.create(my_table, file_name) as change_log:
+        my_table.update_record(1, {'Location': 'Accounting'})
+        my_table.remove_records(2)
+
+    with ChangeLog.open(file_name) as change_log:
+        print(change_log.table)
+        change_log.compact(background=False)
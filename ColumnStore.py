@@ -0,0 +1,502 @@
+from array import array
+from collections.abc import MutableMapping
+from datetime import date
+
+# NumPy is optional: when it is installed the typed columns are scanned as NumPy arrays,
+# otherwise the same scans fall back to plain Python loops over the arrays
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Column:
+    '''
+    A Column holds every value of one table category in a compact, typed form.  The kind of the
+    column is chosen from the first value stored in it:
+
+        'int'    : array('q') of int64, rebuilt with the original int type (e.g. Money) on access
+        'date'   : array('i') of int32 date ordinals, rebuilt with date.fromordinal() on access
+        'float'  : array('d') of float64, rebuilt with the original float type (e.g. Percent) on access
+        'str'    : dictionary encoded, an array('i') of codes into a list of the distinct strings
+        'object' : a plain list, for any other type
+
+    If a later value does not have exactly the same type as the first one (a None, a datetime,
+    an int that does not fit in 64 bits...), the column falls back to an 'object' column so that
+    every value is still returned unchanged.
+    '''
+    TYPECODES = {'int': 'q', 'date': 'i', 'float': 'd', 'str': 'i'}
+    NUMPY_TYPES = {'q': 'int64', 'i': 'int32', 'd': 'float64'}
+
+    def __init__(self) -> None:
+        self._kind: str = None
+        self._type: type = None
+        self._data = None
+        self._dictionary: list = None
+        self._lookup: dict = None
+    # END __init__()
+
+    @staticmethod
+    def kind_of(value) -> str:
+        '''
+        Returns the kind of column that would be used to store the given value.
+        '''
+        value_type = type(value)
+        if issubclass(value_type, bool):
+            return 'object'
+        if issubclass(value_type, int):
+            return 'int'
+        # datetime is a subclass of date, but its time of day would be lost as an ordinal
+        if value_type is date:
+            return 'date'
+        if issubclass(value_type, float):
+            return 'float'
+        if issubclass(value_type, str):
+            return 'str'
+        return 'object'
+
+    def __start(self, value) -> None:
+        # the first value decides the kind and the type of the column
+        self._kind = self.kind_of(value)
+        self._type = type(value)
+        if self._kind == 'object':
+            self._data = list()
+        else:
+            self._data = array(self.TYPECODES[self._kind])
+        if self._kind == 'str':
+            self._dictionary = list()
+            self._lookup = dict()
+
+    def __degrade(self) -> None:
+        # rebuild the column as a plain list of its values, which accepts any type
+        self._data = list(self)
+        self._kind = 'object'
+        self._dictionary = None
+        self._lookup = None
+
+    def __code(self, value: str) -> int:
+        # dictionary encoding: every distinct string is stored once and referred to by its position
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self._dictionary)
+            self._dictionary.append(value)
+        return code
+
+    def code_of(self, value: str) -> int:
+        '''
+        Returns the code of a string in a 'str' column, or None if the column does not hold it.
+        '''
+        return self._lookup.get(value)
+
+    def encode(self, value):
+        '''
+        Converts a value of this column's type to the raw number stored in the typed array.
+        '''
+        if self._kind == 'date':
+            return value.toordinal()
+        if self._kind == 'str':
+            return self.__code(value)
+        return value
+
+    def decode(self, raw):
+        '''
+        Converts a raw number from the typed array back to a value of this column's type.
+        '''
+        if self._kind == 'date':
+            return date.fromordinal(raw)
+        if self._kind == 'str':
+            return self._dictionary[raw]
+        if self._kind == 'object' or self._type is int or self._type is float:
+            return raw
+        return self._type(raw)
+
+    def append(self, value) -> None:
+        self.extend((value,))
+
+    def extend(self, values) -> None:
+        values = values if isinstance(values, (list, tuple)) else list(values)
+        if not values:
+            return
+        if self._kind is None:
+            self.__start(values[0])
+
+        # a value of any other type turns this into an object column
+        if self._kind != 'object' and any(type(value) is not self._type for value in values):
+            self.__degrade()
+
+        if self._kind == 'object':
+            self._data.extend(values)
+            return
+
+        # encode the whole batch before extending, so that an int too large for int64 leaves the column unchanged
+        try:
+            if self._kind in ('int', 'float'):
+                encoded = array(self._data.typecode, values)
+            else:
+                encoded = array(self._data.typecode, map(self.encode, values))
+        except OverflowError:
+            self.__degrade()
+            self._data.extend(values)
+            return
+        self._data.extend(encoded)
+    # END extend()
+
+    def __len__(self) -> int:
+        return 0 if self._data is None else len(self._data)
+
+    def __getitem__(self, position: int):
+        return self.decode(self._data[position])
+
+    def __setitem__(self, position: int, value) -> None:
+        if self._kind != 'object' and type(value) is not self._type:
+            self.__degrade()
+        if self._kind == 'object':
+            self._data[position] = value
+            return
+        try:
+            self._data[position] = self.encode(value)
+        except OverflowError:
+            self.__degrade()
+            self._data[position] = value
+
+    def __iter__(self):
+        if self._data is None:
+            return iter(())
+        if self._kind == 'object' or self._type is int or self._type is float:
+            return iter(self._data)
+        if self._kind == 'date':
+            return map(date.fromordinal, self._data)
+        if self._kind == 'str':
+            return map(self._dictionary.__getitem__, self._data)
+        return map(self._type, self._data)
+
+    @property
+    def kind(self) -> str:
+        return self._kind
+
+    @property
+    def type(self) -> type:
+        return self._type
+
+    @property
+    def data(self):
+        '''
+        The raw storage of the column: a typed array of encoded values, or a list for object columns.
+        '''
+        return self._data
+
+    @property
+    def dictionary(self) -> list:
+        '''
+        The distinct strings of a 'str' column, indexed by the codes stored in the column.
+        '''
+        return self._dictionary
+
+    def view(self):
+        '''
+        Returns a NumPy array over the raw storage of a typed column without copying it, or None
+        when NumPy is unavailable or the column is an object column.
+        NOTE: the column cannot grow while the view exists, so only keep it for the length of a scan.
+        '''
+        if numpy is None or self._kind in (None, 'object'):
+            return None
+        if not self._data:
+            return numpy.empty(0, dtype=self.NUMPY_TYPES[self._data.typecode])
+        return numpy.frombuffer(self._data, dtype=self.NUMPY_TYPES[self._data.typecode])
+
+class ColumnStore:
+    '''
+    A ColumnStore is the columnar storage mode for the records of a Table.  Instead of one Record
+    per row, it keeps one typed Column per category and rebuilds Records only when rows are read.
+    It behaves like a sequence of Records (len(), iteration, indexing by position), and adds
+    scans over whole columns that run as vectorized NumPy operations when NumPy is installed.
+
+    The scans accept an optional 'live' bytearray holding 1 for every position that should be
+    considered, which lets keyed storage skip rows that were deleted.
+    '''
+    def __init__(self, categories: tuple, record_type: type) -> None:
+        self._categories: tuple = tuple(categories)
+        self._record_type: type = record_type
+        self._columns: dict = {category: Column() for category in self._categories}
+        self._length: int = 0
+    # END __init__()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: int):
+        if position < 0:
+            position += self._length
+        if position < 0 or position >= self._length:
+            raise IndexError('ColumnStore index out of range')
+        return self._record_type(column[position] for column in self._columns.values())
+
+    def __iter__(self):
+        return map(self._record_type, zip(*self._columns.values()))
+
+    def append(self, record: tuple) -> None:
+        self.extend((record,))
+
+    def extend(self, records) -> None:
+        '''
+        Adds a batch of records, one column at a time.
+        '''
+        records = records if isinstance(records, (list, tuple)) else list(records)
+        if not records:
+            return
+        for column, values in zip(self._columns.values(), zip(*records)):
+            column.extend(values)
+        self._length += len(records)
+
+    def set_row(self, position: int, record: tuple) -> None:
+        for column, value in zip(self._columns.values(), record):
+            column[position] = value
+
+    def rows(self, positions):
+        '''
+        Yields the Records at the given positions, in order.
+        '''
+        columns = tuple(self._columns.values())
+        for position in positions:
+            yield self._record_type(column[position] for column in columns)
+
+    def column(self, category: str) -> Column:
+        return self._columns[category]
+
+    def project(self, categories: tuple):
+        '''
+        Yields a tuple of the fields of the given categories for every row, reading only those columns.
+        '''
+        return zip(*(self._columns[category] for category in categories))
+
+    def column_array(self, category: str):
+        '''
+        Returns a NumPy copy of the raw typed values of a category, or None when NumPy is
+        unavailable or the category is an object column.
+        '''
+        view = self._columns[category].view()
+        return None if view is None else view.copy()
+
+    def __candidates(self, live: bytearray):
+        # the positions to scan, as a NumPy mask or a Python list
+        if numpy is not None:
+            if live is None:
+                return numpy.ones(self._length, dtype=bool)
+            return numpy.frombuffer(live, dtype=numpy.uint8)[:self._length].astype(bool)
+        if live is None:
+            return range(self._length)
+        return [position for position in range(self._length) if live[position]]
+
+    def positions_equal(self, category: str, value, live: bytearray = None):
+        '''
+        Returns the positions, in ascending order, of the rows whose category equals value.
+        '''
+        column = self._columns[category]
+        view = column.view()
+        if view is not None and column.kind_of(value) == column.kind and (column.kind != 'str' or column.code_of(value) is not None):
+            mask = self.__candidates(live)
+            mask &= view == column.encode(value)
+            return numpy.flatnonzero(mask)
+        return [position for position in self.__candidates_list(live) if column[position] == value]
+
+    def positions_between(self, category: str, low, high, live: bytearray = None):
+        '''
+        Returns the positions, in ascending order, of the rows whose category is between low
+        and high (both inclusive).
+        '''
+        column = self._columns[category]
+        view = column.view()
+        if view is not None and column.kind != 'str' and column.kind_of(low) == column.kind and column.kind_of(high) == column.kind:
+            mask = self.__candidates(live)
+            mask &= view >= column.encode(low)
+            mask &= view <= column.encode(high)
+            return numpy.flatnonzero(mask)
+        values = ((position, column[position]) for position in self.__candidates_list(live))
+        return [position for position, value in values if value is not None and low <= value <= high]
+
+    def total(self, category: str, positions = None, live: bytearray = None):
+        '''
+        Returns the sum of a category over the given positions (or every live row), as a value
+        of the column's type; int columns such as Money are summed exactly.
+        '''
+        column = self._columns[category]
+        if positions is None:
+            positions = self.__positions(live)
+        view = column.view()
+        if view is not None and column.kind in ('int', 'float'):
+            raw_total = view[positions].sum() if len(positions) else 0
+            raw_total = int(raw_total) if column.kind == 'int' else float(raw_total)
+            return column.decode(raw_total)
+        values = (column[position] for position in positions)
+        raw_total = sum(values)
+        return column.decode(raw_total) if column.kind in ('int', 'float') else raw_total
+
+    def order(self, category: str, positions = None, live: bytearray = None, descending: bool = False):
+        '''
+        Returns the given positions (or every live position) sorted by a category.  The sort is
+        stable, so rows with equal values keep their storage order.
+        '''
+        column = self._columns[category]
+        if positions is None:
+            positions = self.__positions(live)
+        view = column.view()
+        if view is not None and column.kind in ('int', 'date', 'float'):
+            positions = numpy.asarray(positions, dtype=numpy.int64)
+            values = view[positions]
+            if descending:
+                # negating keeps equal values in storage order, unlike reversing an ascending sort
+                values = -values
+            return positions[numpy.argsort(values, kind='stable')]
+        return sorted(positions, key=column.__getitem__, reverse=descending)
+
+    def __positions(self, live: bytearray):
+        if numpy is not None:
+            return numpy.flatnonzero(self.__candidates(live))
+        return self.__candidates(live)
+
+    def __candidates_list(self, live: bytearray):
+        if live is None:
+            return range(self._length)
+        return [position for position in range(self._length) if live[position]]
+
+class ColumnarRecords(MutableMapping):
+    '''
+    ColumnarRecords is the columnar storage mode for the records of a KeyTable.  It is a mapping
+    of primary key -> Record, like the dict used for row storage, backed by a ColumnStore.
+
+    Removed rows are only marked as dead at first, and the columns are compacted once more than
+    half of the rows are dead, so that removing a record stays cheap.
+    '''
+    def __init__(self, categories: tuple, record_type: type) -> None:
+        self._categories: tuple = tuple(categories)
+        self._record_type: type = record_type
+        self._store: ColumnStore = ColumnStore(categories, record_type)
+        self._keys: array = array('q')
+        self._positions: dict = dict()
+        self._live: bytearray = bytearray()
+        self._dead: int = 0
+    # END __init__()
+
+    def __getitem__(self, key):
+        return self._store[self._positions[key]]
+
+    def __setitem__(self, key, record) -> None:
+        position = self._positions.get(key)
+        if position is None:
+            self.__append_rows((key,), (record,))
+        else:
+            self._store.set_row(position, record)
+
+    def __delitem__(self, key) -> None:
+        position = self._positions.pop(key)
+        self._live[position] = 0
+        self._dead += 1
+        if self._dead > len(self._positions):
+            self.__compact()
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __iter__(self):
+        return (key for key, live in zip(self._keys, self._live) if live)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (record for record, live in zip(self._store, self._live) if live)
+
+    def items(self):
+        return ((key, record) for key, live, record in zip(self._keys, self._live, self._store) if live)
+
+    def update(self, other = (), **keywords) -> None:
+        '''
+        Adds or replaces many records at once.  New keys are appended to the columns as a single
+        batch, which is the bulk-insert path used by KeyTable.add_records().
+        '''
+        pairs = other.items() if hasattr(other, 'items') else other
+        new_keys = list()
+        new_records = list()
+        for key, record in pairs:
+            if key in self._positions:
+                self._store.set_row(self._positions[key], record)
+            else:
+                new_keys.append(key)
+                new_records.append(record)
+        self.__append_rows(new_keys, new_records)
+
+    def __append_rows(self, keys, records) -> None:
+        if not keys:
+            return
+        first_position = len(self._keys)
+        self._store.extend(records)
+        self._keys.extend(keys)
+        self._live.extend(b'\x01' * len(keys))
+        self._positions.update(zip(keys, range(first_position, first_position + len(keys))))
+
+    def __compact(self) -> None:
+        # rebuild the columns from the live rows only
+        keys = list(self)
+        records = list(self.values())
+        self._store = ColumnStore(self._categories, self._record_type)
+        self._keys = array('q')
+        self._positions = dict()
+        self._live = bytearray()
+        self._dead = 0
+        self.__append_rows(keys, records)
+
+    def __keys_at(self, positions) -> list:
+        if numpy is not None and not isinstance(positions, list):
+            if not len(positions):
+                return []
+            return numpy.frombuffer(self._keys, dtype=numpy.int64)[positions].tolist()
+        return [self._keys[position] for position in positions]
+
+    @property
+    def store(self) -> ColumnStore:
+        return self._store
+
+    def project_items(self, categories: tuple):
+        '''
+        Yields (key, tuple of the fields of the given categories) for every live row, reading only those columns.
+        '''
+        return ((key, fields) for key, live, fields in zip(self._keys, self._live, self._store.project(categories)) if live)
+
+    def column(self, category: str) -> list:
+        '''
+        Returns the values of a category for every live row, in storage order.
+        '''
+        return [value for value, live in zip(self._store.column(category), self._live) if live]
+
+    def column_array(self, category: str):
+        '''
+        Returns a NumPy copy of the raw typed values of a category for every live row (int64,
+        int32 date ordinals, float64 or int32 string codes), or None when NumPy is unavailable
+        or the category is an object column.
+        '''
+        view = self._store.column(category).view()
+        if view is None:
+            return None
+        return view[numpy.frombuffer(self._live, dtype=numpy.uint8).astype(bool)]
+
+    def pick(self, keys) -> dict:
+        '''
+        Returns {key: record} for the keys that have a live row, in their order.
+        '''
+        positions = self._positions
+        return {key: self._store[positions[key]] for key in keys if key in positions}
+
+    def keys_equal(self, category: str, value) -> list:
+        return self.__keys_at(self._store.positions_equal(category, value, self._live))
+
+    def keys_between(self, category: str, low, high) -> list:
+        return self.__keys_at(self._store.positions_between(category, low, high, self._live))
+
+    def total(self, category: str, keys = None):
+        positions = None if keys is None else [self._positions[key] for key in keys]
+        return self._store.total(category, positions, self._live)
+
+    def keys_ordered_by(self, category: str, descending: bool = False) -> list:
+        return self.__keys_at(self._store.order(category, live=self._live, descending=descending))
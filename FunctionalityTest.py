@@ -1,14 +1,31 @@
 from Menu import Menu
 from KeySet import KeySet
 from KeyTable import KeyTable
+from ChangeLog import ChangeLog
+from TableFile import TableFileError
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+import json
 import os
 import pickle
 
 
 active_tables = dict()
+# the ChangeLog of each table that has been saved to or loaded from a file, by table name;
+# once a table has a log, each change to it is appended to the log instead of rewriting the file
+change_logs = dict()
+# tables that are still being loaded in the background, as a Future of their ChangeLog, by table name
+loading_tables = dict()
+# the tables that were saved or loaded before, as {table name: file name}, are loaded again at startup
+KNOWN_TABLES_FILE = 'known_tables.json'
+table_loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix='table-loader')
+# set to 1 (or memory, to also trace the memory of bulk operations) to collect performance stats from the start
+INSTRUMENT_VARIABLE = 'PYTABLE_INSTRUMENT'
 
 def main():
-    
+    if os.environ.get(INSTRUMENT_VARIABLE, '0') != '0':
+        instrumentation.enable(trace_memory=os.environ[INSTRUMENT_VARIABLE] == 'memory')
+    preload_known_tables()
     main_menu = Menu(
         '''
 Basic Asset Management System Functioinality Test
@@ -17,26 +34,28 @@ Basic Asset Management System Functioinality Test
 Main Menu
 ---------
 1) Create a new Table from the Terminal
-2) **Load a Table from a file
+2)   Load a Table from a file
 3)   Add a record
 4)   Display a Table
-5) **Save a Table to a file
+5)   Save a Table to a file
 6) **Update a record
 7) **Retrieve a record by its primary key
 8) **Generate a report
 9)   Exit the program
+10)  Show performance stats
 
 ** = Not implemented yet.
         ''', 
         {
             1: create_table,
-            2: not_implemented_yet,
+            2: load_file,
             3: add_record,
             4: display_table,
-            5: not_implemented_yet,
+            5: save_table,
             6: not_implemented_yet,
             7: not_implemented_yet,
-            9: exit_program
+            9: exit_program,
+            10: show_performance_stats
         })
     while True: main_menu.select()
 
@@ -46,8 +65,57 @@ def clear():
 def not_implemented_yet():
     print('\nSorry, this option has not been implemented yet.\nReturning to Main Menu...\n')
 
+def preload_known_tables():
+    '''
+    Starts loading every known table in the background, so that the menu comes up right away.
+    A menu option that needs one of these tables only waits for that table; see get_table().
+    '''
+    try:
+        with open(KNOWN_TABLES_FILE) as known_tables_file:
+            known_tables = json.load(known_tables_file)
+    except (FileNotFoundError, ValueError):
+        return
+    for name, file_name in known_tables.items():
+        loading_tables[name] = table_loader.submit(ChangeLog.open, file_name)
+    if known_tables:
+        print(f'\nLoading {len(known_tables)} tables in the background: {", ".join(known_tables)}\n')
+
+def remember_table(name: str, file_name: str):
+    try:
+        with open(KNOWN_TABLES_FILE) as known_tables_file:
+            known_tables = json.load(known_tables_file)
+    except (FileNotFoundError, ValueError):
+        known_tables = dict()
+    known_tables[name] = os.path.abspath(file_name)
+    with open(KNOWN_TABLES_FILE, 'w') as known_tables_file:
+        json.dump(known_tables, known_tables_file, indent=4)
+
+def get_table(name: str) -> KeyTable:
+    '''
+    Returns the table with the given name, first waiting for it if it is still being loaded.
+    Returns None if it failed to load.
+    '''
+    if name in loading_tables:
+        future = loading_tables.pop(name)
+        if not future.done():
+            print(f'\nWaiting for {name} to finish loading...\n')
+        try:
+            change_log = future.result()
+        except (FileNotFoundError, TableFileError) as error:
+            print(f'\nFailed to load {name}: {error}\n')
+            return None
+        active_tables[name] = change_log.table
+        change_logs[name] = change_log
+    return active_tables.get(name)
+
+def table_names() -> list:
+    return list(active_tables) + [name for name in loading_tables if name not in active_tables]
+
+def select_table_name() -> str:
+    return Menu('Which table?', dict(enumerate(table_names(), 1))).key_select()
+
 def select_table() -> KeyTable:
-    return Menu('Which table?', active_tables).select()
+    return get_table(select_table_name())
 
 # 1) Create a new Table from the Terminal
 def create_table():
@@ -68,15 +136,34 @@ def create_table():
 
     active_tables[name] = KeyTable(categories, KeySet(min_key,max_key))
 
-# 2) **Load a Table from a file
+# 2)   Load a Table from a file
 def load_file():
-    not_implemented_yet()
+    print('\nLoading a Table from a file...\n')
+    file_name = input('\nInput the path of the table file to load: ')
+    try:
+        change_log = ChangeLog.open(file_name)
+    except FileNotFoundError:
+        print(f'\nFailed to load {file_name}, no such file was found!\nReturning to Main Menu...\n')
+        return
+    except TableFileError as error:
+        print(error)
+        return
+    name = input('\nInput a name for the loaded Table: ')
+    if name in loading_tables:
+        get_table(name)
+    if name in change_logs:
+        change_logs[name].close()
+    active_tables[name] = change_log.table
+    change_logs[name] = change_log
+    remember_table(name, file_name)
+    print(f'\nLoaded {len(change_log.table.records)} records into {name}.\n')
     
 # 3)   Add a record
 def add_record():
     print('\nAdd a record to a table...\n')
-    if active_tables:
+    if table_names():
         active_table = select_table()
+        if active_table is None: return
         record_to_add = []
         for category in active_table.categories:
             record_to_add.append(input(f"\nEnter a value for this record's {category} category: "))
@@ -90,13 +177,34 @@ def add_record():
 
 # 4)   Display a Table
 def display_table():
-    if active_tables: print(select_table())
+    if table_names():
+        active_table = select_table()
+        if active_table is not None: print(active_table)
     else:
         print('\nThere are no active tables available to display.  Please create a new table.\nReturning to Main Menu...\n')
 
-# 5) **Save a Table to a file
+# 5)   Save a Table to a file
 def save_table():
-    not_implemented_yet()
+    if table_names():
+        name = select_table_name()
+        active_table = get_table(name)
+        if active_table is None: return
+        change_log = change_logs.get(name)
+        file_name = input(f'\nInput the path of the table file to save to: [or press ENTER to use {change_log.file_name}] ' if change_log
+                          else '\nInput the path of the table file to save to: ')
+        if change_log and file_name in ('', change_log.file_name):
+            # the file is already current through the log; compacting folds the log into it
+            change_log.compact(background=False)
+            file_name = change_log.file_name
+        else:
+            if change_log:
+                change_log.close()
+            change_logs[name] = ChangeLog.create(active_table, file_name)
+            file_name = change_logs[name].file_name
+        remember_table(name, file_name)
+        print(f'\nSaved {len(active_table.records)} records to {file_name}.\n')
+    else:
+        print('\nThere are no active tables available to save.  Please create a new table.\nReturning to Main Menu...\n')
 
 # 6) **Update a record
 def update_record():
@@ -110,9 +218,34 @@ def retrieve_by_key():
 def generate_report():
     not_implemented_yet()
 
+# 10)  Show performance stats
+def show_performance_stats():
+    if not instrumentation.is_enabled():
+        print(f'\nInstrumentation is off, so no performance stats are being collected.  (Set {INSTRUMENT_VARIABLE}=1 to collect them from startup.)')
+        if Menu('Turn it on?', {'y': True, 'n': False}).select():
+            trace_memory = Menu('Also trace the memory allocated by bulk operations?  (This slows them down.)', {'y': True, 'n': False}).select()
+            instrumentation.enable(trace_memory=trace_memory)
+            print('\nInstrumentation is on.  Choose this option again to see the stats.')
+        print('Returning to Main Menu...\n')
+        return
+    print(f'\n{instrumentation.report()}\n')
+    action = Menu('What next?', {1: 'Keep collecting', 2: 'Reset the stats', 3: 'Turn instrumentation off'}).key_select()
+    if action == 'Reset the stats':
+        instrumentation.reset()
+    elif action == 'Turn instrumentation off':
+        instrumentation.disable()
+    print('\nReturning to Main Menu...\n')
+
 # 9)   Exit the program
 def exit_program():
     print('\nExiting program...\n')
+    # tables that have not finished loading are not waited for, unless they are already being loaded
+    table_loader.shutdown(wait=True, cancel_futures=True)
+    for future in loading_tables.values():
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+    for change_log in change_logs.values():
+        change_log.close()
     exit()
 
 
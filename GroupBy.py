@@ -0,0 +1,244 @@
+from collections.abc import Mapping
+from itertools import repeat
+from Table import Table
+import builtins
+
+# NumPy is optional, as in ColumnStore: without it, every roll-up uses the single-pass hash aggregation
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+AGGREGATES = ('sum', 'mean', 'min', 'max')
+
+class GroupBy:
+    '''
+    A GroupBy splits the records of a table into groups that share the same values of some
+    categories, or of values derived from them, and rolls each group up with agg():
+
+        table.group_by('Location', month=('End of Life (EOL)', month_of)).agg(sum='Purchase Price', mean='% Value at EOL')
+
+    Row storage is rolled up in a single pass over the records, which gathers the records of
+    each group in a dict, and the groups are then reduced one at a time.  Columnar storage is rolled up with NumPy when every category involved
+    is a typed column: each grouping column is factorized once with numpy.unique(), the rows are
+    sorted by group, and each group is reduced with numpy's reduceat().  Sums of int columns,
+    such as Money, are exact in both cases.
+    '''
+    def __init__(self, table, categories: tuple, derived: dict) -> None:
+        '''
+        Parameters
+        ----------
+        table : Table
+            the table to group, a Table or a KeyTable
+        categories : tuple
+            the categories whose values make up the groups
+        derived : dict
+            {name: (category, function)} for groups made of function(value of category), such as
+            the month of a date
+
+        Raises
+        ------
+        KeyError
+            when a category is not in the table
+        '''
+        for category in categories + tuple(category for category, function in derived.values()):
+            if category not in table.categories_set:
+                raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+        self.__table = table
+        self.__names: tuple = tuple(categories) + tuple(derived)
+        # (category, function or None) for each part of the group key, in order
+        self.__groupers: tuple = tuple((category, None) for category in categories) + tuple(derived.values())
+    # END __init__()
+
+    def agg(self, sum = (), count: bool = True, mean = (), min = (), max = ()) -> Table:
+        '''
+        Rolls up each group, and returns the results as a new Table with one record per group,
+        ordered by group.  None values are left out of every aggregate.
+
+        Parameters
+        ----------
+        sum : str or tuple of str
+            the categories to total, as 'sum(category)' columns
+        count : bool
+            include a 'count' column with the number of records in each group
+        mean : str or tuple of str
+            the categories to average, as 'mean(category)' columns
+        min : str or tuple of str
+            the categories whose smallest value to report, as 'min(category)' columns
+        max : str or tuple of str
+            the categories whose largest value to report, as 'max(category)' columns
+        '''
+        # (aggregate, category) pairs, in the order of the result columns
+        aggregates = list()
+        for aggregate, categories in zip(AGGREGATES, (sum, mean, min, max)):
+            for category in ((categories,) if isinstance(categories, str) else categories):
+                if category not in self.__table.categories_set:
+                    raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+                aggregates.append((aggregate, category))
+
+        results = self.__columnar_aggregate(aggregates) if self.__table.storage == 'columns' and numpy is not None else None
+        if results is None:
+            results = self.__hash_aggregate(aggregates)
+
+        result_categories = self.__names + (('count',) if count else ()) + tuple(f'{aggregate}({category})' for aggregate, category in aggregates)
+        result_table = Table(result_categories)
+        # None sorts after every other value of a group key
+        for key in sorted(results, key=lambda key: tuple((value is None, value) for value in key)):
+            group_count, values = results[key]
+            result_table.add_records(key + ((group_count,) if count else ()) + tuple(values))
+        return result_table
+    # END agg()
+
+    def __records(self):
+        records = self.__table.records
+        return records.values() if isinstance(records, Mapping) else records
+
+    def __hash_aggregate(self, aggregates: list) -> dict:
+        '''
+        Returns {group key: (count, [aggregate values])} from a single pass over the records,
+        which only puts each record into the list of its group.  The groups are first formed by
+        the raw values of the categories, so a derived value is computed once per distinct raw
+        value rather than once per record; then each aggregate is reduced by the built-in sum(),
+        min() and max() over the records of each group.
+        '''
+        positions = self.__table.record_type._positions
+        grouper_positions = [positions[category] for category, function in self.__groupers]
+        records = self.__records()
+        if not isinstance(records, (list, tuple)):
+            records = list(records)
+        # tuple.__getitem__ reads the fields without going through Record.__getitem__, which also accepts names
+        if len(grouper_positions) == 1:
+            raw_keys = map(tuple.__getitem__, records, repeat(grouper_positions[0]))
+        elif not grouper_positions:
+            # no categories: the whole table is a single group
+            raw_keys = repeat(())
+        else:
+            raw_keys = zip(*(map(tuple.__getitem__, records, repeat(position)) for position in grouper_positions))
+
+        raw_groups = dict()
+        for raw_key, record in zip(raw_keys, records):
+            group = raw_groups.get(raw_key)
+            if group is None:
+                raw_groups[raw_key] = [record]
+            else:
+                group.append(record)
+
+        groups = dict()
+        for raw_key, records in raw_groups.items():
+            raw_key = (raw_key,) if len(grouper_positions) == 1 else raw_key
+            # a missing value stays None in a derived part of the key too
+            key = tuple(value if function is None or value is None else function(value) for value, (category, function) in zip(raw_key, self.__groupers))
+            if key in groups:
+                groups[key].extend(records)
+            else:
+                groups[key] = records
+
+        # sums of Money are plain ints by now, so the type of each category is restored at the end
+        value_types = {category: self.__value_type(category) for aggregate, category in aggregates}
+        results = dict()
+        for key, records in groups.items():
+            values = list()
+            for aggregate, category in aggregates:
+                present = [value for value in map(tuple.__getitem__, records, repeat(positions[category])) if value is not None]
+                if aggregate == 'sum':
+                    values.append(_as_type(value_types[category], builtins.sum(present)))
+                elif aggregate == 'mean':
+                    values.append(_as_type(value_types[category], builtins.sum(present) / len(present), mean=True) if present else None)
+                elif present:
+                    values.append((builtins.min if aggregate == 'min' else builtins.max)(present))
+                else:
+                    values.append(None)
+            results[key] = (len(records), values)
+        return results
+    # END __hash_aggregate()
+
+    def __value_type(self, category: str) -> type:
+        position = self.__table.record_type._positions[category]
+        for record in self.__records():
+            if record[position] is not None:
+                return type(record[position])
+        return int
+
+    def __column(self, category: str):
+        records = self.__table.records
+        store = records.store if hasattr(records, 'store') else records
+        return store.column(category)
+
+    def __columnar_aggregate(self, aggregates: list) -> dict:
+        '''
+        Returns {group key: (count, [aggregate values])} computed with NumPy, or None when one of
+        the categories is not a typed column that NumPy can group or reduce.
+        '''
+        # every column is checked before any work is done, so a fallback wastes nothing
+        for aggregate, category in aggregates:
+            kinds = ('int', 'float') if aggregate in ('sum', 'mean') else ('int', 'float', 'date')
+            if self.__column(category).kind not in kinds:
+                return None
+        arrays = dict()
+        for category in {category for category, function in self.__groupers} | {category for aggregate, category in aggregates}:
+            arrays[category] = self.__table.column_array(category)
+            if arrays[category] is None:
+                return None
+        if not len(self.__table.records):
+            return dict()
+
+        # factorize each part of the group key into codes 0...n-1, and combine them into a single code
+        combined = numpy.zeros(len(self.__table.records), dtype=numpy.int64)
+        labels = list()
+        cardinality = 1
+        for category, function in self.__groupers:
+            column = self.__column(category)
+            uniques, codes = numpy.unique(arrays[category], return_inverse=True)
+            values = [column.decode(raw) for raw in uniques.tolist()]
+            if function is not None:
+                # a derived value is computed once per distinct raw value, not once per record
+                derived = dict()
+                remap = numpy.array([derived.setdefault(function(value), len(derived)) for value in values], dtype=numpy.int64)
+                codes = remap[codes]
+                values = list(derived)
+            cardinality *= len(values)
+            if cardinality >= 2**62:
+                return None
+            combined = combined * len(values) + codes
+            labels.append(values)
+
+        group_codes, groups = numpy.unique(combined, return_inverse=True)
+        order = numpy.argsort(groups, kind='stable')
+        starts = numpy.flatnonzero(numpy.r_[True, numpy.diff(groups[order]) != 0])
+        counts = numpy.diff(numpy.r_[starts, len(order)])
+
+        columns = list()
+        for aggregate, category in aggregates:
+            column = self.__column(category)
+            values = arrays[category][order]
+            if aggregate == 'sum':
+                # int64 reductions are exact, unlike a float64 bincount
+                columns.append([column.decode(total) for total in numpy.add.reduceat(values, starts).tolist()])
+            elif aggregate == 'mean':
+                means = numpy.add.reduceat(values.astype(numpy.float64), starts) / counts
+                columns.append([_as_type(column.type, mean, mean=True) for mean in means.tolist()])
+            else:
+                reduce = numpy.minimum if aggregate == 'min' else numpy.maximum
+                columns.append([column.decode(raw) for raw in reduce.reduceat(values, starts).tolist()])
+
+        results = dict()
+        for group, (group_code, group_count) in enumerate(zip(group_codes.tolist(), counts.tolist())):
+            # split the combined code back into the code of each part of the key
+            key = list()
+            for values in reversed(labels):
+                group_code, code = divmod(group_code, len(values))
+                key.append(values[code])
+            results[tuple(reversed(key))] = (group_count, [column[group] for column in columns])
+        return results
+    # END __columnar_aggregate()
+
+def _as_type(value_type: type, value, mean: bool = False):
+    '''
+    Converts an aggregate back to the type of the values it was computed from, such as Money or
+    Percent.  The mean of int values stays a float, since it is rarely a whole number.
+    '''
+    if mean and issubclass(value_type, int):
+        return float(value)
+    if value_type in (int, float) or not issubclass(value_type, (int, float)):
+        return value
+    return value_type(value)
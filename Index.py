@@ -0,0 +1,206 @@
+from bisect import bisect_left, bisect_right, insort
+from math import inf
+
+def _values_of(pairs, category: str):
+    '''
+    Yields (primary_key, value of category) for (primary_key, record) pairs.  Records of the
+    same table share one Record type, so the position of the category is looked up only once.
+    '''
+    position = None
+    for primary_key, record in pairs:
+        if position is None:
+            position = record._positions[category]
+        yield primary_key, tuple.__getitem__(record, position)
+
+class HashIndex:
+    '''
+    A HashIndex maps each value of one category to the primary keys of the records holding it,
+    so that equality lookups cost O(1) instead of a scan of the whole table.
+    Keys are kept in the order they were added to the index.
+    '''
+    kind = 'hash'
+
+    def __init__(self, category: str) -> None:
+        self._category: str = category
+        # value -> {primary_key: None}; a dict is used as an ordered set of keys
+        self._keys: dict = dict()
+    # END __init__()
+
+    @property
+    def category(self) -> str:
+        return self._category
+
+    def add(self, primary_key: int, record) -> None:
+        self._keys.setdefault(record[self._category], dict())[primary_key] = None
+
+    def add_many(self, pairs) -> None:
+        '''
+        Adds many (primary_key, record) pairs to the index.
+        '''
+        keys = self._keys
+        for primary_key, value in _values_of(pairs, self._category):
+            if value in keys:
+                keys[value][primary_key] = None
+            else:
+                keys[value] = {primary_key: None}
+
+    def remove(self, primary_key: int, record) -> None:
+        value = record[self._category]
+        keys = self._keys[value]
+        del keys[primary_key]
+        if not keys:
+            del self._keys[value]
+
+    def update(self, primary_key: int, old_record, new_record) -> None:
+        if old_record[self._category] != new_record[self._category]:
+            self.remove(primary_key, old_record)
+            self.add(primary_key, new_record)
+
+    def equal(self, value) -> list:
+        '''
+        Returns the primary keys of the records whose category equals value.
+        '''
+        return list(self._keys.get(value, ()))
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._keys.values())
+
+class SortedIndex:
+    '''
+    A SortedIndex keeps the (value, primary_key) pairs of one category in sorted order, so that
+    equality and range lookups cost O(log n + k) and the records can be visited in value order
+    without sorting them.  Records whose value is None are kept aside, since None cannot be
+    ordered against other values; they only match equality lookups for None.
+    Pairs added in bulk are appended unsorted, and the index is sorted again the next time it
+    is read, so a bulk load pays for a single sort instead of one per batch.
+    '''
+    kind = 'sorted'
+
+    def __init__(self, category: str) -> None:
+        self._category: str = category
+        self._entries: list = list()
+        self._none_keys: dict = dict()
+        # the number of entries at the front of the list that are known to be in sorted order
+        self._sorted_length: int = 0
+    # END __init__()
+
+    def __sort(self) -> None:
+        # the sorted prefix and the unsorted tail are merged by a single sort
+        if self._sorted_length != len(self._entries):
+            self._entries.sort()
+            self._sorted_length = len(self._entries)
+
+    @property
+    def category(self) -> str:
+        return self._category
+
+    def add(self, primary_key: int, record) -> None:
+        value = record[self._category]
+        if value is None:
+            self._none_keys[primary_key] = None
+        elif self._sorted_length != len(self._entries):
+            self._entries.append((value, primary_key))
+        else:
+            insort(self._entries, (value, primary_key))
+            self._sorted_length += 1
+
+    def add_many(self, pairs) -> None:
+        '''
+        Adds many (primary_key, record) pairs to the index.  A large batch is appended as it is,
+        and only sorted into the index when the index is next read.
+        '''
+        pairs = pairs if isinstance(pairs, (list, tuple)) else list(pairs)
+        if len(pairs) < 32:
+            for primary_key, record in pairs:
+                self.add(primary_key, record)
+            return
+        for primary_key, value in _values_of(pairs, self._category):
+            if value is None:
+                self._none_keys[primary_key] = None
+            else:
+                self._entries.append((value, primary_key))
+
+    def remove(self, primary_key: int, record) -> None:
+        value = record[self._category]
+        if value is None:
+            del self._none_keys[primary_key]
+            return
+        self.__sort()
+        position = bisect_left(self._entries, (value, primary_key))
+        del self._entries[position]
+        self._sorted_length -= 1
+
+    def update(self, primary_key: int, old_record, new_record) -> None:
+        if old_record[self._category] != new_record[self._category]:
+            self.remove(primary_key, old_record)
+            self.add(primary_key, new_record)
+
+    def equal(self, value) -> list:
+        '''
+        Returns the primary keys of the records whose category equals value.
+        '''
+        if value is None:
+            return list(self._none_keys)
+        return self.between(value, value)
+
+    def between(self, low, high) -> list:
+        '''
+        Returns the primary keys of the records whose category is between low and high (both
+        inclusive), ordered by value.
+        '''
+        self.__sort()
+        # (low,) sorts before every pair holding low, and (high, inf) after every pair holding high
+        first = bisect_left(self._entries, (low,))
+        last = bisect_right(self._entries, (high, inf))
+        return [primary_key for value, primary_key in self._entries[first:last]]
+
+    def ordered(self, descending: bool = False):
+        '''
+        Yields (value, primary_key) pairs in value order.  Records whose value is None come last.
+        '''
+        self.__sort()
+        entries = reversed(self._entries) if descending else iter(self._entries)
+        yield from entries
+        for primary_key in self._none_keys:
+            yield (None, primary_key)
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._none_keys)
+
+class LockedIndex:
+    '''
+    A LockedIndex lets threads read an index that other threads are changing.  Every lookup holds
+    the index's lock, which the writers of a concurrent KeyTable also hold while they change the
+    index, so a lookup never sees it half way through a change; each lookup returns a list, so
+    the lock is only held for the length of the lookup itself.
+    '''
+    def __init__(self, index, lock) -> None:
+        self._index = index
+        self._lock = lock
+    # END __init__()
+
+    @property
+    def kind(self) -> str:
+        return self._index.kind
+
+    @property
+    def category(self) -> str:
+        return self._index.category
+
+    def equal(self, value) -> list:
+        with self._lock:
+            return self._index.equal(value)
+
+    def between(self, low, high) -> list:
+        with self._lock:
+            return self._index.between(low, high)
+
+    def ordered(self, descending: bool = False):
+        with self._lock:
+            return iter(list(self._index.ordered(descending)))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index)
+
+INDEX_KINDS = {'hash': HashIndex, 'sorted': SortedIndex}
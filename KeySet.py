@@ -1,10 +1,20 @@
 import sys
+import threading
+import weakref
+from array import array
+from bisect import bisect_right
+from functools import wraps
+from itertools import takewhile
 
 class Key:
     ''' This class creates an integer with a built-in left zero padding behavior
         for display.  It is otherwise treated as a normal integer.  It is meant
-        to be used with the KeySet class.
+        to be used with the KeySet class, which stores its members as plain integers
+        and only creates Key objects when a key is handed out or displayed.
     '''
+    # Key objects are small views over an integer, so they do without a per-instance __dict__
+    __slots__ = ('_key', '_pad_to')
+
     def __init__(self, input_key: int, pad_to: int = 0) -> None:
         ''' 
         Constructor for Key objects.
@@ -21,7 +31,7 @@ class Key:
         TypeError
             when an attempt is made to compare equality with non-Key and non-integer types
         '''
-        self._key: int = input_key
+        self._key: int = int(input_key)
         self._pad_to: int = pad_to
     # END __init__()
     
@@ -30,16 +40,16 @@ class Key:
         return str(self._key).zfill(self._pad_to)
     
     def __eq__(self, other) -> bool:
+        # this is the common case when Keys are compared with each other
+        if isinstance(other, Key):
+            return self._key == other._key
+
         # allow equality as an integer
-        if type(other) == type(int()):
+        if isinstance(other, int):
             return self._key == other
 
         # do not allow equality as any other non-same type
-        elif type(self) != type(other): 
-            raise TypeError(f'Cannot compare equality of {type(self)} with {type(other)}.')
-        
-        # this line will only run when 'other' is an instance of Keye too
-        return self._key == other._key
+        raise TypeError(f'Cannot compare equality of {type(self)} with {type(other)}.')
     # END __eq__()
 
     def __lt__(self, other) -> bool:
@@ -69,11 +79,279 @@ class Key:
         '''
         # hash by the integer value of the key variable; treat like an integer
         return hash(self._key)
+
+    def __index__(self) -> int:
+        # allows int(), range() and array indexing to treat a Key as its integer value
+        return self._key
+
+    def __int__(self) -> int:
+        return self._key
     
     @property
+    def pad_to(self) -> int:
+        return self._pad_to
+
+    @pad_to.setter
     def pad_to(self, new_padding: int) -> None:
-        self._left_pad_zeros = new_padding
+        self._pad_to = new_padding
     
+class KeyRange:
+    '''
+    This class describes a block of Keys reserved together by KeySet.generate_many().  Rather than
+    holding one Key object per member, it stores the block as a short tuple of contiguous runs.
+    Iterating over a KeyRange yields the integer value of each key, in the order they were reserved.
+    '''
+    def __init__(self, runs: tuple, pad_to: int = 0) -> None:
+        '''
+        Constructor for KeyRange objects.
+
+        Parameters
+        ----------
+        runs : tuple
+            (first, last) pairs, each describing the inclusive run of keys first...last
+        pad_to : int
+            pad with leading zeros to the left to ensure the keys display with this many digits
+        '''
+        self._runs: tuple = tuple(runs)
+        self._pad_to: int = pad_to
+        self._length: int = sum(last - first + 1 for first, last in self._runs)
+    # END __init__()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        for first, last in self._runs:
+            yield from range(first, last + 1)
+
+    def __contains__(self, key) -> bool:
+        if isinstance(key, Key):
+            key = key._key
+        return any(first <= key <= last for first, last in self._runs)
+
+    def __str__(self) -> str:
+        # output each run as [first...last], with the same padding as the Keys in the KeySet
+        return ', '.join(f'[{str(first).zfill(self._pad_to)}...{str(last).zfill(self._pad_to)}]' for first, last in self._runs)
+
+    @property
+    def runs(self) -> tuple:
+        return self._runs
+
+# the most intervals held by a leaf of FreeIntervals, and the most children of one of its nodes,
+# before it is split in two
+LEAF_SIZE = 256
+NODE_SIZE = 64
+
+class _Leaf:
+    # the intervals of a leaf are kept as two parallel arrays of raw integers
+    __slots__ = ('starts', 'ends', 'previous', 'next')
+
+    def __init__(self, starts: array, ends: array) -> None:
+        self.starts: array = starts
+        self.ends: array = ends
+        self.previous: '_Leaf' = None
+        self.next: '_Leaf' = None
+    # END __init__()
+
+class _Node:
+    # firsts[i] is the start of the first interval under children[i]
+    __slots__ = ('firsts', 'children')
+
+    def __init__(self, firsts: list, children: list) -> None:
+        self.firsts: list = firsts
+        self.children: list = children
+    # END __init__()
+
+class FreeIntervals:
+    '''
+    FreeIntervals holds the unused keys of a KeySet as disjoint closed intervals [start...end],
+    ordered by start, in a B+ tree whose leaves hold up to LEAF_SIZE intervals each as arrays of
+    raw integers, and are linked to each other in order.  Finding the interval around any integer,
+    and adding, removing or resizing an interval, costs O(log n) for n intervals: a search walks
+    down one path of the tree, a change only moves the entries of one leaf, and a leaf or node
+    that outgrows its size is split in two.  A leaf that runs out of intervals is unlinked.
+    '''
+    def __init__(self) -> None:
+        self._root = self._head = self._tail = _Leaf(array('q'), array('q'))
+        self._count: int = 0
+    # END __init__()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        '''
+        Yields every interval as a (start, end) pair, in order.
+        '''
+        leaf = self._head
+        while leaf is not None:
+            yield from zip(leaf.starts, leaf.ends)
+            leaf = leaf.next
+
+    def __locate(self, key: int) -> tuple:
+        '''
+        Returns (path, leaf, position): the (node, child index) pairs walked down to the leaf that
+        would hold an interval starting at key, and the position in that leaf of the last interval
+        starting at or before key, which is -1 when no interval starts at or before key.
+        '''
+        path = list()
+        node = self._root
+        while type(node) is _Node:
+            index = bisect_right(node.firsts, key) - 1
+            if index < 0:
+                index = 0
+            path.append((node, index))
+            node = node.children[index]
+        return path, node, bisect_right(node.starts, key) - 1
+
+    def floor(self, key: int) -> tuple:
+        '''
+        Returns the last interval starting at or before key, or None if there is none.
+        '''
+        path, leaf, position = self.__locate(key)
+        if position < 0:
+            return None
+        return leaf.starts[position], leaf.ends[position]
+
+    def find(self, key: int) -> tuple:
+        '''
+        Returns the first interval that ends at or after key, which holds key if key is free, or
+        None if there is none.
+        '''
+        for interval in self.iter_from(key):
+            return interval
+        return None
+
+    def iter_from(self, key: int):
+        '''
+        Yields the intervals in order, starting from the first one that ends at or after key.
+        '''
+        path, leaf, position = self.__locate(key)
+        if position < 0 or leaf.ends[position] < key:
+            position += 1
+        while leaf is not None:
+            yield from zip(leaf.starts[position:], leaf.ends[position:])
+            leaf = leaf.next
+            position = 0
+
+    def first(self) -> tuple:
+        if not self._count:
+            return None
+        return self._head.starts[0], self._head.ends[0]
+
+    def last(self) -> tuple:
+        if not self._count:
+            return None
+        return self._tail.starts[-1], self._tail.ends[-1]
+
+    def __set_first(self, path: list, first: int) -> None:
+        # the first start of a leaf changed; so does the first start of each node it is first in
+        for node, index in reversed(path):
+            node.firsts[index] = first
+            if index:
+                break
+
+    def add(self, start: int, end: int) -> None:
+        '''
+        Adds the interval [start...end], which must not overlap any other interval.
+        '''
+        path, leaf, position = self.__locate(start)
+        position += 1
+        leaf.starts.insert(position, start)
+        leaf.ends.insert(position, end)
+        self._count += 1
+        if position == 0:
+            self.__set_first(path, start)
+        if len(leaf.starts) > LEAF_SIZE:
+            self.__split_leaf(path, leaf)
+
+    def replace(self, start: int, new_start: int, new_end: int) -> None:
+        '''
+        Resizes the interval starting at start to [new_start...new_end], which must not overlap
+        any other interval.
+        '''
+        path, leaf, position = self.__locate(start)
+        leaf.starts[position] = new_start
+        leaf.ends[position] = new_end
+        if position == 0:
+            self.__set_first(path, new_start)
+
+    def remove(self, start: int) -> None:
+        '''
+        Removes the interval starting at start.
+        '''
+        path, leaf, position = self.__locate(start)
+        del leaf.starts[position]
+        del leaf.ends[position]
+        self._count -= 1
+        if leaf.starts:
+            if position == 0:
+                self.__set_first(path, leaf.starts[0])
+        elif path:
+            self.__unlink(leaf)
+            self.__remove_child(path)
+            # a root left with a single child is replaced by that child
+            while type(self._root) is _Node and len(self._root.children) == 1:
+                self._root = self._root.children[0]
+
+    def __split_leaf(self, path: list, leaf: _Leaf) -> None:
+        half = len(leaf.starts) // 2
+        new_leaf = _Leaf(leaf.starts[half:], leaf.ends[half:])
+        del leaf.starts[half:]
+        del leaf.ends[half:]
+        new_leaf.previous, new_leaf.next = leaf, leaf.next
+        if leaf.next is None:
+            self._tail = new_leaf
+        else:
+            leaf.next.previous = new_leaf
+        leaf.next = new_leaf
+        self.__insert_child(path, new_leaf, new_leaf.starts[0])
+
+    def __insert_child(self, path: list, child, first: int) -> None:
+        '''
+        Adds a child split off from the last node of the path (or from the root) right after it.
+        '''
+        if not path:
+            old_root = self._root
+            old_first = old_root.firsts[0] if type(old_root) is _Node else old_root.starts[0]
+            self._root = _Node([old_first, first], [old_root, child])
+            return
+        node, index = path[-1]
+        node.firsts.insert(index + 1, first)
+        node.children.insert(index + 1, child)
+        if len(node.children) > NODE_SIZE:
+            half = len(node.children) // 2
+            new_node = _Node(node.firsts[half:], node.children[half:])
+            del node.firsts[half:]
+            del node.children[half:]
+            self.__insert_child(path[:-1], new_node, new_node.firsts[0])
+
+    def __unlink(self, leaf: _Leaf) -> None:
+        if leaf.previous is None:
+            self._head = leaf.next
+        else:
+            leaf.previous.next = leaf.next
+        if leaf.next is None:
+            self._tail = leaf.previous
+        else:
+            leaf.next.previous = leaf.previous
+
+    def __remove_child(self, path: list) -> None:
+        '''
+        Removes the child at the end of the path, which has run out of intervals.
+        '''
+        node, index = path[-1]
+        del node.firsts[index]
+        del node.children[index]
+        if not node.children:
+            if len(path) > 1:
+                self.__remove_child(path[:-1])
+            else:
+                self._root = self._head = self._tail = _Leaf(array('q'), array('q'))
+            return
+        if index == 0:
+            self.__set_first(path[:-1], node.firsts[0])
+
 class KeySetFull(Exception):
     '''
     This error is raised when an KeySet object attempts to run the generate_new method
@@ -83,6 +361,14 @@ class KeySetFull(Exception):
     def __init__(self) -> None:
         super().__init__('\nERROR: No valid Key could be generated, this KeySet is full.\nPlease reconsider the minimum and/or maximum valid Keys to accommodate more unique Keys.')
 
+class KeyUnavailable(Exception):
+    '''
+    This error is raised when an KeySet object is asked to reserve a specific key that is
+    already a member of the set, or that is outside of the minimum/maximum valid keys.
+    '''
+    def __init__(self, key: int) -> None:
+        super().__init__(f'\nERROR: The Key {key} could not be reserved, it is already in use or outside of the boundaries of this KeySet.')
+
 class FailureToLowerMaximum(Exception):
     '''
     This error is raised when an KeySet object attempts to change _maximum_valid_key
@@ -99,6 +385,17 @@ class FailureToRaiseMinimum(Exception):
     def __init__(self, intended_minimum: int, violation: int) -> None:
         super().__init__(f'\nERROR: At least one existing Key in the KeySet ({violation}) was < the desired minimum of {intended_minimum}.  The minimum could not be raised.')
 
+def _synchronized(method):
+    '''
+    Runs a method of a KeySet while holding the KeySet's lock, so that threads sharing a KeySet
+    never hand out the same key, or see the free intervals half way through a change.
+    '''
+    @wraps(method)
+    def synchronized(self, *arguments, **keywords):
+        with self._lock:
+            return method(self, *arguments, **keywords)
+    return synchronized
+
 class KeySet:
     def __init__(self, minimum_valid_key: int = 1, maximum_valid_key: int = sys.maxsize) -> None:
         '''
@@ -129,11 +426,21 @@ class KeySet:
         '''
         self._minimum_valid_key = minimum_valid_key
         self._maximum_valid_key = maximum_valid_key
-        self._key_set = set()
         self._next_key = minimum_valid_key
         self._pad_to = len(str(maximum_valid_key))
+
+        # the unused keys are tracked as sorted closed intervals [start...end] of raw integers,
+        # in which the interval holding any integer is found, and changed, in O(log n); the members
+        # of the set are exactly the integers between the intervals, so no per-key object is stored at all
+        self._free: FreeIntervals = FreeIntervals()
+        if minimum_valid_key <= maximum_valid_key:
+            self._free.add(minimum_valid_key, maximum_valid_key)
+        self._key_count: int = 0
+        # held by every method that changes the set; see _synchronized()
+        self._lock = threading.RLock()
     # END __init__()
 
+    @_synchronized
     def generate_new(self, start_from = None) -> Key:
         '''
         Generates a new Key object that is garanteed to be unique within this set, and adds the new Key to the set
@@ -148,46 +455,338 @@ class KeySet:
         if (start_from != None and start_from >= self._minimum_valid_key and start_from <= self._maximum_valid_key):
 
             # assign the user's value as self._next_key
-            self._next_key: int = self._next_key
-            
-        # ... otherwise, revert to the default behavior
-        else: 
-
-            # We need a non-None value in start_from so that we can use it to prevent an infinite loop below
-            start_from = self._next_key
-
-        # Make sure the new key will be the first unique integer after start_from
-        while self._next_key in self._key_set:
-            
-            # increment to find a valid Key
-            self._next_key += 1
-
-            # if we pass the maximum valid key, wrap back to the minimum valid key
-            if self._next_key > self._maximum_valid_key:
-                self._next_key = self._minimum_valid_key
- 
-            # if we arrive back to our starting point, break the infinite loop and raise
-            # an exception to inform the user that the set is full
-            if self._next_key == start_from:
-                raise KeySetFull()
-
-        # instantiate a new Key object to use in the list
-        new_key: Key = Key(self._next_key, self._pad_to)
-
-        # add the new, unique key to the set
-        self._key_set.add(new_key)
+            self._next_key: int = start_from
+
+        # if there are no free intervals left, every integer between the bounds is already a Key
+        if self.is_full():
+            raise KeySetFull()
+
+        # find the first free interval that ends at or after self._next_key
+        interval = self._free.find(self._next_key)
+
+        # if we pass the maximum valid key, wrap back to the first free interval after the minimum valid key
+        if interval is None:
+            new_key: int = self._free.first()[0]
+
+        # ... otherwise the new key is either self._next_key itself, or the start of the next free interval
+        else:
+            new_key: int = max(interval[0], self._next_key)
+
+        # take the new key out of its free interval
+        self._allocate(new_key)
+
+        # the new, unique key is now a member of the set
+        self._key_count += 1
 
         # prepare to give the next sequential integer as the key for the next instantiated Key object
-        self._next_key+= 1
+        self._next_key = new_key + 1
 
         return Key(new_key, self._pad_to)
     # END generate_new()
 
+    @_synchronized
+    def generate_many(self, count: int, start_from = None) -> 'KeyRange':
+        '''
+        Reserves a block of Keys that are garanteed to be unique within this set in a single operation,
+        and adds them all to the set.  A single contiguous run of free keys is used whenever one is big
+        enough, otherwise the block is made up of the free runs that follow, wrapping around as needed.
+        Parameters
+        ----------
+        count : int
+            the number of unique keys to reserve
+        start_from : int
+            the number from which the method seeks to assign the new unique Keys
+            the default behavior will continue from the previous or minmum (if no previous) assigned Key
+        Returns
+        -------
+        KeyRange
+            a compact description of the reserved keys, as one or more contiguous runs
+        Raises
+        ------
+        KeySetFull : Exception
+            when there are fewer than count unused keys left; no keys are reserved in that case
+        '''
+        if count <= 0:
+            return KeyRange((), self._pad_to)
+
+        if self.free_count() < count:
+            raise KeySetFull()
+
+        # If the user wants to override the start_from parameter, and their attempt to override was in-bounds...
+        if (start_from != None and start_from >= self._minimum_valid_key and start_from <= self._maximum_valid_key):
+            self._next_key: int = start_from
+
+        # visit the free intervals in allocation order: from self._next_key up to the maximum, then wrap around;
+        # only the first interval visited can begin part-way through, at self._next_key
+        next_key = self._next_key
+        first_interval = self._free.find(next_key)
+
+        def order():
+            for start, end in self._free.iter_from(next_key):
+                yield max(start, next_key), end
+            yield from takewhile(lambda interval: interval[1] < next_key, self._free)
+
+        # prefer the first free run that can hold the whole block on its own
+        runs = list()
+        for start, end in order():
+            if end - start + 1 >= count:
+                runs.append((start, start + count - 1))
+                break
+
+        # ... otherwise, fill the block from consecutive free runs
+        else:
+            remaining = count
+            for start, end in order():
+                end = min(end, start + remaining - 1)
+                runs.append((start, end))
+                remaining -= end - start + 1
+                if remaining == 0: break
+
+            # the part of the first interval below self._next_key is only reached after wrapping around
+            if remaining:
+                runs.append((first_interval[0], first_interval[0] + remaining - 1))
+
+        # take each run out of the free intervals, which makes its keys members of the set
+        for first, last in runs:
+            self._allocate(first, last)
+        self._key_count += count
+
+        # prepare to continue after the last reserved run for the next allocation
+        self._next_key = runs[-1][1] + 1
+
+        return KeyRange(runs, self._pad_to)
+    # END generate_many()
+
+    @_synchronized
+    def reserve(self, keys) -> 'KeyRange':
+        '''
+        Adds specific keys to the set, such as the primary keys of a table that is being restored
+        from a file.  Consecutive keys are reserved as runs, so reserving a dense block of keys
+        costs one step per run rather than one per key.
+        Parameters
+        ----------
+        keys : iterable of int, or KeyRange
+            the keys to reserve
+        Raises
+        ------
+        KeyUnavailable : Exception
+            when one of the keys is already a member of the set, or is out of bounds; the keys
+            before it in sorted order have been reserved by then
+        '''
+        # group the sorted keys into runs of consecutive integers; a KeyRange already holds its runs
+        runs = list()
+        if isinstance(keys, KeyRange):
+            runs = sorted(list(run) for run in keys.runs)
+        else:
+            for key in sorted(int(key) for key in keys):
+                if runs and key == runs[-1][1] + 1:
+                    runs[-1][1] = key
+                else:
+                    runs.append([key, key])
+
+        for first, last in runs:
+            # the whole run has to fit in a single free interval
+            interval = self._free.floor(first)
+            if interval is None or interval[1] < first:
+                raise KeyUnavailable(first)
+            if interval[1] < last:
+                raise KeyUnavailable(interval[1] + 1)
+            self._allocate(first, last)
+            self._key_count += last - first + 1
+
+        return KeyRange((tuple(run) for run in runs), self._pad_to)
+    # END reserve()
+
+    @property
+    def next_key(self) -> int:
+        '''
+        The integer from which the next call to generate_new() or generate_many() starts looking for a free key.
+        '''
+        return self._next_key
+
+    @next_key.setter
+    def next_key(self, next_key: int) -> None:
+        self._next_key = next_key
+
+    @property
+    def minimum_valid_key(self) -> int:
+        return self._minimum_valid_key
+
+    @property
+    def maximum_valid_key(self) -> int:
+        return self._maximum_valid_key
+
+    def free_count(self) -> int:
+        '''
+        Returns the number of unique, unused values left between the minimum and maximum valid keys.
+        '''
+        return self._maximum_valid_key - self._minimum_valid_key + 1 - self._key_count
+
+    def is_full(self) -> bool:
+        '''
+        Returns True when there are no unique, unused values left between the minimum and maximum valid keys.
+        '''
+        return not self._free
+
+    def _allocate(self, first: int, last: int = None) -> None:
+        '''
+        This is a private method intended for internal use only.
+        This method removes a single key, or a contiguous run of keys [first...last], from the free
+        interval holding them, splitting the interval in two when the run falls in the middle of it.
+        '''
+        if last == None:
+            last = first
+        start, end = self._free.floor(first)
+
+        # the run covered the whole interval, so the interval disappears entirely
+        if first == start and last == end:
+            self._free.remove(start)
+
+        # the run was at one edge of the interval, so the interval shrinks
+        elif first == start:
+            self._free.replace(start, last + 1, end)
+        elif last == end:
+            self._free.replace(start, start, first - 1)
+
+        # the run was in the middle of the interval, so the interval is split around it
+        else:
+            self._free.replace(start, start, first - 1)
+            self._free.add(last + 1, end)
+    # END _allocate()
+
+    def _release(self, key: int) -> None:
+        '''
+        This is a private method intended for internal use only.
+        This method returns a single key to the free intervals, merging it with the neighbouring
+        intervals when they are adjacent to it.
+        '''
+        # the free intervals right before and right after the key, if any
+        left = self._free.floor(key)
+        right = self._free.find(key)
+
+        joins_left = left is not None and left[1] == key - 1
+        joins_right = right is not None and right[0] == key + 1
+
+        # the key closes the gap between two free intervals, so they become one
+        if joins_left and joins_right:
+            self._free.remove(right[0])
+            self._free.replace(left[0], left[0], right[1])
+        elif joins_left:
+            self._free.replace(left[0], left[0], key)
+        elif joins_right:
+            self._free.replace(right[0], key, right[1])
+
+        # the key is not adjacent to any free interval, so it becomes an interval of its own
+        else:
+            self._free.add(key, key)
+    # END _release()
+
+    def _resize_free_intervals(self, old_minimum: int, old_maximum: int) -> None:
+        '''
+        This is a private method intended for internal use only.
+        This method trims or extends the free intervals so that they match the current minimum
+        and maximum valid keys after either of them changes.
+        Parameters
+        ----------
+        old_minimum : int
+            the minimum valid key before the change
+        old_maximum : int
+            the maximum valid key before the change
+        '''
+        free = self._free
+        # a raised minimum drops or trims the free intervals that now lie (partly) below it
+        while free and free.first()[1] < self._minimum_valid_key:
+            free.remove(free.first()[0])
+        if free and free.first()[0] < self._minimum_valid_key:
+            start, end = free.first()
+            free.replace(start, self._minimum_valid_key, end)
+
+        # a lowered maximum drops or trims the free intervals that now lie (partly) above it
+        while free and free.last()[0] > self._maximum_valid_key:
+            free.remove(free.last()[0])
+        if free and free.last()[1] > self._maximum_valid_key:
+            start, end = free.last()
+            free.replace(start, start, self._maximum_valid_key)
+
+        # a lowered minimum opens up new free keys below the old minimum
+        if self._minimum_valid_key < old_minimum:
+            if free and free.first()[0] == old_minimum:
+                start, end = free.first()
+                free.replace(start, self._minimum_valid_key, end)
+            else:
+                free.add(self._minimum_valid_key, min(old_minimum - 1, self._maximum_valid_key))
+
+        # a raised maximum opens up new free keys above the old maximum
+        if self._maximum_valid_key > old_maximum:
+            if free and free.last()[1] == old_maximum:
+                start, end = free.last()
+                free.replace(start, start, self._maximum_valid_key)
+            else:
+                free.add(max(old_maximum + 1, self._minimum_valid_key), self._maximum_valid_key)
+    # END _resize_free_intervals()
+
     def __str__(self) -> str:
         # if the set is empty, outupt a string indicating an empty set
-        if self._key_set == set(): return "{Ø}"
+        if self._key_count == 0: return "{Ø}"
         # ... otherwise, output the set elements each on their own line
-        return str('\n'.join(str(entry) for entry in self._key_set))
+        return str('\n'.join(str(entry).zfill(self._pad_to) for entry in self))
+
+    def __len__(self) -> int:
+        return self._key_count
+
+    def __iter__(self):
+        '''
+        Yields the integer value of every member of the set in ascending order, by walking the
+        gaps between the free intervals.
+        '''
+        previous_end = self._minimum_valid_key - 1
+        for start, end in self._free:
+            yield from range(previous_end + 1, start)
+            previous_end = end
+        yield from range(previous_end + 1, self._maximum_valid_key + 1)
+
+    def __contains__(self, key) -> bool:
+        # Keys and integers are both accepted, as with Key equality
+        key = int(key)
+        if key < self._minimum_valid_key or key > self._maximum_valid_key:
+            return False
+
+        # the key is a member unless the last free interval starting at or before it also covers it
+        interval = self._free.floor(key)
+        return interval is None or interval[1] < key
+
+    @property
+    def smallest_key(self) -> int:
+        '''
+        The smallest member of the set, or None when the set is empty.
+        The free intervals are kept sorted, so the smallest member is either the minimum valid key
+        or the integer right after the first free interval; either way no member is visited.
+        '''
+        if self._key_count == 0:
+            return None
+        first = self._free.first()
+        if first is None or first[0] > self._minimum_valid_key:
+            return self._minimum_valid_key
+        return first[1] + 1
+
+    @property
+    def largest_key(self) -> int:
+        '''
+        The largest member of the set, or None when the set is empty.
+        This is either the maximum valid key or the integer right before the last free interval.
+        '''
+        if self._key_count == 0:
+            return None
+        last = self._free.last()
+        if last is None or last[1] < self._maximum_valid_key:
+            return self._maximum_valid_key
+        return last[0] - 1
+
+    def key(self, value: int) -> Key:
+        '''
+        Returns a Key object for displaying the given integer with this set's padding.
+        '''
+        return Key(value, self._pad_to)
 
     @property
     def pad_to(self):
@@ -196,9 +795,10 @@ class KeySet:
     @pad_to.setter
     def pad_to(self, pad_to: int = None) -> None:
         '''
-        This is a private method intended for internal use only.
         This method changes the padding of left zeros for every Key element in the set.
-        Parameters)
+        The members of the set are stored as plain integers and only padded when they are
+        displayed, so this does not need to visit any of them.
+        Parameters
         ----------
         padding : int
             pad with zeros to the left of the Keys in the set to fill out this many digits
@@ -218,10 +818,7 @@ class KeySet:
             # set the padding to the override value provided
             self._pad_to = pad_to
 
-        # iterate through the set and update the pad_to value of each Key object to ensure uniform padding throughout
-        for entry in self._key_set:
-            entry._pad_to = pad_to
-
+    @_synchronized
     def set_maximum_valid_key(self, new_maximum_valid_key: int) -> None:
         '''
         This method allows the user to update the maximum valid key for this set.
@@ -233,13 +830,16 @@ class KeySet:
         ------
         FailureToSetLowerMaximum : Exception
             when the user attempts to update the new maximum valid key for the set to a value
-            that is less than any value in the set
+            that is less than the largest Key in the set
         '''
-        if new_maximum_valid_key < any(self._key_set):
-            raise FailureToLowerMaximum(new_maximum_valid_key, max(self._key_set))
+        if self._key_count and new_maximum_valid_key < self.largest_key:
+            raise FailureToLowerMaximum(new_maximum_valid_key, self.largest_key)
+        old_maximum_valid_key = self._maximum_valid_key
         self._maximum_valid_key = new_maximum_valid_key
+        self._resize_free_intervals(self._minimum_valid_key, old_maximum_valid_key)
         self.pad_to = len(str(self._maximum_valid_key))
 
+    @_synchronized
     def set_minimum_valid_key(self, new_minimum_valid_key: int) -> None:
         '''
         This method allows the user to update the minimum valid key for this set.
@@ -251,31 +851,122 @@ class KeySet:
         ------
         FailureToSetHigherMinimum : Exception
             when the user attempts to update the new minimum valid key for the set to a value
-            that is greater than any value in the set
+            that is greater than the smallest Key in the set
         '''
-        if new_minimum_valid_key > any(self._key_set):
-            raise FailureToRaiseMinimum(new_minimum_valid_key, min(self._key_set))
+        if self._key_count and new_minimum_valid_key > self.smallest_key:
+            raise FailureToRaiseMinimum(new_minimum_valid_key, self.smallest_key)
+        old_minimum_valid_key = self._minimum_valid_key
         self._minimum_valid_key = new_minimum_valid_key
+        self._resize_free_intervals(old_minimum_valid_key, self._maximum_valid_key)
 
     def get_key_set(self) -> set:
         '''
         A simple getter-method for the entire set.
-        Because the __str__() method is overriden, this can be called to a string, in which case it will
-        output as a vertical list of the elements of the set
+        The members are stored as plain integers, so the Key objects in the returned set are
+        created by this call, padded to match the set.
         '''
-        return self._id_set
+        return set(Key(entry, self._pad_to) for entry in self)
 
+    @_synchronized
     def remove_key(self, *keys_to_remove: int) -> None:
         '''
-        This method allows one or more Key objects to be removed from the set
+        This method allows one or more Key objects to be removed from the set.  Removing a member
+        prints nothing, since tables remove keys in bulk, as when a change log is replayed.
         '''
         for key_to_remove in keys_to_remove:
-            if key_to_remove in self._key_set:
-                self._key_set.remove(key_to_remove)
-                print(f'Key [{key_to_remove}] was successfully removed from this KeySet.')
+            if key_to_remove in self:
+                self._release(int(key_to_remove))
+                self._key_count -= 1
             else:
                 print(f'{key_to_remove} could not be removed because it was not a member of this KeySet.  Set boundaries: [{self._minimum_valid_key}...{self._maximum_valid_key}]')
 
+class _Batch:
+    '''
+    The keys that one thread has reserved from a KeySet and not taken yet, first to last.  It is
+    held only by the thread's KeyBatches._local, so it goes when the thread ends, and its
+    finalizer then returns the keys left in it.
+    '''
+    __slots__ = ('keys', 'finalizer', '__weakref__')
+
+    def __init__(self, key_set: KeySet) -> None:
+        self.keys: list = list()
+        # given the key list rather than the batch, which it would otherwise keep alive
+        self.finalizer = weakref.finalize(self, _return_keys, key_set, self.keys)
+        # keys left in a batch at exit do not need returning
+        self.finalizer.atexit = False
+    # END __init__()
+
+def _return_keys(key_set: KeySet, keys: list) -> None:
+    # runs at most once per batch, in the thread that drops it or in KeyBatches.close()
+    with key_set._lock:
+        for key in keys:
+            key_set._release(key)
+        key_set._key_count -= len(keys)
+        keys.clear()
+
+class KeyBatches:
+    '''
+    KeyBatches hands out the keys of one KeySet to several threads at once.  Each thread reserves
+    a batch of keys from the KeySet at a time with generate_many(), which holds the KeySet's lock,
+    and then takes keys from its own batch without any lock, so that threads adding records
+    together only meet on the KeySet once per batch.  The keys a thread has reserved but not
+    taken yet are members of the KeySet until they are returned: when the thread ends, when it
+    calls release(), or when close() returns the keys of every thread.
+    '''
+    def __init__(self, key_set: KeySet, batch_size: int = 256) -> None:
+        self._key_set: KeySet = key_set
+        self._batch_size: int = batch_size
+        # the _Batch of each thread
+        self._local = threading.local()
+        # every _Batch still holding keys, for close()
+        self._batches = weakref.WeakSet()
+    # END __init__()
+
+    def take(self, count: int) -> list:
+        '''
+        Returns count new keys, as integers, for the calling thread.
+
+        Raises
+        ------
+        KeySetFull : Exception
+            when the KeySet does not have enough unused keys left for a new batch
+        '''
+        # a request as big as a batch is reserved on its own, so that it stays one contiguous run
+        if count >= self._batch_size:
+            return list(self._key_set.generate_many(count))
+        batch = getattr(self._local, 'batch', None)
+        if batch is None or not batch.finalizer.alive:
+            # a thread's first batch, or its next one once release() or close() returned its keys
+            batch = self._local.batch = _Batch(self._key_set)
+            self._batches.add(batch)
+        keys = batch.keys
+        if len(keys) < count:
+            keys.extend(self._key_set.generate_many(self._batch_size))
+        taken = keys[:count]
+        del keys[:count]
+        return taken
+
+    def release(self) -> None:
+        '''
+        Returns the keys that the calling thread has reserved but not taken to the KeySet.
+        '''
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.finalizer()
+
+    def close(self) -> None:
+        '''
+        Returns the keys that every thread has reserved but not taken to the KeySet.  Call it once
+        no thread is taking keys, such as when the table they are for is closed; a thread that
+        takes keys afterwards reserves a new batch.
+        '''
+        for batch in tuple(self._batches):
+            batch.finalizer()
+
+    @property
+    def key_set(self) -> KeySet:
+        return self._key_set
+
 #######################################################
 #Testing code:
 #######################################################
@@ -305,6 +996,9 @@ if __name__ == '__main__':
     my_key_set.remove_key(my_key)
     print(my_key_set)
 
+    print('\ngenerate_many(5):')
+    print(my_key_set.generate_many(5))
+
     print('\nset_maximum_valid_key(110020):')
     my_key_set.set_maximum_valid_key(110020)
     print(my_key_set)
\ No newline at end of file
@@ -1,74 +1,502 @@
-from KeySet import KeySet, Key
-from Table import Table
-from typing import OrderedDict
+from KeySet import KeySet, Key, KeyBatches
+from Table import Table, record_type, render_lines
+from Index import INDEX_KINDS, LockedIndex
+from Query import Query
+from Snapshot import PagedRecords, RecordsSnapshot, TableSnapshot, RECORDS_PER_PAGE
+from contextlib import contextmanager, ExitStack, nullcontext
+import threading
+
+# the number of locks the primary keys of a concurrent KeyTable are spread over, and the number of
+# consecutive keys that share a lock, so that a batch of keys handed to one thread mostly shares one lock;
+# a stripe is one page of the records (see Snapshot.PagedRecords), so a page only has one writer at a time
+KEY_STRIPES = 64
+KEYS_PER_STRIPE = RECORDS_PER_PAGE
+
+class CommitGate:
+    '''
+    A CommitGate lets any number of writers commit changes to a concurrent KeyTable at the same
+    time, or lets one thread pause them all, such as to copy the records and start logging them
+    without missing a change in between.  A pause waits for the commits in progress to finish,
+    and new commits wait for the pause to end; the thread holding a pause may still commit.
+    '''
+    def __init__(self) -> None:
+        self._condition = threading.Condition(threading.Lock())
+        self._committing: int = 0
+        self._pauses_waiting: int = 0
+        self._owner: int = None
+        self._depth: int = 0
+    # END __init__()
+
+    @contextmanager
+    def commit(self):
+        thread = threading.get_ident()
+        with self._condition:
+            if self._owner != thread:
+                # a pause that is waiting goes first, so that a stream of commits cannot hold it off forever
+                while self._owner is not None or self._pauses_waiting:
+                    self._condition.wait()
+                self._committing += 1
+        try:
+            yield
+        finally:
+            if self._owner != thread:
+                with self._condition:
+                    self._committing -= 1
+                    if not self._committing:
+                        self._condition.notify_all()
+
+    @contextmanager
+    def paused(self):
+        thread = threading.get_ident()
+        with self._condition:
+            if self._owner == thread:
+                self._depth += 1
+            else:
+                self._pauses_waiting += 1
+                while self._owner is not None or self._committing:
+                    self._condition.wait()
+                self._pauses_waiting -= 1
+                self._owner = thread
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._depth -= 1
+                if not self._depth:
+                    self._owner = None
+                    self._condition.notify_all()
+
+class _ChangeCount(threading.local):
+    '''
+    The number of records that one thread has added, restored or removed; each thread sees its own.
+    '''
+    count: int = 0
 
 class KeyTable(Table):
-    def __init__(self, categories: set, primary_key_set: KeySet = KeySet(0,99999)) -> None:
-        
+    def __init__(self, categories: set, primary_key_set: KeySet = None, storage: str = 'rows', concurrent: bool = False) -> None:
+        '''
+        Parameters
+        ----------
+        categories : tuple
+            the names of the fields of each record, in order
+        primary_key_set : KeySet
+            the KeySet the primary keys are generated from
+            DEFAULT = a new KeySet(0, 99999)
+        storage : str
+            'rows' or 'columns'; see Table
+        concurrent : bool
+            let several threads add, update and remove records at once, while other threads read
+            the table:
+                - primary keys are handed to each thread in batches; see KeySet.KeyBatches
+                - the records are built before any lock is taken, and each change then holds
+                  only the locks of the primary keys it changes, of each index in turn and of
+                  each listener in turn, so writers of different records do not wait for one another
+                - the records property returns a snapshot of the records (see snapshot()),
+                  which readers iterate while writers go on changing the table
+            Only row storage can be concurrent.
+
+        Raises
+        ------
+        ValueError
+            when concurrent is True with columnar storage
+        '''
+        # each KeyTable gets its own KeySet unless one is provided, so that tables never share primary keys
+        if primary_key_set == None:
+            primary_key_set = KeySet(0,99999)
         self.__primary_key_set = primary_key_set
         self.__categories_set = set(categories)
         self.__categories = tuple(categories)
-        self.__records = OrderedDict()
-        super(KeyTable, self).__init__(categories)
+        if storage == 'columns':
+            if concurrent:
+                raise ValueError('ERROR: Only a KeyTable with row storage can be concurrent.')
+            # imported here, since ColumnStore imports NumPy, which row tables never need
+            from ColumnStore import ColumnarRecords
+            self.__records = ColumnarRecords(self.__categories, record_type(self.__categories))
+        else:
+            # a concurrent table publishes its pages, so that a snapshot never waits for the writers
+            self.__records = PagedRecords(published=concurrent)
+        # secondary indexes, by category; see create_index()
+        self.__indexes = dict()
+        # other objects kept current with the records, such as a change log; see add_listener()
+        self.__listeners = list()
+        self.__concurrent = concurrent
+        # the records each thread has changed, bumped as each change is committed; see changed_records
+        self.__changed = _ChangeCount()
+        if concurrent:
+            self.__key_batches = KeyBatches(primary_key_set)
+            self.__gate = CommitGate()
+            self.__key_locks = [threading.Lock() for stripe in range(KEY_STRIPES)]
+            # the lock of each index (by category) and of each listener (by id)
+            self.__locks = dict()
+        super(KeyTable, self).__init__(categories, storage)
     # END __init__()
 
-    def __add_record(self, record_to_add: tuple):
+    def _new_store(self) -> None:
+        # the records are kept by primary key in the store made in __init__(), so the store of a Table is never needed
+        return None
+
+    def __build_record(self, record_to_add: tuple):
         '''
-        Adds one or more records to the Table.
+        Builds a row of the table's record type from a tuple of fields.  Extra fields are truncated,
+        and missing fields at the end of the tuple are filled in with None.
 
         Parameter
         ---------
-        key_override: int
-            The primary key value you would like to use for this record
-            If the key already exists, it will assign the next valid, uniqe
-            value instead.
-        *records : tuple
-            The records to be added to the table
+        record_to_add : tuple
+            The record to be added to the table
             NOTE: do not include the primary key for the record in the tuple
-                    
-        '''
-        
-        #if len(record_to_add) == len(self.__categories):
-        primary_key_to_add: Key = self.__primary_key_set.generate_new()
-        fields_to_add: dict = dict()
-        for column, data in enumerate(record_to_add):
-                try:
-                    fields_to_add[self.__categories[column-1]] = data
-                except IndexError:
-                    print('IndexError(Handled): Found more fields than table categories, extra fields were truncated.')
-        record_to_add: OrderedDict = {primary_key_to_add: fields_to_add}
-        self.__records[primary_key_to_add._key] = fields_to_add
+
+        '''
+        category_count = len(self.__categories)
+        if len(record_to_add) > category_count:
+            print('IndexError(Handled): Found more fields than table categories, extra fields were truncated.')
+            record_to_add = record_to_add[:category_count]
+        elif len(record_to_add) < category_count:
+            record_to_add = tuple(record_to_add) + (None,) * (category_count - len(record_to_add))
+        return self.record_type(record_to_add)
+
+    def __locked_keys(self, primary_keys):
+        '''
+        Returns a context manager that holds the locks of some primary keys, taken in a fixed order
+        so that two writers can never each wait for a lock the other holds.
+        '''
+        stripes = sorted({primary_key // KEYS_PER_STRIPE % KEY_STRIPES for primary_key in primary_keys})
+        locks = ExitStack()
+        for stripe in stripes:
+            locks.enter_context(self.__key_locks[stripe])
+        return locks
+
+    def __notify(self, change: str, *arguments) -> None:
+        '''
+        Tells every index, then every listener, about a change to the records.  In concurrent mode
+        each of them is changed while holding its own lock only; changes to different records
+        reach them in any order, but the changes to one record are kept in order by its key lock.
+        '''
+        if not self.__concurrent:
+            for index in self.__indexes.values():
+                getattr(index, change)(*arguments)
+            for listener in self.__listeners:
+                getattr(listener, change)(*arguments)
+            return
+        for category, index in self.__indexes.items():
+            with self.__locks[category]:
+                getattr(index, change)(*arguments)
+        for listener in self.__listeners:
+            with self.__locks[id(listener)]:
+                getattr(listener, change)(*arguments)
+
+    def __commit_pairs(self, pairs_to_add: list) -> None:
+        if not self.__concurrent:
+            self.__records.update(pairs_to_add)
+            self.__notify('add_many', pairs_to_add)
+            self.__changed.count += len(pairs_to_add)
+            return
+        with self.__gate.commit(), self.__locked_keys(primary_key for primary_key, record in pairs_to_add):
+            self.__records.update(pairs_to_add)
+            self.__notify('add_many', pairs_to_add)
+            self.__changed.count += len(pairs_to_add)
 
     def add_records(self, records_to_add):
-        for record_to_add in records_to_add:
-            if isinstance(record_to_add, tuple):
-                self.__add_record(record_to_add)
-            else:
-                self.__add_record(records_to_add)
-                return
+        '''
+        Adds one or more records to the Table.  The primary keys for every record are reserved
+        from the table's KeySet together, in a single block.
+
+        Parameter
+        ---------
+        records_to_add : tuple
+            Either a single record as a tuple of fields, or a tuple of such records
+            NOTE: do not include the primary keys for the records in the tuples
+
+        Returns
+        -------
+        iterable of int
+            the primary keys given to the records, in the order of the records
+        '''
+        # a tuple made up only of tuples holds several records; anything else is one record
+        if all(isinstance(record_to_add, tuple) for record_to_add in records_to_add):
+            records_to_add = tuple(records_to_add)
+        else:
+            records_to_add = (records_to_add,)
+
+        if self.__concurrent:
+            primary_keys_to_add = self.__key_batches.take(len(records_to_add))
+        else:
+            primary_keys_to_add = self.__primary_key_set.generate_many(len(records_to_add))
+        # records that already hold one field per category skip the truncating/padding step
+        category_count = len(self.__categories)
+        if all(len(record_to_add) == category_count for record_to_add in records_to_add):
+            build_record = self.record_type
+        else:
+            build_record = self.__build_record
+        self.__commit_pairs(list(zip(primary_keys_to_add, map(build_record, records_to_add))))
+        return primary_keys_to_add
+
+    def restore_records(self, primary_keys, records_to_add) -> None:
+        '''
+        Adds records under primary keys chosen by the caller instead of newly generated ones,
+        for restoring a table that was saved to a file.  The keys are reserved in the KeySet.
+
+        Parameter
+        ---------
+        primary_keys : iterable of int
+            The primary key of each record
+        records_to_add : iterable of tuple
+            The records, in the same order as their primary keys
+        '''
+        primary_keys = list(primary_keys)
+        self.__primary_key_set.reserve(primary_keys)
+        self.__commit_pairs(list(zip(primary_keys, map(self.__build_record, records_to_add))))
+
+    @classmethod
+    def new_empty(cls, categories: tuple, primary_key_set: KeySet, storage: str = 'rows', concurrent: bool = False) -> 'KeyTable':
+        '''
+        Creates an empty table of this class, for restoring a table that was saved to a file.
+        Subclasses with fixed categories override this to ignore the categories argument.
+        '''
+        return cls(categories, primary_key_set, storage, concurrent)
+
+    def retrieve_by_key(self, primary_key: int):
+        '''
+        Returns the record stored under a primary key, or None if there is no such record.
+        '''
+        return self.__records.get(int(primary_key))
+
+    def update_record(self, primary_key: int, changes: dict):
+        '''
+        Replaces some of the fields of a record, and returns the updated record.
+
+        Parameter
+        ---------
+        primary_key : int
+            The primary key of the record to update
+        changes : dict
+            {category: new_value} for each field to replace
+
+        Raises
+        ------
+        KeyError
+            when there is no record with that primary key, or a category is not in the table
+        '''
+        primary_key = int(primary_key)
+        with self.__gate.commit() if self.__concurrent else nullcontext(), \
+             self.__locked_keys((primary_key,)) if self.__concurrent else nullcontext():
+            old_record = self.__records[primary_key]
+            new_record = old_record.replace(changes)
+            self.__records[primary_key] = new_record
+            self.__notify('update', primary_key, old_record, new_record)
+        return new_record
+
+    def remove_records(self, *primary_keys: int) -> None:
+        '''
+        Removes one or more records from the table, and returns their primary keys to the KeySet.
+        '''
+        for primary_key in primary_keys:
+            primary_key = int(primary_key)
+            with self.__gate.commit() if self.__concurrent else nullcontext(), \
+                 self.__locked_keys((primary_key,)) if self.__concurrent else nullcontext():
+                record = self.__records.pop(primary_key, None)
+                if record is not None:
+                    self.__notify('remove', primary_key, record)
+                    self.__changed.count += 1
+            if record is None:
+                print(f'{primary_key} could not be removed because it is not the primary key of a record in this table.')
+                continue
+            self.__primary_key_set.remove_key(primary_key)
+
+    def paused_writes(self):
+        '''
+        Returns a context manager that holds off every writer of a concurrent KeyTable, once the
+        changes in progress are finished, such as to copy the records and start a change log
+        without missing a change in between.  The thread holding the pause may still change the
+        table.  For a KeyTable that is not concurrent, it does nothing.
+        '''
+        return self.__gate.paused() if self.__concurrent else nullcontext()
 
-    def __str__(self):
+    def release_reserved_keys(self) -> None:
         '''
-        I must not understand something important about inheritance here, because the code below
-        is exactly the same code in the superclass, but if I don't overload this method, it does
-        not seem to understand any of the instance variables
+        Returns to the primary key set the keys that the threads adding records to a concurrent
+        KeyTable have reserved but not used (see KeySet.KeyBatches), such as when the table is
+        closed.  A thread's keys are also returned when it ends.  For a KeyTable that is not
+        concurrent, it does nothing.
+        '''
+        if self.__concurrent:
+            self.__key_batches.close()
+
+    def snapshot(self) -> TableSnapshot:
+        '''
+        Returns an immutable, point-in-time view of the table (see Snapshot.TableSnapshot), for
+        long reports and exports that should neither block the writers nor see their changes.
+        With row storage it is taken in O(1): the pages of records are shared with the snapshot,
+        and a page is only copied when it is first changed afterwards.  Old versions of the pages
+        are freed once no snapshot refers to them.  A concurrent table takes it without pausing
+        its writers, as a copy of the directory of pages, which its writers never change in place
+        (see PagedRecords); a change in progress is either in the snapshot or not, whole.
+        Columnar storage has no pages to share, so its snapshot is a copy of the records, taken in O(n).
+        '''
+        if self.storage == 'columns':
+            records = RecordsSnapshot.copy_of(self.__records.items())
+        else:
+            records = self.__records.snapshot()
+        return TableSnapshot(self, records)
+
+    def create_index(self, category: str, kind: str = 'hash'):
         '''
-        # store the formatted heading line because we will need it's length to generate a separater line
-        heading = f'{"Key":5s}\t'
-        for field in self.__categories:
-            heading += f'{str(field):20s} \t'
+        Builds a secondary index on a category, which find() and find_between() then use instead
+        of scanning every record.  The index is kept current as records are added, updated and removed.
+
+        Parameter
+        ---------
+        category : str
+            The category to index
+        kind : str
+            'hash' for O(1) equality lookups, or 'sorted' for O(log n + k) equality and range lookups
+
+        Raises
+        ------
+        KeyError
+            when the category is not in the table
+        ValueError
+            when the kind of index is unknown
+        '''
+        if category not in self.categories_set:
+            raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+        if kind not in INDEX_KINDS:
+            raise ValueError(f'ERROR: Unknown kind of index {kind!r}, expected one of {tuple(INDEX_KINDS)}.')
+        index = INDEX_KINDS[kind](category)
+        # the index starts out with every record, so no change may slip in before it is registered
+        with self.paused_writes():
+            index.add_many(list(self.__records.items()))
+            if self.__concurrent:
+                self.__locks[category] = threading.Lock()
+            self.__indexes[category] = index
+        return index
+
+    def drop_index(self, category: str) -> None:
+        with self.paused_writes():
+            del self.__indexes[category]
 
-        body = ''
-        for primary_key, fields in self.__records.items():
-            body += f'\n{str(primary_key):5s}\t'
-            for data in fields.values():
-                body += f'{str(data):20s}\t'
+    @property
+    def indexes(self) -> dict:
+        if self.__concurrent:
+            # lookups hold the lock of the index, since writers may be changing it
+            return {category: LockedIndex(index, self.__locks[category]) for category, index in self.__indexes.items()}
+        return self.__indexes
+
+    def add_listener(self, listener) -> None:
+        '''
+        Registers an object to be told about every change to the table's records, after the
+        change is made.  Like an index, a listener provides:
+            add_many(pairs)                            (primary_key, record) pairs that were added
+            update(primary_key, old_record, new_record)
+            remove(primary_key, record)
+        In concurrent mode, a listener is only ever told about one change at a time.
+        '''
+        with self.paused_writes():
+            if self.__concurrent:
+                self.__locks[id(listener)] = threading.Lock()
+            self.__listeners.append(listener)
 
-        # start a new line and output the heading as a row of text with a row of '=' characters to
-        # separate the heading from the records in the table, then add each new record as a new line, 
-        # plus an extra blank line at the end
-        return f'\n{heading}\n{"=" * len(self.__categories)*23}{body}\n'
-    # END __str__()
+    def remove_listener(self, listener) -> None:
+        with self.paused_writes():
+            self.__listeners.remove(listener)
+            if self.__concurrent:
+                del self.__locks[id(listener)]
+
+    @property
+    def listeners(self) -> tuple:
+        return tuple(self.__listeners)
+
+    def find(self, category: str, value) -> dict:
+        '''
+        Returns {primary_key: record} for every record whose category equals value, using an
+        index on the category when there is one.
+        '''
+        records = self.records
+        index = self.indexes.get(category)
+        if index is not None:
+            primary_keys = index.equal(value)
+        elif self.storage == 'columns':
+            primary_keys = records.keys_equal(category, value)
+        else:
+            return {primary_key: record for primary_key, record in records.items() if record[category] == value}
+        return records.pick(primary_keys)
+
+    def find_between(self, category: str, low, high) -> dict:
+        '''
+        Returns {primary_key: record} for every record whose category is between low and high
+        (both inclusive).  A sorted index on the category is used when there is one, in which
+        case the records are ordered by the category.
+        '''
+        records = self.records
+        index = self.indexes.get(category)
+        if index is not None and index.kind == 'sorted':
+            primary_keys = index.between(low, high)
+        elif self.storage == 'columns':
+            primary_keys = records.keys_between(category, low, high)
+        else:
+            return {primary_key: record for primary_key, record in records.items()
+                    if record[category] is not None and low <= record[category] <= high}
+        return records.pick(primary_keys)
+
+    def query(self) -> Query:
+        '''
+        Starts a lazy query of the table's records; see Query.
+        '''
+        return Query(self)
+
+    def iter_lines(self):
+        '''
+        Yields the rendered table one line at a time, each ending with a newline, with the primary
+        key of each record in a leading 'Key' column, padded to match the KeySet.
+        '''
+        records = self.records
+        pad_to = self.__primary_key_set.pad_to
+        primary_keys = (str(primary_key).zfill(pad_to) for primary_key in records.keys())
+        return render_lines(self.__categories, records.values(), primary_keys)
+
+    @property
+    def records(self):
+        if self.__concurrent:
+            # a snapshot never waits for the writers, and is never changed by them afterwards
+            return self.snapshot().records
+        return self.__records
+
+    def freeze(self) -> tuple:
+        '''
+        Returns an immutable snapshot of the records currently in the KeyTable, in the order of records.values().
+        '''
+        return tuple(self.records.values())
+
+    @property
+    def changed_records(self) -> int:
+        '''
+        The number of records that the calling thread has added, restored or removed, counted as
+        each change is committed, so that the records changed by one call are the difference
+        before and after it, without counting the records or the changes of other threads.
+        '''
+        return self.__changed.count
+
+    @property
+    def concurrent(self) -> bool:
+        return self.__concurrent
+
+    def column(self, category: str) -> list:
+        '''
+        Returns the values of a category for every record, in order.
+        '''
+        if self.storage == 'columns':
+            return self.__records.column(category)
+        return [record[category] for record in self.records.values()]
+
+    def column_array(self, category: str):
+        '''
+        Returns a NumPy array of the raw typed values of a category (see ColumnStore.Column) for
+        vectorized scans, or None unless the KeyTable uses columnar storage and NumPy is installed.
+        '''
+        if self.storage == 'columns':
+            return self.__records.column_array(category)
+        return None
 
     @property
     def primary_key_set(self):
@@ -76,6 +504,9 @@ class KeyTable(Table):
 
     @primary_key_set.setter
     def primary_key_set(self, new_primary_key_set):
+        if self.__concurrent:
+            self.__key_batches.close()
+            self.__key_batches = KeyBatches(new_primary_key_set)
         self.__primary_key_set = new_primary_key_set
 
 #######################################################
@@ -93,4 +524,12 @@ if __name__ == '__main__':
     my_table = KeyTable(('Item Description', 'Serial #',  'Location',          'Purchase Date',   'Purchase Price', 'End of Life'))
     my_table.add_records(('HP Laptop',       12597856879, 'Recruiting Office', date(2020, 4, 23), Money(4_000),     date(2021,6,1)))
     print(my_table)
-    
\ No newline at end of file
+
+    my_table.create_index('Location')
+    print(my_table.find('Location', 'Recruiting Office'))
+
+    # the snapshot keeps the table as it was, while records go on being added to it
+    snapshot = my_table.snapshot()
+    my_table.add_records(('Dell Monitor',    48213377012, 'Accounting Office', date(2021, 1, 5),  Money(300),       date(2026,1,5)))
+    print(snapshot)
+    print(my_table)
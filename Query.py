@@ -0,0 +1,251 @@
+from heapq import nlargest, nsmallest
+from itertools import islice, tee
+from operator import itemgetter
+from Table import record_type, render_lines
+
+def _present(records, primary_keys):
+    '''
+    Yields (primary_key, record) for the primary keys that have a record.  The index of a
+    concurrent KeyTable may list a key removed since its records were taken.
+    '''
+    get = records.get
+    for primary_key in primary_keys:
+        record = get(primary_key)
+        if record is not None:
+            yield primary_key, record
+
+class Query:
+    '''
+    A Query describes a request for some of the records of a KeyTable, built up one step at a
+    time and only run when it is read:
+
+        table.query().where(Location='Recruiting').where_between('End of Life (EOL)', start, end)
+                     .select('Asset Description', 'End of Life (EOL)').order_by('End of Life (EOL)').limit(50)
+
+    Each step returns a new Query, so a Query can be reused as the start of several others.
+    When the query is read, the records are streamed through a pipeline of generators:
+        1. the candidate records come from the narrowest index that matches a condition, or from
+           a vectorized scan of columnar storage, and otherwise from a scan of every record
+        2. the remaining conditions are checked one record at a time
+        3. an order is kept from a sorted index when there is one; a limit after an order only
+           keeps the best records in a heap instead of sorting them all
+        4. the limit stops the pipeline early, and only the selected categories are kept
+    explain() describes the plan chosen for each of these steps.
+    '''
+    def __init__(self, table, equals: tuple = (), ranges: tuple = (), conditions: tuple = (),
+                 categories: tuple = None, order: tuple = None, count: int = None) -> None:
+        self.__table = table
+        # (category, value) pairs, (category, low, high) triples and functions of a record
+        self.__equals: tuple = equals
+        self.__ranges: tuple = ranges
+        self.__conditions: tuple = conditions
+        self.__categories: tuple = categories
+        # (category, descending)
+        self.__order: tuple = order
+        self.__count: int = count
+    # END __init__()
+
+    def __next_step(self, **changes) -> 'Query':
+        steps = {'equals': self.__equals, 'ranges': self.__ranges, 'conditions': self.__conditions,
+                 'categories': self.__categories, 'order': self.__order, 'count': self.__count}
+        steps.update(changes)
+        return Query(self.__table, **steps)
+
+    def __check_category(self, category: str) -> None:
+        if category not in self.__table.categories_set:
+            raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+
+    def where(self, condition = None, **equals) -> 'Query':
+        '''
+        Keeps only the records that meet a condition.
+
+        Parameters
+        ----------
+        condition : function
+            a function of a record that returns True for the records to keep; it cannot use an index
+        **equals :
+            {category: value} for categories that must equal a value; for a category whose name is
+            not a valid keyword, unpack a dict:  where(**{'End of Life (EOL)': day})
+        '''
+        for category in equals:
+            self.__check_category(category)
+        conditions = self.__conditions if condition is None else self.__conditions + (condition,)
+        return self.__next_step(equals=self.__equals + tuple(equals.items()), conditions=conditions)
+
+    def where_between(self, category: str, low, high) -> 'Query':
+        '''
+        Keeps only the records whose category is between low and high (both inclusive).
+        '''
+        self.__check_category(category)
+        return self.__next_step(ranges=self.__ranges + ((category, low, high),))
+
+    def select(self, *categories: str) -> 'Query':
+        '''
+        Keeps only some of the categories of each record, in the order given.
+        '''
+        for category in categories:
+            self.__check_category(category)
+        return self.__next_step(categories=categories)
+
+    def order_by(self, category: str, descending: bool = False) -> 'Query':
+        '''
+        Orders the records by a category.  Records whose value is None come last.
+        '''
+        self.__check_category(category)
+        return self.__next_step(order=(category, descending))
+
+    def limit(self, count: int) -> 'Query':
+        '''
+        Keeps only the first count records.
+        '''
+        if count < 0:
+            raise ValueError('ERROR: The limit of a query cannot be negative.')
+        return self.__next_step(count=count)
+
+    def __plan(self) -> tuple:
+        '''
+        Chooses how the candidate records are found: returns (description, primary keys or None
+        for a scan, the condition answered by them, whether they are already in the query order).
+        '''
+        indexes = self.__table.indexes
+        columnar = self.__table.storage == 'columns'
+        order_category, descending = self.__order or (None, False)
+
+        # the narrowest index lookup wins; the index lookups return lists, so their length is known
+        best = None
+        for category, value in self.__equals:
+            if category in indexes:
+                primary_keys = indexes[category].equal(value)
+                if best is None or len(primary_keys) < len(best[1]):
+                    best = (f'{indexes[category].kind} index lookup of {category} == {value!r}', primary_keys, ('equals', category, value), False)
+        for category, low, high in self.__ranges:
+            if category in indexes and indexes[category].kind == 'sorted':
+                primary_keys = indexes[category].between(low, high)
+                if descending:
+                    primary_keys.reverse()
+                if best is None or len(primary_keys) < len(best[1]):
+                    best = (f'sorted index range of {low!r} <= {category} <= {high!r}', primary_keys,
+                            ('ranges', category, low, high), category == order_category)
+        if best is not None:
+            return best
+
+        # a vectorized scan of one column finds the candidates without building every record
+        if columnar and self.__equals:
+            category, value = self.__equals[0]
+            return (f'columnar scan of {category} == {value!r}', self.__table.records.keys_equal(category, value),
+                    ('equals', category, value), False)
+        if columnar and self.__ranges:
+            category, low, high = self.__ranges[0]
+            return (f'columnar scan of {low!r} <= {category} <= {high!r}', self.__table.records.keys_between(category, low, high),
+                    ('ranges', category, low, high), False)
+
+        # with no condition answered by an index, a sorted index can still deliver the query order
+        if order_category in indexes and indexes[order_category].kind == 'sorted':
+            return (f'sorted index order of {order_category}', None, None, True)
+        return ('scan of every record', None, None, False)
+    # END __plan()
+
+    def __candidates(self, plan: tuple):
+        description, primary_keys, answered, ordered = plan
+        records = self.__table.records
+        if primary_keys is not None:
+            return _present(records, primary_keys)
+        if ordered:
+            category, descending = self.__order
+            return _present(records, (primary_key for value, primary_key in self.__table.indexes[category].ordered(descending)))
+        return records.items()
+
+    def __filters(self, answered: tuple) -> list:
+        # one function of a record per condition that the candidates do not already meet
+        filters = list()
+        for category, value in self.__equals:
+            if answered != ('equals', category, value):
+                filters.append(lambda record, category=category, value=value: record[category] == value)
+        for category, low, high in self.__ranges:
+            if answered != ('ranges', category, low, high):
+                filters.append(lambda record, category=category, low=low, high=high:
+                               record[category] is not None and low <= record[category] <= high)
+        return filters + list(self.__conditions)
+
+    def items(self):
+        '''
+        Runs the query, and yields (primary_key, record) pairs.
+        '''
+        plan = self.__plan()
+        pairs = self.__candidates(plan)
+
+        filters = self.__filters(plan[2])
+        if filters:
+            pairs = ((primary_key, record) for primary_key, record in pairs if all(check(record) for check in filters))
+
+        if self.__order is not None and not plan[3]:
+            category, descending = self.__order
+            # None sorts last whichever the direction; ties keep primary key order, like a sorted index
+            if descending:
+                sort_key = lambda pair: (pair[1][category] is not None, pair[1][category], pair[0])
+            else:
+                sort_key = lambda pair: (pair[1][category] is None, pair[1][category], pair[0])
+            if self.__count is not None:
+                select_top = nlargest if descending else nsmallest
+                pairs = iter(select_top(self.__count, pairs, key=sort_key))
+            else:
+                pairs = iter(sorted(pairs, key=sort_key, reverse=descending))
+
+        if self.__count is not None:
+            pairs = islice(pairs, self.__count)
+
+        if self.__categories is not None:
+            selected_type = record_type(self.__categories)
+            positions = [self.__table.record_type._positions[category] for category in self.__categories]
+            get_fields = itemgetter(*positions) if len(positions) > 1 else (lambda record, position=positions[0]: (record[position],))
+            pairs = ((primary_key, selected_type(get_fields(record))) for primary_key, record in pairs)
+        return pairs
+    # END items()
+
+    def __iter__(self):
+        return (record for primary_key, record in self.items())
+
+    def keys(self) -> list:
+        return [primary_key for primary_key, record in self.items()]
+
+    def count(self) -> int:
+        '''
+        Runs the query, and returns the number of records it finds.
+        '''
+        return sum(1 for pair in self.items())
+
+    def explain(self) -> str:
+        '''
+        Describes the plan that would be used to run the query.
+        '''
+        description, primary_keys, answered, ordered = self.__plan()
+        steps = [f'candidates: {description}']
+        filters = self.__filters(answered)
+        if filters:
+            steps.append(f'filter: {len(filters)} condition(s) checked per record')
+        if self.__order is not None:
+            category, descending = self.__order
+            direction = 'descending' if descending else 'ascending'
+            if ordered:
+                steps.append(f'order: {category} {direction}, kept from the index')
+            elif self.__count is not None:
+                steps.append(f'order: {category} {direction}, top {self.__count} kept in a heap')
+            else:
+                steps.append(f'order: {category} {direction}, sorted')
+        if self.__count is not None:
+            steps.append(f'limit: {self.__count}')
+        if self.__categories is not None:
+            steps.append(f'select: {", ".join(self.__categories)}')
+        return '\n'.join(steps)
+
+    def iter_lines(self):
+        '''
+        Yields the rendered results one line at a time, with the primary key of each record.
+        '''
+        pad_to = self.__table.primary_key_set.pad_to
+        key_pairs, record_pairs = tee(self.items())
+        return render_lines(self.__categories or self.__table.categories, (record for primary_key, record in record_pairs),
+                            (str(primary_key).zfill(pad_to) for primary_key, record in key_pairs))
+
+    def __str__(self) -> str:
+        return ''.join(self.iter_lines())
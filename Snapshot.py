@@ -0,0 +1,342 @@
+from collections.abc import Mapping, MutableMapping
+from itertools import chain, groupby
+from Table import render_lines
+import threading
+import weakref
+
+# the records of a KeyTable are kept in pages of consecutive primary keys; a page holds the same
+# run of keys as a lock stripe of a concurrent KeyTable, so only one writer ever changes a page at a time
+PAGE_BITS = 8
+RECORDS_PER_PAGE = 1 << PAGE_BITS
+
+def _page_of(pair: tuple) -> int:
+    return pair[0] >> PAGE_BITS
+
+class _Page(dict):
+    '''
+    A page of records, {primary_key: Record}, tagged with the generation of PagedRecords it was
+    last copied (or created) in.
+    '''
+    __slots__ = ('generation',)
+
+class _PagedMapping(Mapping):
+    '''
+    The lookups shared by PagedRecords and RecordsSnapshot, over a directory of pages,
+    {page number: _Page}.  Like ColumnarRecords, keys(), values() and items() return iterators.
+    They are generators, which hold on to the mapping until they are exhausted or dropped: a
+    snapshot must outlive every iterator over its pages, or its pages would be released and
+    changed in place while they are being read.
+    '''
+    _pages: dict
+
+    def __getitem__(self, key):
+        return self._pages[key >> PAGE_BITS][key]
+
+    def get(self, key, default = None):
+        page = self._pages.get(key >> PAGE_BITS)
+        return default if page is None else page.get(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self._pages.get(key >> PAGE_BITS, ())
+
+    def __len__(self) -> int:
+        return sum(map(len, self._pages.values()))
+
+    def __iter__(self):
+        yield from chain.from_iterable(self._pages.values())
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        yield from chain.from_iterable(map(dict.values, self._pages.values()))
+
+    def items(self):
+        yield from chain.from_iterable(map(dict.items, self._pages.values()))
+
+    def pick(self, primary_keys) -> dict:
+        '''
+        Returns {primary_key: record} for the primary keys that have a record, in their order,
+        such as for the primary keys found by an index.
+        '''
+        pages = self._pages
+        picked = dict()
+        for primary_key in primary_keys:
+            page = pages.get(primary_key >> PAGE_BITS)
+            if page is not None:
+                record = page.get(primary_key)
+                if record is not None:
+                    picked[primary_key] = record
+        return picked
+
+class PagedRecords(_PagedMapping, MutableMapping):
+    '''
+    PagedRecords is the row storage mode for the records of a KeyTable.  It is a mapping of
+    primary key -> Record, like a dict, split into pages of RECORDS_PER_PAGE consecutive keys
+    so that snapshot() can share the pages instead of copying them:
+
+        - a snapshot takes the current directory of pages as it is, in O(1)
+        - the first change to a page after a snapshot copies that page (and the first change of
+          all copies the directory of pages), so a snapshot never sees a later change
+        - the pages only held by snapshots are freed with the last snapshot that holds them,
+          and once no snapshot is left, the pages are changed in place again
+
+    The records are kept in the order their pages were created, and in the order they were added
+    within a page, which is the order they were added in while the primary keys only grow.
+
+    The records of a concurrent KeyTable are published instead: no page in the directory is ever
+    changed again, since each change copies the pages it touches and puts the copies in with a
+    single dict operation.  A snapshot is then a copy of the directory, taken without any lock
+    and without waiting for a writer, and it sees each change whole or not at all; the price is
+    a page copy per change, instead of one per page after each snapshot.
+    '''
+    def __init__(self, published: bool = False) -> None:
+        # page number -> _Page
+        self._pages: dict = dict()
+        self._published: bool = published
+        # pages (and the directory of pages) of the shared generation or older are held by a
+        # snapshot, and must be copied before they are changed; -1 while there is no snapshot
+        self._generation: int = 0
+        self._shared: int = -1
+        self._directory_generation: int = 0
+        self._snapshots: int = 0
+        # held while the directory of pages changes; reentrant, since a snapshot collected as
+        # garbage in the middle of a change releases its pages through the same lock
+        self._lock = threading.RLock()
+    # END __init__()
+
+    def __writable_directory(self) -> dict:
+        # only called while holding the lock
+        if self._directory_generation <= self._shared:
+            self._pages = dict(self._pages)
+            self._directory_generation = self._generation
+        return self._pages
+
+    def __writable_page(self, number: int) -> _Page:
+        '''
+        Returns the page of a page number that may be changed in place, copying it (and the
+        directory of pages) first if a snapshot holds it, or creating it if there is none.
+        '''
+        page = self._pages.get(number)
+        if page is not None and page.generation > self._shared:
+            return page
+        with self._lock:
+            pages = self.__writable_directory()
+            page = pages.get(number)
+            if page is not None and page.generation > self._shared:
+                return page
+            page = _Page() if page is None else _Page(page)
+            page.generation = self._generation
+            pages[number] = page
+            return page
+
+    def __setitem__(self, key, record) -> None:
+        number = key >> PAGE_BITS
+        if self._published:
+            page = _Page(self._pages.get(number, ()))
+            page[key] = record
+            self._pages[number] = page
+            return
+        self.__writable_page(number)[key] = record
+
+    def __delitem__(self, key) -> None:
+        number = key >> PAGE_BITS
+        if key not in self._pages.get(number, ()):
+            raise KeyError(key)
+        if self._published:
+            page = _Page(self._pages[number])
+            del page[key]
+            if page:
+                self._pages[number] = page
+            else:
+                del self._pages[number]
+            return
+        page = self.__writable_page(number)
+        del page[key]
+        if not page:
+            with self._lock:
+                del self.__writable_directory()[number]
+
+    def update(self, other = (), **keywords) -> None:
+        '''
+        Adds or replaces many records at once, one page at a time, which is the bulk-insert path
+        used by KeyTable.add_records().
+        '''
+        pairs = other.items() if hasattr(other, 'items') else other
+        if self._published:
+            # the copies of every page touched go in at once, so a snapshot sees all of them or none
+            copies = dict()
+            for number, page_pairs in groupby(pairs, _page_of):
+                page = copies.get(number)
+                if page is None:
+                    page = copies[number] = _Page(self._pages.get(number, ()))
+                page.update(page_pairs)
+            self._pages.update(copies)
+            return
+        for number, page_pairs in groupby(pairs, _page_of):
+            self.__writable_page(number).update(page_pairs)
+
+    def snapshot(self) -> 'RecordsSnapshot':
+        '''
+        Returns an immutable view of the records as they are now, in O(1).  No change may be in
+        progress while it is taken, unless the records are published, in which case it is a copy
+        of the directory of pages, in O(pages), and a change in progress is either in it or not.
+        '''
+        if self._published:
+            return RecordsSnapshot(dict(self._pages))
+        with self._lock:
+            # counted before the pages are marked as shared, in case an older snapshot is
+            # released in between
+            self._snapshots += 1
+            snapshot = RecordsSnapshot(self._pages)
+            self._shared = self._generation
+            self._generation += 1
+        weakref.finalize(snapshot, _release_pages, weakref.ref(self))
+        return snapshot
+
+    def _release(self) -> None:
+        with self._lock:
+            self._snapshots -= 1
+            if not self._snapshots:
+                self._shared = -1
+
+    @property
+    def snapshots(self) -> int:
+        '''
+        The number of snapshots of the records that are still held.
+        '''
+        return self._snapshots
+
+def _release_pages(reference) -> None:
+    # called once a snapshot is collected; the PagedRecords may already be gone too
+    records = reference()
+    if records is not None:
+        records._release()
+
+class RecordsSnapshot(_PagedMapping):
+    '''
+    A RecordsSnapshot is the immutable mapping of primary key -> Record returned by
+    PagedRecords.snapshot().  It shares its pages with the live records until they change.
+    '''
+    def __init__(self, pages: dict) -> None:
+        self._pages: dict = pages
+        self._length: int = None
+    # END __init__()
+
+    @classmethod
+    def copy_of(cls, pairs) -> 'RecordsSnapshot':
+        '''
+        Returns a snapshot holding a copy of some (primary_key, record) pairs, such as of records
+        that are not paged.
+        '''
+        pages = dict()
+        for number, page_pairs in groupby(pairs, _page_of):
+            pages.setdefault(number, _Page()).update(page_pairs)
+        return cls(pages)
+
+    def __len__(self) -> int:
+        # the pages of a snapshot never change, so they are only counted once
+        if self._length is None:
+            self._length = super().__len__()
+        return self._length
+
+class TableSnapshot:
+    '''
+    A TableSnapshot is an immutable, point-in-time view of a KeyTable, returned by
+    KeyTable.snapshot().  Long reports and exports read it while the table goes on changing:
+
+        snapshot = table.snapshot()
+        for primary_key, record in snapshot.records.items():
+            ...
+
+    It has no indexes, since they are not copied with the records, so find(), find_between()
+    and query() scan every record of the snapshot.
+    '''
+    storage = 'rows'
+    concurrent = False
+
+    def __init__(self, table, records: Mapping) -> None:
+        '''
+        Parameters
+        ----------
+        table : KeyTable
+            the table the snapshot was taken of
+        records : Mapping
+            the records of the table as they were when the snapshot was taken
+        '''
+        self._categories: tuple = table.categories
+        self._categories_set: set = table.categories_set
+        self._record_type: type = table.record_type
+        self._pad_to: int = table.primary_key_set.pad_to
+        self._records: Mapping = records
+    # END __init__()
+
+    def __str__(self) -> str:
+        return ''.join(self.iter_lines())
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def categories(self) -> tuple:
+        return self._categories
+
+    @property
+    def categories_set(self) -> set:
+        return self._categories_set
+
+    @property
+    def record_type(self) -> type:
+        return self._record_type
+
+    @property
+    def records(self) -> Mapping:
+        return self._records
+
+    @property
+    def indexes(self) -> dict:
+        return dict()
+
+    def retrieve_by_key(self, primary_key: int):
+        '''
+        Returns the record stored under a primary key, or None if there was no such record.
+        '''
+        return self._records.get(int(primary_key))
+
+    def find(self, category: str, value) -> dict:
+        '''
+        Returns {primary_key: record} for every record whose category equals value.
+        '''
+        return {primary_key: record for primary_key, record in self._records.items() if record[category] == value}
+
+    def find_between(self, category: str, low, high) -> dict:
+        '''
+        Returns {primary_key: record} for every record whose category is between low and high
+        (both inclusive).
+        '''
+        return {primary_key: record for primary_key, record in self._records.items()
+                if record[category] is not None and low <= record[category] <= high}
+
+    def column(self, category: str) -> list:
+        return [record[category] for record in self._records.values()]
+
+    def query(self):
+        '''
+        Starts a lazy query of the snapshot's records; see Query.
+        '''
+        from Query import Query
+        return Query(self)
+
+    def group_by(self, *categories: str, **derived: tuple):
+        '''
+        Groups the records of the snapshot for a roll-up with agg(); see GroupBy.
+        '''
+        from GroupBy import GroupBy
+        return GroupBy(self, categories, derived)
+
+    def iter_lines(self):
+        '''
+        Yields the rendered snapshot one line at a time, like KeyTable.iter_lines().
+        '''
+        primary_keys = (str(primary_key).zfill(self._pad_to) for primary_key in self._records.keys())
+        return render_lines(self._categories, self._records.values(), primary_keys)
@@ -0,0 +1,206 @@
+from itertools import repeat
+from GroupBy import _as_type
+from Table import Table, record_type
+
+class Summary:
+    '''
+    A Summary is a roll-up of a KeyTable, like table.group_by(...).agg(...), that is kept current
+    as the records change instead of being computed again each time it is read:
+
+        by_location = Summary(table, ('Location',), {}, sum='Purchase Price')
+        table.add_listener(by_location)
+        by_location['Recruiting']        # Record(Location, count, sum(Purchase Price))
+
+    It is a listener of the table (see KeyTable.add_listener()), and holds a running count and
+    running totals for each group, so reading a group costs O(1) whatever the size of the table,
+    and each added, updated or removed record only changes the groups it belongs to.
+    Only aggregates that can be taken back out when a record is removed are kept: sum and mean.
+    '''
+    def __init__(self, table, categories: tuple, derived: dict, sum = (), mean = ()) -> None:
+        '''
+        Parameters
+        ----------
+        table : KeyTable
+            the table to summarize; the Summary starts out with its current records
+        categories : tuple
+            the categories whose values make up the groups
+        derived : dict
+            {name: (category, function)} for groups made of function(value of category), such as
+            the month of a date
+        sum : str or tuple of str
+            the categories to total, as 'sum(category)' fields
+        mean : str or tuple of str
+            the categories to average, as 'mean(category)' fields
+
+        Raises
+        ------
+        KeyError
+            when a category is not in the table
+        '''
+        groupers = tuple((category, None) for category in categories) + tuple(derived.values())
+        # (aggregate, category) pairs, in the order of the summary fields
+        aggregates = tuple(('sum', category) for category in ((sum,) if isinstance(sum, str) else sum)) \
+                   + tuple(('mean', category) for category in ((mean,) if isinstance(mean, str) else mean))
+        for category in tuple(category for category, function in groupers) + tuple(category for aggregate, category in aggregates):
+            if category not in table.categories_set:
+                raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+
+        positions = table.record_type._positions
+        self.__names: tuple = tuple(categories) + tuple(derived)
+        self.__groupers: tuple = groupers
+        self.__grouper_positions: tuple = tuple(positions[category] for category, function in groupers)
+        self.__aggregates: tuple = aggregates
+        # each category is totalled once, even when it is both summed and averaged
+        self.__totalled: tuple = tuple(dict.fromkeys(category for aggregate, category in aggregates))
+        self.__totalled_positions: tuple = tuple(positions[category] for category in self.__totalled)
+        self.__record_type = record_type(self.__names + ('count',) + tuple(f'{aggregate}({category})' for aggregate, category in aggregates))
+        self.rebuild(table)
+    # END __init__()
+
+    def rebuild(self, table) -> None:
+        '''
+        Computes every group again from the current records of the table, as after the records
+        were replaced without telling the Summary.
+        '''
+        # group key -> [record count, total of each totalled category, count of its values that are not None]
+        self.__groups: dict = dict()
+        # the type of the values of each totalled category, such as Money, for the results
+        self.__value_types: dict = dict()
+        self.add_many(list(table.records.items()))
+
+    # the listener interface of KeyTable
+    def add_many(self, pairs) -> None:
+        '''
+        Adds (primary_key, record) pairs to their groups.  The pairs are gathered by the raw values
+        of their categories first, so a derived value is computed once per distinct raw value in
+        the batch, and each group is only changed once per batch.
+        '''
+        records = [record for primary_key, record in pairs]
+        if not records:
+            return
+        grouper_positions = self.__grouper_positions
+        # tuple.__getitem__ reads the fields without going through Record.__getitem__, which also accepts names
+        if not grouper_positions:
+            raw_keys = repeat(())
+        else:
+            raw_keys = zip(*(map(tuple.__getitem__, records, repeat(position)) for position in grouper_positions))
+        raw_groups = dict()
+        for raw_key, record in zip(raw_keys, records):
+            group = raw_groups.get(raw_key)
+            if group is None:
+                raw_groups[raw_key] = [record]
+            else:
+                group.append(record)
+        groups = dict()
+        for raw_key, records in raw_groups.items():
+            key = self.__key_of(raw_key)
+            if key in groups:
+                groups[key].extend(records)
+            else:
+                groups[key] = records
+        for key, records in groups.items():
+            self.__change(key, records, 1)
+
+    def update(self, primary_key: int, old_record, new_record) -> None:
+        self.__change(self.__key_of_record(old_record), (old_record,), -1)
+        self.__change(self.__key_of_record(new_record), (new_record,), 1)
+
+    def remove(self, primary_key: int, record) -> None:
+        self.__change(self.__key_of_record(record), (record,), -1)
+
+    def __key_of(self, raw_key: tuple) -> tuple:
+        # a missing value stays None in a derived part of the key too, as in GroupBy
+        return tuple(value if function is None or value is None else function(value) for value, (category, function) in zip(raw_key, self.__groupers))
+
+    def __key_of_record(self, record) -> tuple:
+        return self.__key_of(tuple(tuple.__getitem__(record, position) for position in self.__grouper_positions))
+
+    def __change(self, key: tuple, records, sign: int) -> None:
+        '''
+        Adds the records to the group of key (sign = 1), or takes them out of it (sign = -1).
+        '''
+        group = self.__groups.get(key)
+        if group is None:
+            totalled_count = len(self.__totalled)
+            group = self.__groups[key] = [0, [0] * totalled_count, [0] * totalled_count]
+        group[0] += sign * len(records)
+        totals, present_counts = group[1], group[2]
+        for index, (category, position) in enumerate(zip(self.__totalled, self.__totalled_positions)):
+            present = [value for value in map(tuple.__getitem__, records, repeat(position)) if value is not None]
+            if present:
+                if category not in self.__value_types:
+                    self.__value_types[category] = type(present[0])
+                totals[index] += sign * sum(present)
+                present_counts[index] += sign * len(present)
+                # a float total is started again from 0 once it holds no values, so that rounding errors cannot build up
+                if not present_counts[index]:
+                    totals[index] = 0
+        if not group[0]:
+            del self.__groups[key]
+
+    def __result(self, key: tuple, group: list):
+        count, totals, present_counts = group
+        fields = list(key)
+        fields.append(count)
+        for aggregate, category in self.__aggregates:
+            index = self.__totalled.index(category)
+            value_type = self.__value_types.get(category, int)
+            if aggregate == 'sum':
+                fields.append(_as_type(value_type, totals[index]))
+            else:
+                fields.append(_as_type(value_type, totals[index] / present_counts[index], mean=True) if present_counts[index] else None)
+        return self.__record_type(fields)
+
+    def __normalize(self, key) -> tuple:
+        # a summary grouped by a single value may be read with that value instead of a 1-tuple
+        if len(self.__groupers) == 1 and not (isinstance(key, tuple) and len(key) == 1):
+            return (key,)
+        return key
+
+    def __getitem__(self, key):
+        '''
+        Returns the summary of a group as a record: the group key, 'count', then the aggregates.
+
+        Raises
+        ------
+        KeyError
+            when no record belongs to the group
+        '''
+        key = self.__normalize(key)
+        group = self.__groups.get(key)
+        if group is None:
+            raise KeyError(f'ERROR: {key!r} is not a group of this summary.')
+        return self.__result(key, group)
+
+    def get(self, key, default = None):
+        group = self.__groups.get(self.__normalize(key))
+        return default if group is None else self.__result(self.__normalize(key), group)
+
+    def __contains__(self, key) -> bool:
+        return self.__normalize(key) in self.__groups
+
+    def __len__(self) -> int:
+        return len(self.__groups)
+
+    def keys(self) -> list:
+        '''
+        Returns the group keys, ordered as in table(), with None after every other value.
+        '''
+        return sorted(self.__groups, key=lambda key: tuple((value is None, value) for value in key))
+
+    def table(self) -> Table:
+        '''
+        Returns the summary as a new Table with one record per group, ordered by group, as
+        group_by(...).agg(...) would.
+        '''
+        result_table = Table(self.__record_type._categories)
+        for key in self.keys():
+            result_table.add_records(tuple(self.__result(key, self.__groups[key])))
+        return result_table
+
+    @property
+    def categories(self) -> tuple:
+        return self.__record_type._categories
+
+    def __str__(self) -> str:
+        return str(self.table())
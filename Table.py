@@ -1,41 +1,178 @@
-from typing import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import repeat, tee
+from operator import itemgetter
+import sys
 import KeySet
 
+class Record(tuple):
+    '''
+    A record is a tuple of fields, one per table category, that also allows the fields to be
+    read by category name like a dict:  record['Location'], record.keys(), record.values(),
+    record.items() and record.get().
+    Every Table generates its own subclass of Record from its categories with record_type(), so
+    each row stores only its fields; the category names are shared by the class.
+    '''
+    # the categories and their positions live on the generated subclass, not on each record
+    __slots__ = ()
+    _categories: tuple = tuple()
+    _positions: dict = dict()
+
+    def __getitem__(self, item):
+        # category names are looked up by position, anything else is a normal tuple index or slice
+        if isinstance(item, str):
+            return tuple.__getitem__(self, self._positions[item])
+        return tuple.__getitem__(self, item)
+
+    def __repr__(self) -> str:
+        return f'Record({dict(self.items())!r})'
+
+    def __reduce__(self):
+        # the generated subclasses cannot be pickled by name, so rebuild them from the categories
+        return (_rebuild_record, (self._categories, tuple(self)))
+
+    def keys(self) -> tuple:
+        return self._categories
+
+    def values(self) -> tuple:
+        return self
+
+    def items(self):
+        return zip(self._categories, self)
+
+    def get(self, category: str, default = None):
+        position = self._positions.get(category)
+        return default if position == None else tuple.__getitem__(self, position)
+
+    def replace(self, changes: dict) -> 'Record':
+        '''
+        Returns a copy of this record with the fields named in changes replaced.
+
+        Parameters
+        ----------
+        changes : dict
+            {category: new_value} for each field to replace
+        '''
+        fields = list(self)
+        for category, value in changes.items():
+            fields[self._positions[category]] = value
+        return type(self)(fields)
+
+@lru_cache(maxsize=None)
+def record_type(categories: tuple) -> type:
+    '''
+    Generates the Record subclass for a tuple of categories.  Tables with the same categories
+    share the same generated class.
+
+    Parameters
+    ----------
+    categories : tuple
+        the names of the fields in each record, in order
+    '''
+    categories = tuple(categories)
+    positions = {category: position for position, category in enumerate(categories)}
+    return type('Record', (Record,), {'__slots__': (), '_categories': categories, '_positions': positions})
+
+def _rebuild_record(categories: tuple, fields: tuple) -> Record:
+    return record_type(categories)(fields)
+
+def render_lines(categories: tuple, records, primary_keys = None):
+    '''
+    Yields the lines of a rendered table, each ending with a newline: a blank line, the heading,
+    a row of '=' characters to separate the heading from the records, then one line per record.
+    The fixed-width layout is computed once and reused for every record.
+
+    Parameters
+    ----------
+    categories : tuple
+        the category names, used as the heading
+    records : iterable
+        the records to render, as tuples of fields
+    primary_keys : iterable
+        the displayed primary key of each record, in the same order as records, for a leading
+        'Key' column; no key column is rendered when this is None
+    '''
+    heading = ''.join(f'{str(name):20s} \t' for name in categories)
+    row_format = '{:20s}\t' * len(categories)
+    if primary_keys is not None:
+        heading = f'{"Key":5s}\t' + heading
+        row_format = '{:5s}\t' + row_format
+
+    yield '\n'
+    yield f'{heading}\n'
+    yield f'{"=" * len(categories) * 23}\n'
+
+    if primary_keys is None:
+        for record in records:
+            yield row_format.format(*map(str, record)) + '\n'
+    else:
+        for primary_key, record in zip(primary_keys, records):
+            yield row_format.format(primary_key, *map(str, record)) + '\n'
+
 class Table:
     '''
     A table is a list of records.  A Table has a set of categories that are valid for
     the fields in each record.
         records<tuple> = 
+    The records are either stored as rows (one Record per record), or as columns (one typed
+    Column per category, see ColumnStore), which is the better choice for large tables that
+    are scanned, summed or sorted by category.
     '''
 
-    def __init__(self, categories: tuple) -> None:
+    STORAGE_MODES = ('rows', 'columns')
+
+    def __init__(self, categories: tuple, storage: str = 'rows') -> None:
         # these constants are to improve the readability of the list comprehension when extracting
         # the categories from a record when categories were not explicitly provided
         self.__categories_set: set = set(categories)
         self.__categories: tuple = tuple(categories)
-        self.__records: tuple = tuple()
+        self.__record_type: type = record_type(self.__categories)
+        # records are appended in place to a list or a ColumnStore; use freeze() for an immutable copy of them
+        if storage not in self.STORAGE_MODES:
+            raise ValueError(f'ERROR: Unknown storage mode {storage!r}, expected one of {self.STORAGE_MODES}.')
+        self.__storage: str = storage
+        self.__records = self._new_store()
+        # see changed_records
+        self.__changed_records: int = 0
     # END __init__()
 
+    def _new_store(self):
+        '''
+        Returns the empty store that the records are appended to: a list, or a ColumnStore in
+        columnar storage.  A subclass that keeps its records in a store of its own returns None.
+        '''
+        if self.__storage == 'columns':
+            # imported here, since ColumnStore imports NumPy, which row tables never need
+            from ColumnStore import ColumnStore
+            return ColumnStore(self.__categories, self.__record_type)
+        return list()
+
     def __str__(self):
-        
-        # store the formatted heading line because we will need it's length to generate a separater line
-        heading = ''
-        body = ''
-        for name in self.__categories:
-            heading += f'{str(name):20s} \t'
-
-        body = ''
-        for record in self.__records:
-            body +='\n'
-            for field in record.values():
-                body += f'{str(field):20s}\t'
-
-        # start a new line and output the heading as a row of text with a row of '=' characters to
-        # separate the heading from the records in the table, then add each new record as a new line, 
-        # plus an extra blank line at the end
-        return f'\n{heading}\n{"=" * len(self.__categories)*23}{body}\n'
+        # the whole table as one string; use iter_lines() or write_to() to stream large tables instead
+        return ''.join(self.iter_lines())
     # END __str__()
 
+    def iter_lines(self):
+        '''
+        Yields the rendered table one line at a time, each ending with a newline, so that a large
+        table can be printed or written without building the whole text in memory first.
+        '''
+        return render_lines(self.__categories, self.__records)
+
+    def write_to(self, output_file = None) -> None:
+        '''
+        Writes the rendered table to a file-like object, one line at a time.
+
+        Parameters
+        ----------
+        output_file : file-like object
+            where to write the table
+            DEFAULT = standard output (via sys.stdout)
+        '''
+        if output_file is None:
+            output_file = sys.stdout
+        output_file.writelines(self.iter_lines())
+
     @property
     def categories(self):
         return self.__categories
@@ -44,44 +181,260 @@ class Table:
     def categories(self, new_categories):
         self.__categories = tuple(new_categories)
         self.__categories_set = set(new_categories)
+        self.__record_type = record_type(self.__categories)
+
+    @property
+    def record_type(self) -> type:
+        '''
+        The Record subclass used for the rows of this Table, generated from its categories.
+        '''
+        return self.__record_type
 
     @property
     def categories_set(self):
         return self.__categories_set
 
+    @property
+    def storage(self) -> str:
+        return self.__storage
+
     @property
     def records(self):
+        '''
+        The live list (or ColumnStore, in columnar storage) of records in the Table.  Records are appended to it in place, so callers
+        that need a view that will not change should call freeze() instead.
+        '''
         return self.__records
 
+    @property
+    def changed_records(self) -> int:
+        '''
+        The number of records added to the Table so far.
+        '''
+        return self.__changed_records
+
+    def freeze(self) -> tuple:
+        '''
+        Returns an immutable snapshot of the records currently in the Table.
+        '''
+        return tuple(self.__records)
+
+    def column(self, category: str) -> list:
+        '''
+        Returns the values of a category for every record, in order.
+        '''
+        if self.__storage == 'columns':
+            return list(self.__records.column(category))
+        return [record[category] for record in self.__records]
+
+    def column_array(self, category: str):
+        '''
+        Returns a NumPy array of the raw typed values of a category (see ColumnStore.Column) for
+        vectorized scans, or None unless the Table uses columnar storage and NumPy is installed.
+        '''
+        if self.__storage == 'columns':
+            return self.__records.column_array(category)
+        return None
+
     def add_records(self, *records_to_add: tuple):
         '''
-        Adds one or more records to the Table.
+        Adds one or more records to the Table.  The whole batch is checked against the table
+        categories before any record is added, so a bad record leaves the Table unchanged.
 
         Parameter
         ---------
-        *records : nested dicts, or tuples
+        *records : tuples
             The records to be added to the table
-            Syntax : nested dicts
-                {primary_key: {category_1: data_1, category_2: data_2}}
             Syntax : tuples
                 (primary_key, data_1, data_2)
                     When using tuples, the categories are extracted from the Table categories and mapped in order
                     
         '''
        
-        for record_to_add in records_to_add:
-            if len(record_to_add) == len(self.__categories):
-                fields_to_add: OrderedDict = dict()
-                for column, heading in enumerate(self.categories):
-                        fields_to_add[heading] = record_to_add[column]
-                self.__records += tuple([fields_to_add])
-            else:
-                raise SyntaxError('ERROR: The record you attempted to add does not contain the same categories as the table.')
+        # every record in the batch must hold one field per category
+        if any(len(record_to_add) != len(self.__categories) for record_to_add in records_to_add):
+            raise SyntaxError('ERROR: The record you attempted to add does not contain the same categories as the table.')
+
+        # store each record as a row of the table's record type, and append them all at once
+        self.__records.extend(map(self.__record_type, records_to_add))
+        self.__changed_records += len(records_to_add)
     
-    def subtable(self, *columns):
+    def subtable(self, *columns: str) -> 'TableView':
+        '''
+        Returns a view of some of the categories of the Table, without copying any records; see
+        TableView.  The view sees records added to the Table after it was created.
+
+        Parameter
+        ---------
+        *columns : str
+            The categories to include, in the order they should appear
+            DEFAULT = every category of the Table
+        '''
+        return TableView(self, columns or self.categories)
+
+    def group_by(self, *categories: str, **derived: tuple):
+        '''
+        Groups the records of the Table for a roll-up with agg(); see GroupBy.
+
+        Parameter
+        ---------
+        *categories : str
+            The categories whose values make up the groups
+        **derived : tuple
+            {name: (category, function)} for groups made of function(value of category)
+        '''
+        # imported here, since GroupBy builds its results as a Table
+        from GroupBy import GroupBy
+        return GroupBy(self, categories, derived)
+
+class TableView:
+    '''
+    A TableView shows some of the categories of a Table (or KeyTable), and optionally only the
+    records that meet some conditions, without copying the table's records.  The records of the
+    view are built from the table as the view is read, so the view always reflects the current
+    records of the table, and only ever holds references to their fields.
+    A view of a KeyTable also shows the primary key of each record.
+    '''
+    def __init__(self, table: Table, categories: tuple, conditions: tuple = ()) -> None:
+        '''
+        Parameters
+        ----------
+        table : Table
+            the table to view
+        categories : tuple
+            the categories of the table to include, in order
+        conditions : tuple
+            functions of a record of the table that return True for the records to include
+
+        Raises
+        ------
+        KeyError
+            when a category is not in the table
+        '''
+        for category in categories:
+            if category not in table.categories_set:
+                raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+        self.__table: Table = table
+        self.__categories: tuple = tuple(categories)
+        self.__record_type: type = record_type(self.__categories)
+        self.__conditions: tuple = tuple(conditions)
+    # END __init__()
+
+    def __pairs(self):
+        # yields (primary_key, fields of the view) for each record, with a primary key of None for a Table
+        records = self.__table.records
+        keyed = isinstance(records, Mapping)
+        if not self.__conditions and hasattr(records, 'project_items' if keyed else 'project'):
+            # columnar storage reads only the columns of the view
+            if keyed:
+                return records.project_items(self.__categories)
+            return zip(repeat(None), records.project(self.__categories))
+
+        positions = [self.__table.record_type._positions[category] for category in self.__categories]
+        # itemgetter() of a single position returns the field itself rather than a tuple
+        if len(positions) == 1:
+            get_fields = lambda record, position=positions[0]: (record[position],)
+        else:
+            get_fields = itemgetter(*positions)
+        pairs = records.items() if keyed else zip(repeat(None), records)
+        conditions = self.__conditions
+        return ((primary_key, get_fields(record)) for primary_key, record in pairs
+                if all(condition(record) for condition in conditions))
+
+    def __iter__(self):
+        return map(self.__record_type, (fields for primary_key, fields in self.__pairs()))
+
+    def items(self):
+        '''
+        Yields (primary_key, record) pairs; the primary key is None for a view of a Table.
+        '''
+        record_type = self.__record_type
+        return ((primary_key, record_type(fields)) for primary_key, fields in self.__pairs())
+
+    def __len__(self) -> int:
+        if not self.__conditions:
+            return len(self.__table.records)
+        return sum(1 for pair in self.__pairs())
+
+    def where(self, condition = None, **equals) -> 'TableView':
+        '''
+        Returns a view of the records of this view that also meet a condition.  The condition
+        may be on any category of the table, not only the ones included in the view.
+
+        Parameters
+        ----------
+        condition : function
+            a function of a record of the table that returns True for the records to include
+        **equals :
+            {category: value} for categories that must equal a value, for categories whose names
+            are valid keywords; use condition for the others
+        '''
+        conditions = self.__conditions
+        if condition is not None:
+            conditions += (condition,)
+        for category, value in equals.items():
+            if category not in self.__table.categories_set:
+                raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+            conditions += (lambda record, category=category, value=value: record[category] == value,)
+        return TableView(self.__table, self.__categories, conditions)
+
+    def subtable(self, *columns: str) -> 'TableView':
+        '''
+        Returns a view of some of the categories of this view, with the same conditions.
+        '''
         for column in columns:
-            pass
-        pass
+            if column not in self.__categories:
+                raise KeyError(f'ERROR: {column!r} is not a category of this view.')
+        return TableView(self.__table, columns or self.__categories, self.__conditions)
+
+    def column(self, category: str) -> list:
+        '''
+        Returns the values of a category of the view for every record, in order.
+        '''
+        position = self.__categories.index(category)
+        return [fields[position] for primary_key, fields in self.__pairs()]
+
+    def iter_lines(self):
+        '''
+        Yields the rendered view one line at a time, each ending with a newline, with a leading
+        'Key' column for a view of a KeyTable.
+        '''
+        if not isinstance(self.__table.records, Mapping):
+            return render_lines(self.__categories, self)
+        pad_to = self.__table.primary_key_set.pad_to
+        # render_lines() reads the keys and the records in step, so tee() only holds one pair at a time
+        key_pairs, record_pairs = tee(self.__pairs())
+        return render_lines(self.__categories, (fields for primary_key, fields in record_pairs),
+                            (str(primary_key).zfill(pad_to) for primary_key, fields in key_pairs))
+
+    def write_to(self, output_file = None) -> None:
+        '''
+        Writes the rendered view to a file-like object, one line at a time.
+
+        Parameters
+        ----------
+        output_file : file-like object
+            where to write the view
+            DEFAULT = standard output (via sys.stdout)
+        '''
+        if output_file is None:
+            output_file = sys.stdout
+        output_file.writelines(self.iter_lines())
+
+    def __str__(self) -> str:
+        return ''.join(self.iter_lines())
+
+    @property
+    def table(self) -> Table:
+        return self.__table
+
+    @property
+    def categories(self) -> tuple:
+        return self.__categories
+
+    @property
+    def record_type(self) -> type:
+        return self.__record_type
 
 #######################################################
 #Testing code:
@@ -102,6 +455,8 @@ if __name__ == '__main__':
     table_example.add_records(record_example_2)
     table_example.add_records(record_example_3)
     print(table_example)
+    print(table_example.subtable('Last Name', 'Major'))
+    print(table_example.subtable('Last Name', 'Salary').where(lambda record: record['Salary'] > 40_000))
 
     table_example_2 = Table(categories=('Thing 1', 'Thing 2', 'Thing 3'))
     table_2_record: tuple = (1,2,3)
@@ -0,0 +1,636 @@
+from array import array
+from AssetTypes import Money, Percent
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from datetime import date
+from importlib import import_module
+from KeySet import KeySet, KeyRange
+from Table import record_type, render_lines
+import json
+import mmap
+import os
+import struct
+import sys
+
+# NumPy is optional, as in ColumnStore: it is only used for zero-copy column arrays and scans.
+# It is imported the first time it is needed, since importing it takes longer than opening a
+# table file and reading a record; see _numpy()
+numpy = False
+
+'''
+Table files store a KeyTable in a binary format that can be opened through mmap, so that opening
+a file is instant and a record is only decoded when it is read.
+
+    magic            8 bytes      b'PYTABLE1'
+    header length    4 bytes      unsigned, little-endian
+    header           JSON         categories, column kinds and types, KeySet bounds, section offsets
+    sections         each one starts on an 8-byte boundary:
+        keys         int64 * n    the primary keys, in ascending order
+        per column, depending on its kind:
+            'int'    int64 * n
+            'date'   int32 * n    date ordinals
+            'float'  float64 * n
+            'str'    int64 * (n + 1) offsets into a blob of UTF-8 text, then the blob
+            'object' int64 * (n + 1) offsets into a blob of encoded values, then the blob; see encode_value()
+        and, for a typed column that holds some None values, a null mask of n bytes (1 = None)
+        and, for a typed column with a sorted index, int64 positions ordered by value (None left out),
+        so that range lookups on the column can bisect the file instead of scanning it
+
+Numbers are stored in the byte order of the machine that wrote the file, which is recorded
+in the header.
+'''
+
+MAGIC = b'PYTABLE1'
+VERSION = 2
+TYPECODES = {'int': 'q', 'date': 'i', 'float': 'd'}
+
+# the only types a table file may name, for the values of a typed column and for the class of
+# the saved table, so that opening a file never imports or calls anything the file chooses;
+# the table classes are imported when they are needed, since they import this module
+VALUE_TYPES = {'builtins:int': int, 'builtins:float': float, 'builtins:str': str, 'datetime:date': date,
+               'AssetTypes:Money': Money, 'AssetTypes:Percent': Percent}
+TABLE_CLASSES = {'KeyTable:KeyTable': ('KeyTable', 'KeyTable'),
+                 'AssetManagementTable:AssetManagementTable': ('AssetManagementTable', 'AssetManagementTable')}
+
+class TableFileError(Exception):
+    '''
+    This error is raised when a file is not a table file, or was written in an incompatible format.
+    '''
+    def __init__(self, file_name: str, reason: str) -> None:
+        super().__init__(f'\nERROR: {file_name} could not be opened as a table file: {reason}.')
+
+class UnsupportedValue(Exception):
+    '''
+    This error is raised when a table holds a value that a table file cannot store; see encode_value().
+    '''
+    def __init__(self, category: str, value) -> None:
+        super().__init__(f'\nERROR: {value!r} in {category} could not be saved, a table file cannot store a {type(value).__name__}.')
+
+def _type_name(value_type: type) -> str:
+    for type_name, allowed_type in VALUE_TYPES.items():
+        if value_type is allowed_type:
+            return type_name
+    return None
+
+def _table_class_name(table_class: type) -> str:
+    '''
+    Returns the name saved for the class of a table: its own, or that of the nearest class it
+    inherits from that a table file may name, so that the file loads as that class.
+    '''
+    for base in table_class.__mro__:
+        type_name = f'{base.__module__}:{base.__qualname__}'
+        if type_name in TABLE_CLASSES:
+            return type_name
+        # a table class defined in a module run as a script is saved under its module's name
+        if base.__module__ == '__main__' and f'{base.__qualname__}:{base.__qualname__}' in TABLE_CLASSES:
+            return f'{base.__qualname__}:{base.__qualname__}'
+    return 'KeyTable:KeyTable'
+
+def _resolve_table_class(file_name: str, type_name: str) -> type:
+    if type_name not in TABLE_CLASSES:
+        raise TableFileError(file_name, f'it names the table class {type_name!r}, which is not one a table file may hold')
+    module_name, class_name = TABLE_CLASSES[type_name]
+    return getattr(import_module(module_name), class_name)
+
+# the encoding of each value in an 'object' column is a tag byte for its type, then its payload;
+# only these exact types can be stored, and decoding one never runs code named by the file
+_PACK_FLOAT = struct.Struct('<d')
+_PACK_ORDINAL = struct.Struct('<i')
+ENCODERS = {
+    type(None): lambda value: b'N',
+    bool: lambda value: b'T' if value else b'F',
+    int: lambda value: b'i' + str(value).encode('ascii'),
+    Money: lambda value: b'M' + str(int(value)).encode('ascii'),
+    float: lambda value: b'f' + _PACK_FLOAT.pack(value),
+    Percent: lambda value: b'P' + _PACK_FLOAT.pack(value),
+    str: lambda value: b's' + value.encode('utf-8'),
+    date: lambda value: b'd' + _PACK_ORDINAL.pack(value.toordinal()),
+}
+DECODERS = {
+    ord('N'): lambda payload: None,
+    ord('T'): lambda payload: True,
+    ord('F'): lambda payload: False,
+    ord('i'): lambda payload: int(payload),
+    ord('M'): lambda payload: Money(int(payload)),
+    ord('f'): lambda payload: _PACK_FLOAT.unpack(payload)[0],
+    ord('P'): lambda payload: Percent(_PACK_FLOAT.unpack(payload)[0]),
+    ord('s'): lambda payload: str(payload, 'utf-8'),
+    ord('d'): lambda payload: date.fromordinal(_PACK_ORDINAL.unpack(payload)[0]),
+}
+
+def encode_value(value) -> bytes:
+    '''
+    Encodes one value of an 'object' column: None, a bool, int, float, str or date, or Money or
+    Percent.  Returns None for a value of any other type, which a table file cannot store.
+    '''
+    encoder = ENCODERS.get(type(value))
+    return None if encoder is None else encoder(value)
+
+def decode_value(piece: memoryview):
+    '''
+    Decodes one value of an 'object' column, the reverse of encode_value().
+    '''
+    return DECODERS[piece[0]](piece[1:])
+
+def _column_spec(values: list) -> dict:
+    '''
+    Chooses how a column is stored: the kind of column used by ColumnStore for its values when
+    all of the non-None values have the same type, otherwise 'object'.
+    '''
+    value_types = {type(value) for value in values if value is not None}
+    if len(value_types) != 1:
+        return {'kind': 'object', 'type': None, 'nulls': False}
+    from ColumnStore import Column
+    value_type = value_types.pop()
+    kind = Column.kind_of(next(value for value in values if value is not None))
+    nulls = None in values
+    if kind == 'int' and not all(value is None or -2**63 <= value < 2**63 for value in values):
+        kind = 'object'
+    # a str column keeps its offsets, so None could only be told from '' by a null mask; the
+    # tagged encoding of an 'object' column is simpler
+    if kind == 'str' and nulls:
+        kind = 'object'
+    # a typed column is read back as its type, so that type has to be one a table file may name
+    if kind != 'str' and _type_name(value_type) is None:
+        kind = 'object'
+    if kind == 'object':
+        return {'kind': 'object', 'type': None, 'nulls': False}
+    return {'kind': kind, 'type': _type_name(value_type), 'nulls': nulls and kind != 'str'}
+
+def _encode_column(category: str, spec: dict, values: list) -> list:
+    '''
+    Returns the sections (as bytes-like objects) that store a column of values.
+
+    Raises
+    ------
+    UnsupportedValue : Exception
+        when an 'object' column holds a value that encode_value() cannot store
+    '''
+    kind = spec['kind']
+    if kind in TYPECODES:
+        if kind == 'date':
+            raw = array('i', (0 if value is None else value.toordinal() for value in values))
+        else:
+            raw = array(TYPECODES[kind], (0 if value is None else value for value in values))
+        sections = [raw]
+        if spec['nulls']:
+            sections.append(bytes(value is None for value in values))
+        return sections
+
+    if kind == 'str':
+        pieces = [value.encode('utf-8') for value in values]
+    else:
+        pieces = list(map(encode_value, values))
+        if None in pieces:
+            raise UnsupportedValue(category, values[pieces.index(None)])
+    offsets = array('q', [0])
+    position = 0
+    for piece in pieces:
+        position += len(piece)
+        offsets.append(position)
+    return [offsets, b''.join(pieces)]
+
+def save_table(table, file_name: str) -> None:
+    '''
+    Saves a KeyTable to a table file.  The file is written under a temporary name first and
+    then renamed, so an existing file is only replaced once the new one is complete.
+
+    Parameters
+    ----------
+    table : KeyTable
+        the table to save
+    file_name : str
+        the path of the table file
+    '''
+    # the file is written from a snapshot, so that the table may go on changing in the meantime
+    records = table.snapshot().records
+    primary_keys = sorted(records)
+    rows = [records[primary_key] for primary_key in primary_keys]
+    write_table_file(file_name, table, primary_keys, rows)
+
+def write_table_file(file_name: str, table, primary_keys: list, rows: list, extra_header: dict = None) -> None:
+    '''
+    Writes the given records of a table to a table file, with the table's categories, KeySet
+    and indexes in the header.  The primary keys must be in ascending order.
+    '''
+    categories = table.categories
+    key_set = table.primary_key_set
+    columns = [[tuple.__getitem__(row, position) for row in rows] for position in range(len(categories))]
+    specs = [_column_spec(values) for values in columns]
+
+    sections = [array('q', primary_keys)]
+    section_names = ['keys']
+    for category, spec, values in zip(categories, specs, columns):
+        encoded = _encode_column(category, spec, values)
+        sections.extend(encoded)
+        if spec['kind'] in TYPECODES:
+            section_names.append(category)
+            if spec['nulls']:
+                section_names.append(f'{category}#nulls')
+        else:
+            section_names.extend((f'{category}#offsets', category))
+
+    header = {
+        'version': VERSION,
+        'byteorder': sys.byteorder,
+        'table_class': _table_class_name(type(table)),
+        'categories': list(categories),
+        'columns': specs,
+        'indexes': {category: index.kind for category, index in table.indexes.items()},
+        'key_set': {'minimum': key_set.minimum_valid_key, 'maximum': key_set.maximum_valid_key,
+                    'pad_to': key_set.pad_to, 'next_key': key_set.next_key},
+        'row_count': len(primary_keys),
+        'storage': table.storage,
+    }
+    if extra_header:
+        header.update(extra_header)
+
+    # sorted indexes on typed columns are saved as the positions of the rows in value order
+    for category, kind in header['indexes'].items():
+        position = categories.index(category)
+        if kind == 'sorted' and specs[position]['kind'] in TYPECODES:
+            values = columns[position]
+            order = sorted((position for position, value in enumerate(values) if value is not None), key=values.__getitem__)
+            sections.append(array('q', order))
+            section_names.append(f'{category}#order')
+
+    # section offsets are relative to the start of the data, which follows the header on an 8-byte boundary
+    position = 0
+    header['sections'] = dict()
+    for name, section in zip(section_names, sections):
+        length = len(section) * getattr(section, 'itemsize', 1)
+        header['sections'][name] = [position, length]
+        position = _align(position + length)
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes = header_bytes.ljust(_align(len(MAGIC) + 4 + len(header_bytes)) - len(MAGIC) - 4)
+    data_start = len(MAGIC) + 4 + len(header_bytes)
+
+    temporary_name = f'{file_name}.tmp'
+    with open(temporary_name, 'wb') as output_file:
+        output_file.write(MAGIC)
+        output_file.write(struct.pack('<I', len(header_bytes)))
+        output_file.write(header_bytes)
+        for name, section in zip(section_names, sections):
+            output_file.write(b'\0' * (data_start + header['sections'][name][0] - output_file.tell()))
+            output_file.write(section)
+        output_file.flush()
+        os.fsync(output_file.fileno())
+    os.replace(temporary_name, file_name)
+    _fsync_directory(file_name)
+# END write_table_file()
+
+def _align(position: int) -> int:
+    return (position + 7) & ~7
+
+def _fsync_directory(file_name: str) -> None:
+    '''
+    Forces the entries of the directory holding a file onto the disk, so that a rename into it
+    survives a crash.  Directories cannot be opened this way on Windows, where this does nothing.
+    '''
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    directory = os.open(os.path.dirname(os.path.abspath(file_name)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+def _numpy():
+    '''
+    Returns the numpy module, importing it the first time, or None if it is not installed.
+    '''
+    global numpy
+    if numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
+
+class MappedColumn:
+    '''
+    A MappedColumn reads the values of one category straight out of a memory-mapped table file.
+    '''
+    def __init__(self, spec: dict, buffer: memoryview, sections: dict, category: str) -> None:
+        self.kind: str = spec['kind']
+        # the type was checked against VALUE_TYPES when the file was opened
+        self.type: type = None if spec['type'] is None else VALUE_TYPES[spec['type']]
+        self._nulls = None
+        self._order = None
+        if self.kind in TYPECODES:
+            start, length = sections[category]
+            self._data = buffer[start:start + length].cast(TYPECODES[self.kind])
+            if spec['nulls']:
+                start, length = sections[f'{category}#nulls']
+                self._nulls = buffer[start:start + length]
+            if f'{category}#order' in sections:
+                start, length = sections[f'{category}#order']
+                self._order = buffer[start:start + length].cast('q')
+        else:
+            start, length = sections[f'{category}#offsets']
+            self._offsets = buffer[start:start + length].cast('q')
+            start, length = sections[category]
+            self._blob = buffer[start:start + length]
+    # END __init__()
+
+    def __getitem__(self, position: int):
+        if self._nulls is not None and self._nulls[position]:
+            return None
+        if self.kind == 'date':
+            return date.fromordinal(self._data[position])
+        if self.kind in TYPECODES:
+            raw = self._data[position]
+            return raw if self.type is int or self.type is float else self.type(raw)
+        piece = self._blob[self._offsets[position]:self._offsets[position + 1]]
+        if self.kind == 'str':
+            return str(piece, 'utf-8')
+        return decode_value(piece)
+
+    def encode(self, value):
+        '''
+        Returns the raw value stored for value in a typed column, or None if value cannot be
+        stored in this column (and so cannot be compared against its raw values).
+        '''
+        if self.kind == 'date':
+            return value.toordinal() if type(value) is date else None
+        if self.kind == 'int':
+            return int(value) if isinstance(value, int) and not isinstance(value, bool) else None
+        if self.kind == 'float':
+            return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+        return None
+
+    @property
+    def ordered(self) -> bool:
+        return self._order is not None
+
+    def positions_between(self, low, high) -> list:
+        '''
+        Returns the positions of the values between low and high (both inclusive) in value order,
+        by bisecting the saved order of a column with a sorted index.  Returns None when the column
+        has no saved order or low and high cannot be compared against its raw values.
+        '''
+        raw_low, raw_high = self.encode(low), self.encode(high)
+        if self._order is None or raw_low is None or raw_high is None:
+            return None
+        first = bisect_left(self._order, raw_low, key=self._data.__getitem__)
+        last = bisect_right(self._order, raw_high, key=self._data.__getitem__)
+        return self._order[first:last].tolist()
+
+    def array(self):
+        '''
+        Returns a NumPy array over the raw values of a typed column, straight out of the mapped
+        file without copying it, or None when NumPy is unavailable or the column is not typed.
+        '''
+        if self.kind not in TYPECODES or _numpy() is None:
+            return None
+        return numpy.frombuffer(self._data, dtype={'q': numpy.int64, 'i': numpy.int32, 'd': numpy.float64}[self._data.format])
+
+    def release(self) -> None:
+        for view in ('_data', '_nulls', '_order', '_offsets', '_blob'):
+            if getattr(self, view, None) is not None:
+                getattr(self, view).release()
+
+class MappedTable(Mapping):
+    '''
+    A MappedTable is a read-only KeyTable opened from a table file through mmap.  Opening it only
+    reads the header; a record is decoded when it is accessed, so a lookup by primary key only
+    touches the few pages that hold it.  It is a mapping of primary key -> Record, like the
+    records of a KeyTable.
+    '''
+    def __init__(self, file_name: str) -> None:
+        self._file_name: str = file_name
+        self._file = open(file_name, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise TableFileError(file_name, 'the file is empty')
+        self._buffer = memoryview(self._map)
+
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise TableFileError(file_name, 'it does not start with the table file signature')
+        header_length = struct.unpack('<I', self._buffer[len(MAGIC):len(MAGIC) + 4])[0]
+        self.header: dict = json.loads(bytes(self._buffer[len(MAGIC) + 4:len(MAGIC) + 4 + header_length]))
+        if self.header['version'] != VERSION or self.header['byteorder'] != sys.byteorder:
+            self.close()
+            raise TableFileError(file_name, 'it was written in an incompatible version or byte order')
+        for spec in self.header['columns']:
+            if spec['type'] is not None and spec['type'] not in VALUE_TYPES:
+                self.close()
+                raise TableFileError(file_name, f'it names the type {spec["type"]!r}, which is not one a table file may hold')
+
+        self.categories: tuple = tuple(self.header['categories'])
+        self.record_type: type = record_type(self.categories)
+        data_start = len(MAGIC) + 4 + header_length
+        sections = {name: (data_start + start, length) for name, (start, length) in self.header['sections'].items()}
+        start, length = sections['keys']
+        self._keys = self._buffer[start:start + length].cast('q')
+        self._columns = [MappedColumn(spec, self._buffer, sections, category) for spec, category in zip(self.header['columns'], self.categories)]
+
+        # when the keys are one unbroken run, the position of a key is found by subtraction
+        self._dense: bool = len(self._keys) == 0 or self._keys[-1] - self._keys[0] + 1 == len(self._keys)
+    # END __init__()
+
+    def __enter__(self) -> 'MappedTable':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Releases the memory map and closes the file.  Records already read stay valid.
+        '''
+        for column in getattr(self, '_columns', ()):
+            column.release()
+        if getattr(self, '_keys', None) is not None:
+            self._keys.release()
+        self._buffer.release()
+        self._map.close()
+        self._file.close()
+
+    def position_of(self, primary_key: int) -> int:
+        '''
+        Returns the position of a primary key in the file, or None if the file does not hold it.
+        '''
+        primary_key = int(primary_key)
+        if not len(self._keys):
+            return None
+        if self._dense:
+            position = primary_key - self._keys[0]
+            return position if 0 <= position < len(self._keys) else None
+        position = bisect_left(self._keys, primary_key)
+        if position < len(self._keys) and self._keys[position] == primary_key:
+            return position
+        return None
+
+    def key_at(self, position: int) -> int:
+        return self._keys[position]
+
+    def record_at(self, position: int):
+        return self.record_type(column[position] for column in self._columns)
+
+    def retrieve_by_key(self, primary_key: int):
+        '''
+        Returns the record stored under a primary key, or None if there is no such record.
+        '''
+        position = self.position_of(primary_key)
+        return None if position is None else self.record_at(position)
+
+    def __getitem__(self, primary_key: int):
+        record = self.retrieve_by_key(primary_key)
+        if record is None:
+            raise KeyError(primary_key)
+        return record
+
+    def __contains__(self, primary_key) -> bool:
+        return self.position_of(primary_key) is not None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def values(self):
+        return (self.record_at(position) for position in range(len(self._keys)))
+
+    def items(self):
+        return zip(self._keys, self.values())
+
+    @property
+    def records(self) -> 'MappedTable':
+        return self
+
+    def column(self, category: str) -> list:
+        column = self._columns[self.categories.index(category)]
+        return [column[position] for position in range(len(self._keys))]
+
+    def column_array(self, category: str):
+        return self._columns[self.categories.index(category)].array()
+
+    def positions_between(self, category: str, low, high) -> list:
+        '''
+        Returns the positions in the file of the records whose category is between low and high
+        (both inclusive).  A column saved with a sorted index is bisected, and its records are
+        returned in value order; otherwise a typed column is scanned as a NumPy array over the
+        mapped file when NumPy is available, and the records are returned in file order.
+        '''
+        column = self._columns[self.categories.index(category)]
+        positions = column.positions_between(low, high)
+        if positions is not None:
+            return positions
+        raw_low, raw_high = column.encode(low), column.encode(high)
+        values = column.array() if raw_low is not None and raw_high is not None else None
+        if values is not None:
+            mask = (values >= raw_low) & (values <= raw_high)
+            if column._nulls is not None:
+                mask &= numpy.frombuffer(column._nulls, dtype=numpy.uint8) == 0
+            return numpy.flatnonzero(mask).tolist()
+        positions = list()
+        for position in range(len(self._keys)):
+            value = column[position]
+            if value is not None and low <= value <= high:
+                positions.append(position)
+        return positions
+
+    def keys_between(self, category: str, low, high) -> list:
+        '''
+        Returns the primary keys of the records whose category is between low and high (both
+        inclusive); see positions_between().
+        '''
+        return [self._keys[position] for position in self.positions_between(category, low, high)]
+
+    def key_range(self) -> KeyRange:
+        '''
+        Returns the primary keys in the file as a KeyRange of consecutive runs, which
+        KeySet.reserve() takes without visiting every key.
+        '''
+        pad_to = self.header['key_set']['pad_to']
+        if not len(self._keys):
+            return KeyRange((), pad_to)
+        if self._dense:
+            return KeyRange(((self._keys[0], self._keys[-1]),), pad_to)
+        runs = [[self._keys[0], self._keys[0]]]
+        for primary_key in self._keys[1:]:
+            if primary_key == runs[-1][1] + 1:
+                runs[-1][1] = primary_key
+            else:
+                runs.append([primary_key, primary_key])
+        return KeyRange((tuple(run) for run in runs), pad_to)
+
+    def iter_lines(self):
+        pad_to = self.header['key_set']['pad_to']
+        return render_lines(self.categories, self.values(), (str(primary_key).zfill(pad_to) for primary_key in self._keys))
+
+    def __str__(self) -> str:
+        return ''.join(self.iter_lines())
+
+def read_header(file_name: str) -> dict:
+    '''
+    Returns the header of a table file, without mapping the rest of the file.
+    '''
+    with open(file_name, 'rb') as table_file:
+        if table_file.read(len(MAGIC)) != MAGIC:
+            raise TableFileError(file_name, 'it does not start with the table file signature')
+        header_length = struct.unpack('<I', table_file.read(4))[0]
+        return json.loads(table_file.read(header_length))
+
+def open_table(file_name: str) -> MappedTable:
+    '''
+    Opens a table file for reading through mmap, without loading its records.
+    '''
+    return MappedTable(file_name)
+
+def load_table(file_name: str, storage: str = None, batch_size: int = 10_000, concurrent: bool = False):
+    '''
+    Loads a table file into a new KeyTable (or the subclass it was saved from, such as an
+    AssetManagementTable), with the same primary keys, KeySet bounds and indexes.
+
+    Parameters
+    ----------
+    file_name : str
+        the path of the table file
+    storage : str
+        'rows' or 'columns'
+        DEFAULT = the storage mode of the table that was saved
+    batch_size : int
+        the number of records decoded and added to the table at a time
+    concurrent : bool
+        load it as a concurrent table, which several threads may change at once; see KeyTable
+    '''
+    with open_table(file_name) as mapped:
+        header = mapped.header
+        key_set_header = header['key_set']
+        key_set = KeySet(key_set_header['minimum'], key_set_header['maximum'])
+        key_set.pad_to = key_set_header['pad_to']
+
+        table_class = _resolve_table_class(file_name, header['table_class'])
+        table = table_class.new_empty(mapped.categories, key_set, storage or header['storage'], concurrent)
+        for category, kind in header['indexes'].items():
+            if category not in table.indexes:
+                table.create_index(category, kind)
+
+        for start in range(0, len(mapped), batch_size):
+            positions = range(start, min(start + batch_size, len(mapped)))
+            table.restore_records([mapped._keys[position] for position in positions], [mapped.record_at(position) for position in positions])
+        key_set.next_key = key_set_header['next_key']
+    return table
+
+#######################################################
+#Testing code:
+#######################################################
+if __name__ == '__main__':
+    from AssetManagementTable import AssetManagementTable
+    from tempfile import gettempdir
+
+    my_table = AssetManagementTable()
+    my_table.append_records_from_txt_file('', 'assets')
+    file_name = os.path.join(gettempdir(), 'assets.table')
+    save_table(my_table, file_name)
+
+    with open_table(file_name) as mapped_table:
+        print(mapped_table.retrieve_by_key(1))
+        print(mapped_table)
+    print(load_table(file_name, storage='columns'))
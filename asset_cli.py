@@ -0,0 +1,218 @@
+'''
+Answers a single request about a saved table from the command line, reading only what the request
+needs from the table file (see TableFile) and the changes logged after it (see ChangeLog),
+instead of loading the whole table.  Each command imports only the modules it uses, so that the
+script can be called from shell loops and cron jobs.
+
+    python asset_cli.py get TABLE_FILE KEY
+    python asset_cli.py add TABLE_FILE FIELD [FIELD ...]
+    python asset_cli.py eol TABLE_FILE [--start DATE] [--end DATE | --months N] [--by-location]
+    python asset_cli.py export TABLE_FILE [--output FILE] [--format table|assets]
+
+Dates are written as YYYY-MM-DD.  The table must not be open in another process while a record
+is added, since both would append to the same log.
+'''
+from ChangeLog import ChangeLog, read_changes
+from Table import render_lines
+from TableFile import open_table, TableFileError
+import sys
+
+ASSET_TABLE = 'AssetManagementTable:AssetManagementTable'
+EOL = 'End of Life (EOL)'
+
+def open_current(file_name: str) -> tuple:
+    '''
+    Opens a table file, and reads the changes logged since it was written.
+
+    Returns
+    -------
+    (MappedTable, {primary_key: record tuple, or None for a removed record})
+    '''
+    mapped_table = open_table(file_name)
+    changes, next_key = read_changes(file_name, mapped_table.header)
+    if next_key is not None:
+        mapped_table.header['key_set']['next_key'] = next_key
+    return mapped_table, changes
+
+def current_record(mapped_table, changes: dict, primary_key: int):
+    if primary_key in changes:
+        record = changes[primary_key]
+        return None if record is None else mapped_table.record_type(record)
+    return mapped_table.retrieve_by_key(primary_key)
+
+def iter_current(mapped_table, changes: dict):
+    '''
+    Yields (primary_key, record) for every current record of the table, in primary key order.
+    '''
+    from heapq import merge
+    added_keys = sorted(primary_key for primary_key, record in changes.items() if record is not None and primary_key not in mapped_table)
+    for primary_key in merge(mapped_table, added_keys):
+        record = current_record(mapped_table, changes, primary_key)
+        if record is not None:
+            yield primary_key, record
+
+def parse_day(text: str):
+    from AssetImport import parse_date
+    try:
+        return parse_date(text)
+    except ValueError:
+        raise SyntaxError(f'ERROR: {text!r} is not a date, expected YYYY-MM-DD.')
+
+# get TABLE_FILE KEY
+def get_record(arguments) -> int:
+    mapped_table, changes = open_current(arguments.table_file)
+    with mapped_table:
+        record = current_record(mapped_table, changes, arguments.key)
+        if record is None:
+            print(f'{arguments.key} is not the primary key of a record in {arguments.table_file}.', file=sys.stderr)
+            return 1
+        primary_key = str(arguments.key).zfill(mapped_table.header['key_set']['pad_to'])
+        sys.stdout.writelines(render_lines(mapped_table.categories, (record,), (primary_key,)))
+    return 0
+
+# add TABLE_FILE FIELD [FIELD ...]
+def add_record(arguments) -> int:
+    from KeySet import KeySet, KeyRange
+    mapped_table, changes = open_current(arguments.table_file)
+    with mapped_table:
+        header = mapped_table.header
+        if header['table_class'] == ASSET_TABLE:
+            # the fields of an asset may also be given as one line of an asset file
+            from AssetImport import parse_asset_line
+            record = parse_asset_line(', '.join(arguments.fields))
+        else:
+            category_count = len(mapped_table.categories)
+            record = tuple(arguments.fields[:category_count]) + (None,) * (category_count - len(arguments.fields))
+
+        # rebuild only the KeySet, from the runs of keys in the file and the keys changed since
+        key_set = KeySet(header['key_set']['minimum'], header['key_set']['maximum'])
+        key_set.pad_to = header['key_set']['pad_to']
+        removed_keys = sorted(primary_key for primary_key, changed in changes.items() if changed is None and primary_key in mapped_table)
+        key_set.reserve(KeyRange(_without(mapped_table.key_range().runs, removed_keys)))
+        key_set.reserve(primary_key for primary_key, changed in changes.items() if changed is not None and primary_key not in mapped_table)
+        key_set.next_key = header['key_set']['next_key']
+
+    primary_key = int(key_set.generate_new())
+    with ChangeLog.append_only(arguments.table_file) as change_log:
+        change_log.log_add([primary_key], [record], key_set.next_key)
+    print(str(primary_key).zfill(key_set.pad_to))
+    return 0
+
+def _without(runs: tuple, keys: list) -> list:
+    '''
+    Returns the (first, last) runs with the given keys (in ascending order) taken out of them.
+    '''
+    runs = sorted(runs)
+    remaining = list()
+    keys = iter(keys)
+    key = next(keys, None)
+    for first, last in runs:
+        while key is not None and key <= last:
+            if key >= first:
+                if key > first:
+                    remaining.append((first, key - 1))
+                first = key + 1
+            key = next(keys, None)
+        if first <= last:
+            remaining.append((first, last))
+    return remaining
+
+# eol TABLE_FILE [--start DATE] [--end DATE | --months N] [--by-location]
+def eol_report(arguments) -> int:
+    from AssetManagementTable import ReplacementReport, end_of_month
+    from datetime import date
+    start = parse_day(arguments.start) if arguments.start else date.today()
+    end = parse_day(arguments.end) if arguments.end else end_of_month(start, arguments.months)
+
+    mapped_table, changes = open_current(arguments.table_file)
+    with mapped_table:
+        if mapped_table.header['table_class'] != ASSET_TABLE:
+            print(f'{arguments.table_file} does not hold an AssetManagementTable.', file=sys.stderr)
+            return 1
+        # the saved EOL index is bisected, so only the assets in the window are read
+        price = mapped_table.categories.index('Purchase Price')
+        location = mapped_table.categories.index('Location')
+        eol = mapped_table.categories.index(EOL)
+        assets = [(mapped_table.record_at(position), mapped_table.key_at(position))
+                  for position in mapped_table.positions_between(EOL, start, end)]
+        assets = [(record, primary_key) for record, primary_key in assets if primary_key not in changes]
+        # an asset without an EOL date never reaches its End of Life, as in AssetManagementTable.replacement_windows()
+        assets.extend((record, primary_key) for primary_key, record in changes.items()
+                      if record is not None and record[eol] is not None and start <= record[eol] <= end)
+        assets.sort(key=lambda asset: (asset[0][eol], asset[1]))
+
+    cost_by_location = dict()
+    for record, primary_key in assets:
+        cost_by_location[record[location]] = cost_by_location.get(record[location], 0) + (record[price] or 0)
+    print(ReplacementReport(start, end, [primary_key for record, primary_key in assets],
+                            sum(cost_by_location.values()), cost_by_location if arguments.by_location else None))
+    return 0
+
+# export TABLE_FILE [--output FILE] [--format table|assets]
+def export_table(arguments) -> int:
+    mapped_table, changes = open_current(arguments.table_file)
+    with mapped_table:
+        if arguments.format == 'assets' and mapped_table.header['table_class'] != ASSET_TABLE:
+            print(f'{arguments.table_file} does not hold an AssetManagementTable.', file=sys.stderr)
+            return 1
+        # the records are written as they are read, one at a time, so memory stays flat whatever the size of the table
+        pairs = iter_current(mapped_table, changes)
+        if arguments.format == 'assets':
+            from AssetImport import format_asset_line
+            lines = (format_asset_line(record) for primary_key, record in pairs)
+        else:
+            from itertools import tee
+            pad_to = mapped_table.header['key_set']['pad_to']
+            keyed_pairs, record_pairs = tee(pairs)
+            lines = render_lines(mapped_table.categories, (record for primary_key, record in record_pairs),
+                                 (str(primary_key).zfill(pad_to) for primary_key, record in keyed_pairs))
+        output_file = open(arguments.output, 'w') if arguments.output else sys.stdout
+        try:
+            output_file.writelines(lines)
+        finally:
+            if output_file is not sys.stdout:
+                output_file.close()
+    return 0
+
+COMMANDS = {'get': get_record, 'add': add_record, 'eol': eol_report, 'export': export_table}
+
+def parse_arguments(argv: list):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description='Answers a single request about a saved table.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    get = commands.add_parser('get', help='print the record stored under a primary key')
+    get.add_argument('table_file')
+    get.add_argument('key', type=int)
+
+    add = commands.add_parser('add', help='add a record, and print its primary key')
+    add.add_argument('table_file')
+    add.add_argument('fields', nargs='+', help='the fields of the record, or a line of an asset file')
+
+    eol = commands.add_parser('eol', help='report the assets reaching their End of Life (EOL) in a window')
+    eol.add_argument('table_file')
+    eol.add_argument('--start', help='the first day of the window (DEFAULT = today)')
+    window = eol.add_mutually_exclusive_group()
+    window.add_argument('--end', help='the last day of the window')
+    window.add_argument('--months', type=int, default=0, help='end the window this many months after the end of this month (DEFAULT = 0)')
+    eol.add_argument('--by-location', action='store_true', help='also break the cost down by Location')
+
+    export = commands.add_parser('export', help='write every record of the table')
+    export.add_argument('table_file')
+    export.add_argument('--output', help='the file to write to (DEFAULT = standard output)')
+    export.add_argument('--format', choices=('table', 'assets'), default='table',
+                        help="'table' renders the table, 'assets' writes an asset file (DEFAULT = table)")
+    return parser.parse_args(argv)
+
+def main(argv: list = None) -> int:
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+    try:
+        return COMMANDS[arguments.command](arguments)
+    except FileNotFoundError as error:
+        print(f'Failed to open {error.filename}, no such file was found!', file=sys.stderr)
+    except (SyntaxError, ValueError, TableFileError) as error:
+        print(error, file=sys.stderr)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,696 @@
+'''
+Serves tables held in memory to many clients at once over a local TCP port, so that operators
+and scripts share one loaded copy of the data instead of each loading it again:
+
+    python asset_server.py serve [--host HOST] [--port PORT] [--assets NAME=ASSET_FILE ...] [--table NAME=TABLE_FILE ...]
+    python asset_server.py request [--host HOST] [--port PORT] OP [PARAMETER=VALUE ...]
+
+--assets loads an asset file (see AssetImport) into an AssetManagementTable that is only held in
+memory, and --table opens a table file with its ChangeLog, so that the records added through the
+server are logged.  Every table is opened as a concurrent KeyTable, since requests run on
+several threads at once.
+
+A request is a JSON object naming an operation and its parameters, with an optional id that is
+copied into the response:
+
+    {"id": 1, "op": "get", "table": "assets", "key": 12}
+    {"id": 1, "ok": true, "result": {...}}      or      {"id": 1, "ok": false, "error": "..."}
+
+    tables                          the class, categories, indexes and size of each table
+    get     table key               the record stored under a primary key
+    add     table records           adds records, each a list of fields, a {category: value}
+                                    object or, for an AssetManagementTable, a line of an asset
+                                    file, and returns their primary keys
+    query   table [where] [between] [select] [order_by] [descending] [limit]
+                                    runs a Query (see Query): where is {category: value}, and
+                                    between is a list of [category, low, high]
+    report  table kind ...          a report on an AssetManagementTable:
+                                        replacement  end [start] [by_location]
+                                        outlook      [months] [start] [by_location]
+                                        rollup       [by_location]
+                                        summary      name
+
+Dates are written as YYYY-MM-DD.  A connection speaks either JSON lines, one request per line
+and one response per line, or HTTP/1.1, with the request as the body of a POST or as
+GET /OP?PARAMETER=VALUE&...; its first line decides which.  Either way the requests of a
+connection are pipelined: the server goes on reading requests while the earlier ones run, and
+writes the responses in the order of the requests.  get is answered on the event loop, since a
+lookup by primary key never waits for a lock (see OPERATIONS), and the other operations run in a
+thread pool, so that a long query or report does not hold up the other connections.
+'''
+from AssetImport import parse_asset_line, parse_date
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import parse_qsl, urlsplit
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# the number of requests of one connection that may be running or waiting to be written at once
+PIPELINE_DEPTH = 64
+# the longest request line, or HTTP body, that is read
+MAX_REQUEST_BYTES = 16 * 2**20
+HTTP_METHODS = (b'GET', b'POST')
+EOL = 'End of Life (EOL)'
+
+# the categories of an AssetManagementTable whose values JSON cannot carry as they are
+ASSET_DECODERS = {'Purchase Date': parse_date, 'Purchase Price': Money, EOL: parse_date, '% Value at EOL': Percent}
+
+class RequestError(Exception):
+    '''
+    Raised by an AssetClient when the server answers a request with an error.
+    '''
+
+def _encode_value(value):
+    # the values JSON does not know; Money and Percent are already an int and a float
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, '__iter__'):
+        # such as the KeyRange of the primary keys given to added records
+        return list(value)
+    raise TypeError(f'ERROR: {type(value).__name__} values cannot be sent as JSON.')
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_encode_value, separators=(',', ':'))
+
+def parse_value(text: str):
+    '''
+    Reads a parameter written on a command line or in a URL: as JSON when it is valid JSON, such
+    as 12, true or ["Location", "Recruiting"], and as a string otherwise.
+    '''
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+#######################################################
+# Operations
+#######################################################
+
+def _required(request: dict, name: str):
+    if request.get(name) is None:
+        raise ValueError(f'ERROR: the {request["op"]} operation needs a {name!r} parameter.')
+    return request[name]
+
+def _decode(table, category: str, value):
+    '''
+    Turns a value received as JSON into a value of a category, such as a date from 'YYYY-MM-DD'.
+    '''
+    decoder = ASSET_DECODERS.get(category) if isinstance(table, AssetManagementTable) else None
+    if decoder is None or value is None:
+        return value
+    try:
+        return decoder(value)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError(f'ERROR: {value!r} is not a valid {category!r}.')
+
+def _decode_record(table, record) -> tuple:
+    if isinstance(record, str):
+        if not isinstance(table, AssetManagementTable):
+            raise ValueError('ERROR: a record may only be given as a line of an asset file for an AssetManagementTable.')
+        return parse_asset_line(record)
+    if isinstance(record, dict):
+        for category in record:
+            if category not in table.categories_set:
+                raise KeyError(f'ERROR: {category!r} is not a category of this table.')
+        record = [record.get(category) for category in table.categories]
+    if not isinstance(record, list):
+        raise ValueError(f'ERROR: {record!r} is not a record, expected a list of fields.')
+    return tuple(_decode(table, category, value) for category, value in zip(table.categories, record))
+
+def list_tables(server, request: dict) -> dict:
+    tables = dict()
+    for name, table in server.tables.items():
+        tables[name] = {'class': type(table).__name__, 'categories': table.categories, 'records': len(table.records),
+                        'indexes': {category: index.kind for category, index in table.indexes.items()}}
+        if isinstance(table, AssetManagementTable):
+            tables[name]['summaries'] = list(table.summaries)
+    return tables
+
+def get_record(server, request: dict) -> dict:
+    table = server.table(request)
+    primary_key = _required(request, 'key')
+    record = table.retrieve_by_key(primary_key)
+    if record is None:
+        raise KeyError(f'ERROR: {primary_key} is not the primary key of a record in {request["table"]!r}.')
+    return {'key': primary_key, 'record': dict(zip(table.categories, record))}
+
+def add_records(server, request: dict) -> dict:
+    table = server.table(request)
+    records = _required(request, 'records')
+    if not isinstance(records, list):
+        raise ValueError("ERROR: 'records' must be a list of records.")
+    # every record is decoded before any is added, so that a bad record adds none of them
+    records = tuple(_decode_record(table, record) for record in records)
+    if not records:
+        return {'keys': []}
+    return {'keys': list(table.add_records(records))}
+
+def run_query(server, request: dict) -> dict:
+    table = server.table(request)
+    query = table.query()
+    where = request.get('where') or {}
+    if not isinstance(where, dict):
+        raise ValueError("ERROR: 'where' must be an object of {category: value}.")
+    if where:
+        query = query.where(**{category: _decode(table, category, value) for category, value in where.items()})
+    for condition in request.get('between') or ():
+        category, low, high = condition
+        query = query.where_between(category, _decode(table, category, low), _decode(table, category, high))
+    if request.get('order_by') is not None:
+        query = query.order_by(request['order_by'], bool(request.get('descending', False)))
+    if request.get('limit') is not None:
+        query = query.limit(int(request['limit']))
+    categories = request.get('select') or table.categories
+    if isinstance(categories, str):
+        categories = (categories,)
+    if request.get('select'):
+        query = query.select(*categories)
+    primary_keys = list()
+    records = list()
+    for primary_key, record in query.items():
+        primary_keys.append(primary_key)
+        records.append(record)
+    return {'categories': categories, 'keys': primary_keys, 'records': records}
+
+def _report_result(report) -> dict:
+    return {'start': report.start, 'end': report.end, 'count': report.count, 'total_cost': report.total_cost,
+            'cost_by_location': report.cost_by_location, 'keys': report.primary_keys}
+
+def _table_result(table) -> dict:
+    # a Table built for this request, such as a roll-up; its records are sent as a tuple of
+    # plain tuples whatever its storage, rather than relying on how the storage iterates
+    return {'categories': table.categories, 'records': table.freeze()}
+
+def run_report(server, request: dict):
+    table = server.table(request)
+    if not isinstance(table, AssetManagementTable):
+        raise ValueError(f'ERROR: {request["table"]!r} is not an AssetManagementTable, which the reports are for.')
+    kind = request.get('kind', 'replacement')
+    start = _decode(table, EOL, request.get('start'))
+    by_location = request.get('by_location')
+    if kind == 'replacement':
+        end = _decode(table, EOL, _required(request, 'end'))
+        return _report_result(table.replacement_report(end, start=start, by_location=bool(by_location)))
+    elif kind == 'outlook':
+        months = tuple(request.get('months') or (1, 3, 6, 12))
+        return [_report_result(report) for report in table.replacement_outlook(months, start=start, by_location=bool(by_location))]
+    elif kind == 'rollup':
+        return _table_result(table.replacement_cost_rollup(by_location=True if by_location is None else bool(by_location)))
+    elif kind == 'summary':
+        return _table_result(table.summary(_required(request, 'name')).table())
+    raise ValueError(f"ERROR: Unknown report {kind!r}, expected one of ('replacement', 'outlook', 'rollup', 'summary').")
+
+# op -> (function of (server, request), whether it is answered on the event loop)
+# Only get is: it never blocks, since every served table is concurrent, so its records are
+# PagedRecords, whose lookups (KeyTable.retrieve_by_key() -> PagedRecords.get()) read the
+# directory of pages and one page without taking the commit gate, a key lock or any other
+# lock; a writer only ever replaces a page or the directory as a whole, or changes a page
+# entry in place, which a lookup sees either before or after.  See test_get_does_not_wait_for_writers.
+OPERATIONS = {'tables': (list_tables, False), 'get': (get_record, True), 'add': (add_records, False),
+              'query': (run_query, False), 'report': (run_report, False)}
+
+def _answer(server, operation: str, request: dict) -> str:
+    '''
+    Runs a request and returns its result as JSON, which is encoded on the same thread as the
+    request is run, since a large result takes as long to encode as to find.
+    '''
+    function = OPERATIONS[operation][0]
+    return _dumps(function(server, request))
+
+#######################################################
+# Server
+#######################################################
+
+class AssetServer:
+    '''
+    An AssetServer answers the requests of many connections at once on one asyncio event loop;
+    see the top of this file for the requests.  Use serve_forever() from a script, or
+    start_in_thread() and stop() to run a server next to other code, such as a test.
+    '''
+    def __init__(self, tables: dict, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 workers: int = None, pipeline_depth: int = PIPELINE_DEPTH) -> None:
+        '''
+        Parameters
+        ----------
+        tables : dict
+            {name: KeyTable} for each table to serve; each must be concurrent
+        host : str
+            the address to listen on
+        port : int
+            the port to listen on, or 0 for any free port (see the port attribute once started)
+        workers : int
+            the number of threads that run the operations not answered on the event loop
+            DEFAULT = as ThreadPoolExecutor
+        pipeline_depth : int
+            the number of requests of one connection that may be in progress at once
+
+        Raises
+        ------
+        ValueError
+            when a table is not concurrent
+        '''
+        for name, table in tables.items():
+            if not table.concurrent:
+                raise ValueError(f'ERROR: Table {name!r} must be concurrent to be served, since requests run on several threads.')
+        self.tables: dict = dict(tables)
+        self.host: str = host
+        self.port: int = port
+        self.pipeline_depth: int = pipeline_depth
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='asset_server')
+        self._server = None
+        self._loop = None
+        self._thread = None
+        # the task serving each open connection
+        self._connections: set = set()
+    # END __init__()
+
+    def table(self, request: dict):
+        name = _required(request, 'table')
+        if name not in self.tables:
+            raise KeyError(f'ERROR: {name!r} is not a table of this server, expected one of {tuple(self.tables)}.')
+        return self.tables[name]
+
+    async def start(self) -> None:
+        '''
+        Starts listening for connections.
+        '''
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port, limit=MAX_REQUEST_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        '''
+        Stops listening, closes the open connections once their requests in progress are
+        answered, waits for the operations already running in the thread pool, and returns the
+        primary keys that the pool reserved but did not use to the tables.
+        '''
+        if self._server is not None:
+            self._server.close()
+            connections = tuple(self._connections)
+            for connection in connections:
+                connection.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            await self._server.wait_closed()
+        await self._loop.run_in_executor(None, self._executor.shutdown)
+        for table in self.tables.values():
+            table.release_reserved_keys()
+
+    def start_in_thread(self) -> 'AssetServer':
+        '''
+        Starts the server on an event loop of its own, in a background thread, and returns once it
+        is listening.
+        '''
+        started = threading.Event()
+        failure = list()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(self.start())
+            except Exception as error:
+                failure.append(error)
+                loop.close()
+                return
+            finally:
+                started.set()
+            try:
+                loop.run_forever()
+                loop.run_until_complete(self.close())
+            finally:
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name='asset_server', daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        return self
+
+    def stop(self) -> None:
+        '''
+        Stops a server started with start_in_thread().
+        '''
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    async def _run(self, request) -> tuple:
+        '''
+        Answers one request, or the error met while reading it.  Returns (ok, response as JSON).
+        '''
+        request_id = request.get('id') if isinstance(request, dict) else None
+        try:
+            if isinstance(request, Exception):
+                raise request
+            if not isinstance(request, dict):
+                raise ValueError('ERROR: a request must be a JSON object.')
+            operation = request.get('op')
+            if operation not in OPERATIONS:
+                raise ValueError(f'ERROR: Unknown operation {operation!r}, expected one of {tuple(OPERATIONS)}.')
+            if OPERATIONS[operation][1]:
+                result = _answer(self, operation, request)
+            else:
+                result = await self._loop.run_in_executor(self._executor, _answer, self, operation, request)
+        except Exception as error:
+            # a KeyError keeps its message in its first argument; str() would quote it
+            message = error.args[0] if isinstance(error, KeyError) and error.args else str(error)
+            return False, _dumps({'id': request_id, 'ok': False, 'error': message or type(error).__name__})
+        return True, f'{{"id":{_dumps(request_id)},"ok":true,"result":{result}}}'
+
+    async def _serve_connection(self, reader, writer) -> None:
+        try:
+            await self._serve_requests(reader, writer)
+        except asyncio.CancelledError:
+            # close() cancels the open connections; the task still ends normally, since
+            # asyncio.start_server() on Python 3.11 reports a cancelled connection as an error
+            writer.close()
+            self._connections.discard(asyncio.current_task())
+
+    async def _serve_requests(self, reader, writer) -> None:
+        self._connections.add(asyncio.current_task())
+        # the responses in request order, as (task answering the request, http, keep_alive), then None
+        responses = asyncio.Queue(self.pipeline_depth)
+        responder = asyncio.ensure_future(self._write_responses(responses, writer))
+        try:
+            line = await reader.readline()
+            http = line.split(b' ', 1)[0] in HTTP_METHODS
+            keep_alive = True
+            while line and keep_alive and not responder.done():
+                if http:
+                    request, keep_alive = await _read_http_request(line, reader)
+                else:
+                    request = _read_json_line(line)
+                if request is not None:
+                    # waits while pipeline_depth requests are in progress, which also stops reading more of them
+                    task = asyncio.ensure_future(self._run(request))
+                    if not await _enqueue(responses, (task, http, keep_alive), responder):
+                        task.cancel()
+                if keep_alive:
+                    line = await reader.readline()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            # ValueError: a line longer than MAX_REQUEST_BYTES; the connection cannot be read any further
+            pass
+        finally:
+            await _enqueue(responses, None, responder)
+            await asyncio.gather(responder, return_exceptions=True)
+            # what is left was not written, because the client went away
+            while not responses.empty():
+                pending = responses.get_nowait()
+                if pending is not None:
+                    pending[0].cancel()
+            writer.close()
+            self._connections.discard(asyncio.current_task())
+
+    async def _write_responses(self, responses: asyncio.Queue, writer) -> None:
+        while True:
+            pending = await responses.get()
+            if pending is None:
+                return
+            task, http, keep_alive = pending
+            ok, response = await task
+            body = response.encode() + b'\n'
+            if http:
+                status = b'200 OK' if ok else b'400 Bad Request'
+                writer.write(b'HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n'
+                             % (status, len(body), b'keep-alive' if keep_alive else b'close'))
+            writer.write(body)
+            await writer.drain()
+
+async def _enqueue(responses: asyncio.Queue, item, responder) -> bool:
+    '''
+    Waits for room in the queue of responses, unless the responder stops first, as when the
+    client goes away.  Returns whether the item was queued.
+    '''
+    if responder.done():
+        return False
+    if not responses.full():
+        responses.put_nowait(item)
+        return True
+    put = asyncio.ensure_future(responses.put(item))
+    await asyncio.wait((put, responder), return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        return False
+    return True
+
+def _read_json_line(line: bytes):
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return ValueError('ERROR: the request is not valid JSON.')
+
+async def _read_http_request(request_line: bytes, reader) -> tuple:
+    '''
+    Reads the rest of an HTTP request.  Returns (request, or the error it holds, keep_alive).
+    A request whose request line or Content-Length cannot be read is answered with an error,
+    and the connection closed after it, since where the next request starts is not known.
+    '''
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        return ValueError(f'ERROR: {request_line.strip()[:100]!r} is not an HTTP request line.'), False
+    method, target, version = parts
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, separator, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get('content-length', '0')
+    if not length.isdigit() or int(length) > MAX_REQUEST_BYTES:
+        return ValueError(f'ERROR: {length[:100]!r} is not a Content-Length of at most {MAX_REQUEST_BYTES} bytes.'), False
+    body = await reader.readexactly(int(length))
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+    url = urlsplit(target)
+    operation = url.path.strip('/')
+    if method == 'GET':
+        request = {name: parse_value(value) for name, value in parse_qsl(url.query)}
+    else:
+        request = _read_json_line(body)
+        if not isinstance(request, dict):
+            return request or ValueError('ERROR: the request is not valid JSON.'), keep_alive
+    if operation:
+        request.setdefault('op', operation)
+    return request, keep_alive
+
+#######################################################
+# Client
+#######################################################
+
+class AssetClient:
+    '''
+    A blocking client of an AssetServer, which speaks JSON lines over one connection:
+
+        with AssetClient(port=8765) as client:
+            client.get('assets', 12)
+            client.query('assets', where={'Location': 'Recruiting'}, order_by=EOL, limit=10)
+            responses = client.pipeline({'op': 'get', 'table': 'assets', 'key': key} for key in keys)
+    '''
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = None) -> None:
+        self._socket = socket.create_connection((host, port), timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile('rwb')
+        self._next_id: int = 0
+    # END __init__()
+
+    def __send(self, request: dict) -> None:
+        request = dict(request)
+        self._next_id += 1
+        request.setdefault('id', self._next_id)
+        self._file.write(_dumps(request).encode() + b'\n')
+
+    def __receive(self) -> dict:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('ERROR: the server closed the connection.')
+        return json.loads(line)
+
+    def pipeline(self, requests, window: int = PIPELINE_DEPTH // 2) -> list:
+        '''
+        Sends many requests without waiting for each answer, and returns the responses in the
+        order of the requests, errors included, as {'id', 'ok', 'result' or 'error'}.
+
+        Parameters
+        ----------
+        requests : iterable of dict
+            the requests, each with an 'op'
+        window : int
+            the number of requests sent ahead of the responses read; while it is smaller than the
+            pipeline depth of the server, neither side can wait on the other forever
+        '''
+        responses = list()
+        sent = 0
+        for request in requests:
+            self.__send(request)
+            sent += 1
+            if sent - len(responses) >= window:
+                self._file.flush()
+                responses.append(self.__receive())
+        self._file.flush()
+        while len(responses) < sent:
+            responses.append(self.__receive())
+        return responses
+
+    def request(self, operation: str, **parameters):
+        '''
+        Sends one request, and returns its result.
+
+        Raises
+        ------
+        RequestError
+            when the server answers with an error
+        '''
+        response = self.pipeline(({'op': operation, **parameters},))[0]
+        if not response['ok']:
+            raise RequestError(response['error'])
+        return response['result']
+
+    def tables(self) -> dict:
+        return self.request('tables')
+
+    def get(self, table: str, key: int) -> dict:
+        return self.request('get', table=table, key=key)['record']
+
+    def add(self, table: str, records: list) -> list:
+        return self.request('add', table=table, records=records)['keys']
+
+    def query(self, table: str, **parameters) -> dict:
+        return self.request('query', table=table, **parameters)
+
+    def report(self, table: str, kind: str = 'replacement', **parameters):
+        return self.request('report', table=table, kind=kind, **parameters)
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> 'AssetClient':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+#######################################################
+# Command line
+#######################################################
+
+def _named_files(values: list) -> list:
+    named = list()
+    for value in values or ():
+        name, separator, file_name = value.partition('=')
+        if not separator or not name or not file_name:
+            raise SyntaxError(f'ERROR: {value!r} is not NAME=FILE.')
+        named.append((name, file_name))
+    return named
+
+# serve [--host HOST] [--port PORT] [--assets NAME=ASSET_FILE ...] [--table NAME=TABLE_FILE ...]
+def serve(arguments) -> int:
+    from ChangeLog import ChangeLog
+    tables = dict()
+    change_logs = list()
+    try:
+        for name, file_name in _named_files(arguments.assets):
+            table = AssetManagementTable(concurrent=True)
+            directory, base_name = os.path.split(file_name)
+            report = table.append_records_from_txt_file(directory, base_name[:-4] if base_name.endswith('.txt') else base_name)
+            print(f'{name}: {report}', file=sys.stderr)
+            tables[name] = table
+        for name, file_name in _named_files(arguments.table):
+            change_log = ChangeLog.open(file_name, concurrent=True)
+            change_logs.append(change_log)
+            tables[name] = change_log.table
+            print(f'{name}: {len(change_log.table.records)} records from {file_name}', file=sys.stderr)
+        if not tables:
+            print('There is no table to serve; give at least one --assets or --table.', file=sys.stderr)
+            return 1
+
+        server = AssetServer(tables, arguments.host, arguments.port, arguments.workers, arguments.pipeline_depth)
+
+        async def run():
+            await server.start()
+            print(f'Serving {", ".join(tables)} on {server.host}:{server.port}', file=sys.stderr)
+            await server.serve_forever()
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    finally:
+        for change_log in change_logs:
+            change_log.close()
+    return 0
+
+# request [--host HOST] [--port PORT] OP [PARAMETER=VALUE ...]
+def send_request(arguments) -> int:
+    parameters = dict()
+    for parameter in arguments.parameters:
+        name, separator, value = parameter.partition('=')
+        if not separator:
+            raise SyntaxError(f'ERROR: {parameter!r} is not PARAMETER=VALUE.')
+        parameters[name] = parse_value(value)
+    try:
+        with AssetClient(arguments.host, arguments.port) as client:
+            result = client.request(arguments.op, **parameters)
+    except RequestError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+COMMANDS = {'serve': serve, 'request': send_request}
+
+def parse_arguments(argv: list):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description='Serves tables held in memory to many clients at once.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='load tables and serve them until interrupted')
+    serve.add_argument('--assets', action='append', metavar='NAME=ASSET_FILE', help='serve an asset file under a name')
+    serve.add_argument('--table', action='append', metavar='NAME=TABLE_FILE', help='serve a logged table file under a name')
+    serve.add_argument('--workers', type=int, help='the number of threads for queries, reports and adds')
+    serve.add_argument('--pipeline-depth', type=int, default=PIPELINE_DEPTH,
+                       help=f'the requests of a connection that may be in progress at once (DEFAULT = {PIPELINE_DEPTH})')
+
+    request = commands.add_parser('request', help='send one request to a server, and print its result')
+    request.add_argument('op', choices=tuple(OPERATIONS))
+    request.add_argument('parameters', nargs='*', metavar='PARAMETER=VALUE', help='a parameter, as JSON or as a string')
+
+    for command in (serve, request):
+        command.add_argument('--host', default=DEFAULT_HOST, help=f'(DEFAULT = {DEFAULT_HOST})')
+        command.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'(DEFAULT = {DEFAULT_PORT})')
+    return parser.parse_args(argv)
+
+def main(argv: list = None) -> int:
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+    try:
+        return COMMANDS[arguments.command](arguments)
+    except FileNotFoundError as error:
+        print(f'Failed to open {error.filename}, no such file was found!', file=sys.stderr)
+    except ConnectionRefusedError:
+        print(f'No server is listening on {arguments.host}:{arguments.port}.', file=sys.stderr)
+    except (SyntaxError, ValueError) as error:
+        print(error, file=sys.stderr)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+'''
+Times the hot paths of the tables, at several sizes, and writes the results as JSON so that two
+runs can be compared, such as before and after an upgrade:
+
+    python benchmark.py [--sizes N [N ...]] [--repeat R] [--only NAME [NAME ...]] [--output FILE]
+    python benchmark.py --compare BASELINE.json [--threshold 0.2] ...
+
+Each benchmark is timed --repeat times at each size, and the best time is the one compared,
+since it is the least disturbed by the rest of the machine.  The data for each run is generated
+from a fixed seed, so every run times the same work.  With --compare, the exit status is 1 when
+any benchmark is slower than the baseline by more than --threshold (0.2 = 20%) and by more than
+a millisecond.
+'''
+from AssetImport import format_asset_line
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from KeySet import KeySet
+from KeyTable import KeyTable
+from Table import Table
+from datetime import date, timedelta
+from functools import lru_cache
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+LOCATIONS = ('Recruiting', 'Accounting', 'Engineering', 'Facilities', 'Legal', 'Marketing', 'Sales', 'Support')
+ASSET_CATEGORIES = ('Asset Description', 'Location', 'Purchase Date', 'Purchase Price', 'End of Life (EOL)', '% Value at EOL')
+EOL = 'End of Life (EOL)'
+SEED = 2022
+# the directories of the generated asset files, removed when the run ends
+GENERATED_DIRECTORIES = list()
+
+# name -> function(size) that prepares a run, and returns (the function to time, the number of items it handles)
+BENCHMARKS = dict()
+# name -> the largest size a benchmark is run at, for those that would take too long at larger sizes
+MAX_SIZES = dict()
+
+def benchmark(name: str, max_size: int = None):
+    def register(prepare):
+        BENCHMARKS[name] = prepare
+        if max_size is not None:
+            MAX_SIZES[name] = max_size
+        return prepare
+    return register
+
+@lru_cache(maxsize=None)
+def asset_records(size: int) -> tuple:
+    '''
+    Returns size asset records, the same ones for every run.
+    '''
+    generator = random.Random(SEED)
+    records = list()
+    for number in range(size):
+        purchase_date = date(2018, 1, 1) + timedelta(days=generator.randrange(1_500))
+        records.append((f'Laptop-{number}', generator.choice(LOCATIONS), purchase_date, Money(generator.randrange(500, 5_000)),
+                        purchase_date + timedelta(days=365 * generator.randrange(3, 6)), Percent(generator.randrange(0, 30) / 100)))
+    return tuple(records)
+
+@lru_cache(maxsize=None)
+def asset_file(size: int) -> tuple:
+    '''
+    Writes the asset records of a size to an asset file, and returns (file_path, file_name).
+    '''
+    file_path = tempfile.mkdtemp(prefix='benchmark-')
+    GENERATED_DIRECTORIES.append(file_path)
+    with open(os.path.join(file_path, f'assets-{size}.txt'), 'w') as output_file:
+        output_file.writelines(format_asset_line(record) for record in asset_records(size))
+    return file_path, f'assets-{size}'
+
+def asset_key_set(size: int) -> KeySet:
+    # wide enough for every record, and for the default AssetManagementTable keys
+    return KeySet(0, max(99_999, 2 * size))
+
+@lru_cache(maxsize=None)
+def asset_table(size: int) -> AssetManagementTable:
+    '''
+    Returns an AssetManagementTable of size assets, shared by the benchmarks that only read it.
+    '''
+    table = AssetManagementTable(asset_key_set(size))
+    table.add_records(asset_records(size))
+    table.create_index('Location')
+    return table
+
+def lookup_keys(size: int, count: int = 10_000) -> list:
+    generator = random.Random(SEED)
+    primary_keys = list(asset_table(size).records.keys())
+    return [generator.choice(primary_keys) for lookup in range(count)]
+
+# KeySet.generate_new()
+@benchmark('keyset.generate_new.sparse')
+def generate_new_sparse(size: int) -> tuple:
+    # a very wide key space, of which only the first keys are ever used
+    key_set = KeySet(0, sys.maxsize)
+    return (lambda: [key_set.generate_new() for key in range(size)]), size
+
+@benchmark('keyset.generate_new.dense')
+def generate_new_dense(size: int) -> tuple:
+    # a key space of exactly size keys, filled up to the last one
+    key_set = KeySet(0, size - 1)
+    return (lambda: [key_set.generate_new() for key in range(size)]), size
+
+@benchmark('keyset.generate_new.fragmented')
+def generate_new_fragmented(size: int) -> tuple:
+    # every other key is already taken, so each new key comes from a different free interval
+    key_set = KeySet(0, 2 * size - 1)
+    key_set.reserve(range(1, 2 * size, 2))
+    key_set.next_key = 0
+    return (lambda: [key_set.generate_new() for key in range(size)]), size
+
+# add_records()
+@benchmark('table.add_records')
+def table_add_records(size: int) -> tuple:
+    table = Table(ASSET_CATEGORIES)
+    records = asset_records(size)
+    return (lambda: table.add_records(*records)), size
+
+@benchmark('keytable.add_records')
+def keytable_add_records(size: int) -> tuple:
+    table = KeyTable(ASSET_CATEGORIES, asset_key_set(size))
+    records = asset_records(size)
+    return (lambda: table.add_records(records)), size
+
+@benchmark('keytable.add_records.columns')
+def keytable_add_records_columns(size: int) -> tuple:
+    table = KeyTable(ASSET_CATEGORIES, asset_key_set(size), storage='columns')
+    records = asset_records(size)
+    return (lambda: table.add_records(records)), size
+
+@benchmark('assets.add_records')
+def assets_add_records(size: int) -> tuple:
+    # with the EOL index and the summaries of an AssetManagementTable kept current
+    table = AssetManagementTable(asset_key_set(size))
+    records = asset_records(size)
+    return (lambda: table.add_records(records)), size
+
+# rendering
+@benchmark('table.str')
+def table_str(size: int) -> tuple:
+    table = Table(ASSET_CATEGORIES)
+    table.add_records(*asset_records(size))
+    return (lambda: str(table)), size
+
+@benchmark('keytable.str')
+def keytable_str(size: int) -> tuple:
+    table = asset_table(size)
+    return (lambda: str(table)), size
+
+# importing
+@benchmark('assets.append_records_from_txt_file')
+def append_records_from_txt_file(size: int) -> tuple:
+    file_path, file_name = asset_file(size)
+    table = AssetManagementTable(asset_key_set(size))
+    return (lambda: table.append_records_from_txt_file(file_path, file_name)), size
+
+@benchmark('assets.append_records_from_txt_file.parallel')
+def append_records_from_txt_file_parallel(size: int) -> tuple:
+    # a worker per CPU, but at least two, so that the parallel path is the one timed
+    file_path, file_name = asset_file(size)
+    table = AssetManagementTable(asset_key_set(size))
+    workers = max(2, os.cpu_count() or 1)
+    return (lambda: table.append_records_from_txt_file(file_path, file_name, workers=workers)), size
+
+# lookups and reports, on a table of size assets
+@benchmark('keytable.retrieve_by_key')
+def retrieve_by_key(size: int) -> tuple:
+    table = asset_table(size)
+    primary_keys = lookup_keys(size)
+    return (lambda: [table.retrieve_by_key(primary_key) for primary_key in primary_keys]), len(primary_keys)
+
+@benchmark('keytable.find.hash_index')
+def find_hash_index(size: int) -> tuple:
+    table = asset_table(size)
+    return (lambda: [table.find('Location', location) for location in LOCATIONS]), size
+
+@benchmark('keytable.query.top_50')
+def query_top_50(size: int) -> tuple:
+    table = asset_table(size)
+    query = table.query().where(Location='Engineering').order_by('Purchase Price', descending=True).limit(50)
+    return (lambda: list(query)), size
+
+@benchmark('assets.replacement_report')
+def replacement_report(size: int) -> tuple:
+    table = asset_table(size)
+    return (lambda: table.replacement_report(date(2023, 12, 31), start=date(2023, 1, 1), by_location=True)), size
+
+@benchmark('assets.replacement_outlook')
+def replacement_outlook(size: int) -> tuple:
+    table = asset_table(size)
+    return (lambda: table.replacement_outlook(start=date(2023, 1, 1), by_location=True)), size
+
+@benchmark('assets.replacement_cost_rollup')
+def replacement_cost_rollup(size: int) -> tuple:
+    table = asset_table(size)
+    return (lambda: table.replacement_cost_rollup()), size
+
+def run_benchmark(name: str, size: int, repeat: int) -> dict:
+    '''
+    Times one benchmark at one size, preparing a fresh run before each timing.
+    '''
+    times = list()
+    for run in range(repeat):
+        timed, items = BENCHMARKS[name](size)
+        # the garbage left by the previous run is not charged to this one
+        gc.collect()
+        start = time.perf_counter()
+        timed()
+        times.append(time.perf_counter() - start)
+        del timed
+    best = min(times)
+    return {'name': name, 'size': size, 'items': items, 'times': times, 'best': best,
+            'median': statistics.median(times), 'per_item_us': best / items * 1e6 if items else None}
+
+def environment() -> dict:
+    '''
+    Describes where the benchmarks ran, since timings are only comparable on the same machine.
+    '''
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    try:
+        from subprocess import run, DEVNULL
+        commit = run(('git', 'rev-parse', 'HEAD'), capture_output=True, text=True, stdin=DEVNULL,
+                     cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+            'implementation': platform.python_implementation(), 'platform': platform.platform(),
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'numpy': numpy_version, 'commit': commit}
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    '''
+    Prints how each result compares to the same benchmark and size in a baseline run, and returns
+    the (name, size) of those that are slower by more than threshold.
+    '''
+    baseline_best = {(result['name'], result['size']): result['best'] for result in baseline['results']}
+    regressions = list()
+    print(f'\n{"benchmark":40s}{"size":>10s}{"baseline":>12s}{"now":>12s}{"change":>10s}', file=sys.stderr)
+    for result in results:
+        key = (result['name'], result['size'])
+        if key not in baseline_best:
+            print(f'{result["name"]:40s}{result["size"]:>10,}{"-":>12s}{result["best"]:>11.4f}s{"new":>10s}', file=sys.stderr)
+            continue
+        change = result['best'] / baseline_best[key] - 1 if baseline_best[key] else 0.0
+        # a change of less than a millisecond is timer noise, however large it is relatively
+        slower = change > threshold and result['best'] - baseline_best[key] > 0.001
+        flag = '  SLOWER' if slower else ''
+        print(f'{result["name"]:40s}{result["size"]:>10,}{baseline_best[key]:>11.4f}s{result["best"]:>11.4f}s{change:>+10.1%}{flag}', file=sys.stderr)
+        if slower:
+            regressions.append(key)
+    return regressions
+
+def parse_arguments(argv: list):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description='Times the hot paths of the tables, and writes the results as JSON.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f'the numbers of keys or records to time each benchmark with (DEFAULT = {" ".join(map(str, DEFAULT_SIZES))})')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of times each benchmark is timed at each size (DEFAULT = 3)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='run only the benchmarks whose names start with one of these, such as keyset or assets.replacement')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks, and exit')
+    parser.add_argument('--output', help='the file to write the JSON results to (DEFAULT = standard output)')
+    parser.add_argument('--compare', metavar='BASELINE', help='the JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='how much slower than the baseline counts as a regression (DEFAULT = 0.2, 20%%)')
+    return parser.parse_args(argv)
+
+def main(argv: list = None) -> int:
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if arguments.list:
+        print('\n'.join(BENCHMARKS))
+        return 0
+    if arguments.repeat < 1:
+        print('ERROR: --repeat must be at least 1.', file=sys.stderr)
+        return 1
+    names = [name for name in BENCHMARKS if not arguments.only or name.startswith(tuple(arguments.only))]
+    if not names:
+        print(f'ERROR: No benchmark matches {arguments.only}, see --list.', file=sys.stderr)
+        return 1
+    baseline = None
+    if arguments.compare:
+        try:
+            with open(arguments.compare) as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            print(f'Failed to open {arguments.compare}, no such file was found!', file=sys.stderr)
+            return 1
+
+    results = list()
+    try:
+        for name in names:
+            for size in arguments.sizes:
+                if size > MAX_SIZES.get(name, size):
+                    continue
+                result = run_benchmark(name, size, arguments.repeat)
+                print(f'{name:40s}{size:>10,}{result["best"]:>11.4f}s{result["per_item_us"]:>10.3f}us/item', file=sys.stderr)
+                results.append(result)
+            # the tables shared by the benchmarks are only kept for one benchmark at a time, to keep memory flat
+            asset_table.cache_clear()
+    finally:
+        for directory in GENERATED_DIRECTORIES:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    output = json.dumps({'environment': environment(), 'sizes': list(arguments.sizes), 'repeat': arguments.repeat,
+                         'results': results}, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+    if baseline is not None and compare(results, baseline, arguments.threshold):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
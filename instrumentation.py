@@ -0,0 +1,274 @@
+'''
+Opt-in instrumentation of the hot paths of KeySet, Table, KeyTable and AssetManagementTable,
+to find out whether a slow action is spent allocating keys, inserting records, rendering or
+parsing files:
+
+    import instrumentation
+    instrumentation.enable()                    # or enable(trace_memory=True)
+    ...
+    print(instrumentation.report())
+
+enable() replaces each instrumented method with a wrapper that times it, and disable() puts the
+original methods back, so while instrumentation is off the classes are exactly as written and
+cost nothing extra.  For each operation, such as 'KeyTable.add_records', the wrappers keep the
+number of calls, the total, smallest and largest time, a sample of the times for percentiles,
+and the number of rows (keys or records) handled.  With trace_memory, each bulk operation also
+takes a tracemalloc snapshot before and after it runs, and keeps the memory it allocated and the
+lines that allocated the most.
+'''
+from contextlib import contextmanager
+from functools import wraps
+from random import Random
+import threading
+import time
+import tracemalloc
+
+# the number of times kept per operation for its percentiles; later times replace kept ones at random
+SAMPLE_SIZE = 10_000
+PERCENTILES = (50, 90, 99)
+
+def _length(instance, arguments, result, changed_before) -> int:
+    return len(result)
+
+def _one(instance, arguments, result, changed_before) -> int:
+    return 1
+
+def _arguments(instance, arguments, result, changed_before) -> int:
+    return len(arguments)
+
+def _records(instance, arguments, result, changed_before) -> int:
+    return len(instance.records)
+
+def _records_changed(instance, arguments, result, changed_before) -> int:
+    # counted by the table as it commits each change, since counting the records of a
+    # concurrent KeyTable walks every page and sees the changes of other threads too
+    return instance.changed_records - changed_before
+
+def _records_added(instance, arguments, result, changed_before) -> int:
+    return result.records_added
+
+def _reported(instance, arguments, result, changed_before) -> int:
+    return max((report.count for report in result), default=0)
+
+# (module, class, method, the rows it handled as a function of (instance, arguments, result,
+# changed_records of the instance before the call), whether it is a bulk operation)
+INSTRUMENTED_METHODS = (
+    ('KeySet', 'KeySet', 'generate_new', _one, False),
+    ('KeySet', 'KeySet', 'generate_many', _length, False),
+    ('KeySet', 'KeySet', 'reserve', _length, False),
+    ('KeySet', 'KeySet', 'remove_key', _arguments, False),
+    ('Table', 'Table', 'add_records', _records_changed, True),
+    ('Table', 'Table', '__str__', _records, False),
+    ('Table', 'Table', 'write_to', _records, False),
+    ('KeyTable', 'KeyTable', 'add_records', _records_changed, True),
+    ('KeyTable', 'KeyTable', 'restore_records', _records_changed, True),
+    ('KeyTable', 'KeyTable', 'retrieve_by_key', _one, False),
+    ('KeyTable', 'KeyTable', 'update_record', _one, False),
+    ('KeyTable', 'KeyTable', 'remove_records', _records_changed, False),
+    ('KeyTable', 'KeyTable', 'create_index', _records, True),
+    ('KeyTable', 'KeyTable', 'find', _length, False),
+    ('KeyTable', 'KeyTable', 'find_between', _length, False),
+    ('AssetManagementTable', 'AssetManagementTable', 'append_records_from_txt_file', _records_added, True),
+    ('AssetManagementTable', 'AssetManagementTable', 'write_table_to_txt_file', _records, True),
+    ('AssetManagementTable', 'AssetManagementTable', 'replacement_windows', _reported, False),
+    ('AssetManagementTable', 'AssetManagementTable', 'replacement_cost_rollup', _records, False),
+)
+
+class OperationStats:
+    '''
+    The statistics of one instrumented operation.
+    '''
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.calls: int = 0
+        self.rows: int = 0
+        self.total_time: float = 0.0
+        self.min_time: float = None
+        self.max_time: float = None
+        self.samples: list = list()
+        # {'allocated_bytes', 'peak_bytes', 'top'} of the latest traced call of a bulk operation
+        self.memory: dict = None
+    # END __init__()
+
+    def record(self, elapsed: float, rows: int) -> None:
+        self.calls += 1
+        self.rows += rows
+        self.total_time += elapsed
+        if self.min_time is None or elapsed < self.min_time:
+            self.min_time = elapsed
+        if self.max_time is None or elapsed > self.max_time:
+            self.max_time = elapsed
+        # every call has the same chance to be in the sample, however many calls there are
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(elapsed)
+        else:
+            position = _random.randrange(self.calls)
+            if position < SAMPLE_SIZE:
+                self.samples[position] = elapsed
+
+    def as_dict(self) -> dict:
+        ordered = sorted(self.samples)
+        stats = {'calls': self.calls, 'rows': self.rows, 'total_time': self.total_time,
+                 'mean_time': self.total_time / self.calls if self.calls else None,
+                 'min_time': self.min_time, 'max_time': self.max_time,
+                 'rows_per_second': self.rows / self.total_time if self.total_time else None}
+        for percent in PERCENTILES:
+            # the nearest-rank percentile of the sampled times
+            stats[f'p{percent}'] = ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] if ordered else None
+        if self.memory is not None:
+            stats['memory'] = dict(self.memory)
+        return stats
+
+_random = Random()
+_lock = threading.Lock()
+# operation name -> OperationStats
+_stats = dict()
+# (class, method name) -> the original method, while instrumentation is on
+_originals = dict()
+_trace_memory = False
+_memory_top = 5
+# the depth of the traced bulk operations running in each thread, so that only the outermost one is traced
+_tracing = threading.local()
+# the allocations of tracemalloc itself and of this module are left out of the snapshots
+_MEMORY_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+
+def _wrap(cls, method_name: str, rows, bulk: bool):
+    original = cls.__dict__[method_name]
+    operation = f'{cls.__name__}.{method_name}'
+    needs_changes = rows is _records_changed
+
+    @wraps(original)
+    def instrumented(instance, *arguments, **keywords):
+        changed_before = instance.changed_records if needs_changes else None
+        traced = bulk and _trace_memory and not getattr(_tracing, 'depth', 0)
+        if traced:
+            _tracing.depth = 1
+            # the snapshot is taken first, so that what it allocates does not count toward the peak
+            before = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            result = original(instance, *arguments, **keywords)
+        finally:
+            elapsed = time.perf_counter() - start
+            if traced:
+                _tracing.depth = 0
+        handled = rows(instance, arguments, result, changed_before)
+        if traced:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            differences = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS).compare_to(before, 'lineno')
+            memory = {'allocated_bytes': sum(difference.size_diff for difference in differences),
+                      'peak_bytes': peak_memory - start_memory,
+                      'top': [(str(difference.traceback), difference.size_diff) for difference in differences[:_memory_top]]}
+        with _lock:
+            stats = _stats.get(operation)
+            if stats is None:
+                stats = _stats[operation] = OperationStats(operation)
+            stats.record(elapsed, handled)
+            if traced:
+                stats.memory = memory
+        return result
+    return instrumented
+
+def enable(trace_memory: bool = False, memory_top: int = 5) -> None:
+    '''
+    Turns instrumentation on.  Calling it again only changes trace_memory and memory_top.
+
+    Parameters
+    ----------
+    trace_memory : bool
+        also trace the memory allocated by each bulk operation (add_records, restore_records,
+        create_index and the asset file imports and exports) with tracemalloc, which slows every
+        allocation down while it is on
+    memory_top : int
+        the number of source lines that allocated the most to keep for each traced operation
+    '''
+    global _trace_memory, _memory_top
+    from importlib import import_module
+    _memory_top = memory_top
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not trace_memory and _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = trace_memory
+    if _originals:
+        return
+    for module_name, class_name, method_name, rows, bulk in INSTRUMENTED_METHODS:
+        cls = getattr(import_module(module_name), class_name)
+        _originals[(cls, method_name)] = cls.__dict__[method_name]
+        setattr(cls, method_name, _wrap(cls, method_name, rows, bulk))
+
+def disable() -> None:
+    '''
+    Turns instrumentation off, and puts the original methods back.  The statistics are kept.
+    '''
+    global _trace_memory
+    for (cls, method_name), original in _originals.items():
+        setattr(cls, method_name, original)
+    _originals.clear()
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+@contextmanager
+def instrumented(trace_memory: bool = False):
+    '''
+    Turns instrumentation on for the length of a with block, unless it was already on.
+    '''
+    was_enabled = is_enabled()
+    enable(trace_memory=trace_memory)
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+def stats() -> dict:
+    '''
+    Returns {operation: statistics} for every operation called while instrumentation was on.
+    Times are in seconds.
+    '''
+    with _lock:
+        return {name: operation.as_dict() for name, operation in sorted(_stats.items())}
+
+def report() -> str:
+    '''
+    Returns the statistics as a table, slowest operations (by total time) first.
+    '''
+    operations = sorted(stats().items(), key=lambda item: item[1]['total_time'], reverse=True)
+    if not operations:
+        return 'No instrumented operation has been called yet.' if is_enabled() else 'Instrumentation is off.'
+    lines = [f'{"operation":52s}{"calls":>9s}{"rows":>11s}{"total ms":>11s}{"p50 ms":>9s}{"p90 ms":>9s}{"p99 ms":>9s}{"max ms":>9s}',
+             '=' * 119]
+    for name, operation in operations:
+        lines.append(f'{name:52s}{operation["calls"]:>9,}{operation["rows"]:>11,}{operation["total_time"] * 1e3:>11.2f}'
+                     f'{operation["p50"] * 1e3:>9.3f}{operation["p90"] * 1e3:>9.3f}{operation["p99"] * 1e3:>9.3f}{operation["max_time"] * 1e3:>9.3f}')
+        memory = operation.get('memory')
+        if memory is not None:
+            lines.append(f'    last call allocated {memory["allocated_bytes"]:,} bytes, peak {memory["peak_bytes"]:,} bytes')
+            for line, size in memory['top']:
+                lines.append(f'        {size:>+14,} B  {line}')
+    return '\n'.join(lines)
+
+#######################################################
+#Testing code:
+#######################################################
+if __name__ == '__main__':
+    from AssetManagementTable import AssetManagementTable
+    from datetime import date
+
+    with instrumented(trace_memory=True):
+        my_assets = AssetManagementTable()
+        my_assets.append_records_from_txt_file('', 'assets')
+        str(my_assets)
+        my_assets.retrieve_by_key(1)
+        my_assets.replacement_report(date(2022, 12, 31), start=date(2022, 1, 1))
+    print(report())
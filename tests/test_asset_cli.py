@@ -0,0 +1,81 @@
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from ChangeLog import ChangeLog
+from KeySet import KeySet
+from datetime import date
+import asset_cli
+import pytest
+
+def asset(number: int) -> tuple:
+    return (f'Laptop-{number}', ('Recruiting', 'Accounting')[number % 2], date(2020, 1, 1), Money(100 * number),
+            date(2024, 1 + number % 12, 1), Percent(0.1))
+
+@pytest.fixture
+def table_file(tmp_path):
+    '''
+    A saved asset table of 50 assets, with changes logged after the snapshot: an added asset,
+    an asset whose EOL date was cleared, and a removed asset.
+    '''
+    file_name = str(tmp_path / 'assets.table')
+    table = AssetManagementTable(KeySet(1, 10**5))
+    table.add_records(tuple(asset(number) for number in range(50)))
+    with ChangeLog.create(table, file_name):
+        table.add_records(asset(50))
+        table.update_record(3, {'End of Life (EOL)': None})
+        table.update_record(4, {'End of Life (EOL)': None, 'Purchase Price': None})
+        table.remove_records(5)
+    return file_name, table
+
+def test_eol_report_skips_assets_without_an_eol_date(table_file, capsys):
+    file_name, table = table_file
+    assert asset_cli.main(['eol', file_name, '--start', '2024-01-01', '--end', '2024-12-31', '--by-location']) == 0
+    expected = table.replacement_windows(date(2024, 12, 31), start=date(2024, 1, 1), by_location=True)[0]
+    assert capsys.readouterr().out == f'{expected}\n'
+
+def test_export_matches_the_table(table_file, capsys):
+    file_name, table = table_file
+    assert asset_cli.main(['export', file_name]) == 0
+    assert capsys.readouterr().out == str(table)
+
+def test_export_to_an_asset_file(tmp_path):
+    file_name = str(tmp_path / 'assets.table')
+    table = AssetManagementTable(KeySet(1, 10**5))
+    table.add_records(tuple(asset(number) for number in range(20)))
+    with ChangeLog.create(table, file_name):
+        table.add_records(asset(20))
+    output = tmp_path / 'assets.txt'
+    assert asset_cli.main(['export', file_name, '--format', 'assets', '--output', str(output)]) == 0
+    imported = AssetManagementTable(KeySet(1, 10**5))
+    imported.append_records_from_txt_file(str(tmp_path), 'assets')
+    assert list(imported.records.values()) == list(table.records.values())
+
+def test_export_streams_the_records(table_file, monkeypatch):
+    file_name, table = table_file
+    read = list()
+    iter_current = asset_cli.iter_current
+
+    def counted(mapped_table, changes):
+        for pair in iter_current(mapped_table, changes):
+            read.append(pair[0])
+            yield pair
+
+    class Output:
+        def writelines(self, lines) -> None:
+            for count, line in enumerate(lines):
+                # each record is written before the next one is read
+                assert len(read) <= max(0, count - 2) + 1
+
+    monkeypatch.setattr(asset_cli, 'iter_current', counted)
+    monkeypatch.setattr(asset_cli.sys, 'stdout', Output())
+    assert asset_cli.main(['export', file_name]) == 0
+    assert len(read) == 50
+
+def test_export_of_assets_needs_an_asset_table(tmp_path, capsys):
+    from KeyTable import KeyTable
+    from TableFile import save_table
+    table = KeyTable(('Name',), KeySet(0, 10))
+    table.add_records((('a',),))
+    save_table(table, str(tmp_path / 'names.table'))
+    output = tmp_path / 'names.txt'
+    assert asset_cli.main(['export', str(tmp_path / 'names.table'), '--format', 'assets', '--output', str(output)]) == 1
+    assert not output.exists()
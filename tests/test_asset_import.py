@@ -0,0 +1,55 @@
+from AssetImport import ImportReport, iter_asset_batches, iter_asset_batches_parallel
+from AssetManagementTable import AssetManagementTable
+from KeySet import KeySet
+import AssetImport
+
+LINES = [f'Laptop-{number}, Location-{number % 7}, 2018-{1 + number % 12}-{1 + number % 28}, {1_000 + number}, 2022-4-12, 0.{number % 10}\n'
+         for number in range(2_000)]
+LINES[10] = 'not an asset\n'
+LINES[1_500] = '\n'
+LINES[1_777] = 'Laptop, Recruiting, 2018-13-1, 4000, 2022-4-12, 0.1\n'
+
+def test_parallel_import_matches_serial(tmp_path):
+    file_name = tmp_path / 'assets.txt'
+    file_name.write_text(''.join(LINES))
+    serial_report, parallel_report = ImportReport(), ImportReport()
+    with open(file_name) as input_file:
+        serial = list(iter_asset_batches(input_file, 300, serial_report))
+    # small ranges, so that batches span several ranges and ranges span several batches
+    parallel = list(iter_asset_batches_parallel(str(file_name), 300, parallel_report, workers=2, chunk_bytes=5_000))
+
+    assert parallel == serial
+    assert [len(batch) for batch in parallel] == [300] * 6 + [197]
+    for serial_record, parallel_record in zip(serial[0], parallel[0]):
+        assert list(map(type, parallel_record)) == list(map(type, serial_record))
+    assert parallel_report.lines_read == serial_report.lines_read == 2_000
+    assert parallel_report.errors == serial_report.errors
+    assert [line_number for line_number, line, reason in parallel_report.errors] == [11, 1_778]
+
+def test_parallel_table_matches_serial(tmp_path):
+    (tmp_path / 'assets.txt').write_text(''.join(LINES))
+    serial, parallel = AssetManagementTable(KeySet(0, 10**5)), AssetManagementTable(KeySet(0, 10**5))
+    serial.append_records_from_txt_file(str(tmp_path), 'assets')
+    report = parallel.append_records_from_txt_file(str(tmp_path), 'assets', batch_size=250, workers=2)
+    assert report.records_added == 1_997
+    assert dict(parallel.records.items()) == dict(serial.records.items())
+
+def test_parallel_import_caps_the_shared_values(tmp_path, monkeypatch):
+    file_name = tmp_path / 'assets.txt'
+    file_name.write_text(''.join(LINES))
+    with open(file_name) as input_file:
+        serial = list(iter_asset_batches(input_file, 300, ImportReport()))
+
+    def imported() -> list:
+        return [record for batch in iter_asset_batches_parallel(str(file_name), 300, ImportReport(), workers=2, chunk_bytes=5_000)
+                for record in batch]
+
+    records = imported()
+    purchase_dates = {record[2] for record in records}
+    # every record with the same purchase date shares one date
+    assert len({id(record[2]) for record in records}) == len(purchase_dates)
+    # the 84 purchase dates are more than are kept, so they are made again once forgotten
+    monkeypatch.setattr(AssetImport, 'SHARED_VALUES', 20)
+    records = imported()
+    assert records == [record for batch in serial for record in batch]
+    assert len({id(record[2]) for record in records}) > len(purchase_dates)
@@ -0,0 +1,71 @@
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from KeySet import KeySet
+from datetime import date
+import pytest
+
+def new_table() -> AssetManagementTable:
+    table = AssetManagementTable(KeySet(1, 10**5))
+    table.add_records((('Laptop', 'Sales', date(2020, 1, 1), Money(100), date(2024, 1, 1), Percent(0.1)),
+                       ('Desk', 'Recruiting', date(2020, 1, 1), Money(50), date(2025, 1, 1), Percent(0.2))))
+    return table
+
+@pytest.mark.parametrize('name', ('', None, 'cost_by_location'))
+def test_register_summary_rejects_empty_and_taken_names(name):
+    table = new_table()
+    cost_by_location = table.summary('cost_by_location')
+    with pytest.raises(ValueError):
+        table.register_summary(name, 'Purchase Date')
+    # the registered summaries are left as they were, and still kept current
+    assert set(table.summaries) == {'eol_by_month', 'cost_by_location'}
+    assert table.summary('cost_by_location') is cost_by_location
+    table.add_records(('Chair', 'Sales', date(2021, 1, 1), Money(20), date(2026, 1, 1), Percent(0.3)))
+    assert cost_by_location['Sales']['count'] == 2
+
+def test_a_dropped_summary_can_be_registered_again():
+    table = new_table()
+    table.drop_summary('cost_by_location')
+    summary = table.register_summary('cost_by_location', 'Location', sum='Purchase Price')
+    assert summary['Sales']['count'] == 1
+
+def test_replacement_windows_match_one_window_at_a_time():
+    table = AssetManagementTable(KeySet(1, 10**5))
+    table.add_records(tuple((f'Laptop-{number}', ('Sales', 'Recruiting')[number % 2], date(2020, 1, 1), Money(number),
+                             date(2024, 1 + number % 12, 1 + number % 28), Percent(0.1)) for number in range(500)))
+    deadlines = (date(2024, 6, 30), date(2024, 1, 31), date(2024, 12, 31), date(2024, 3, 31))
+    reports = table.replacement_windows(*deadlines, start=date(2024, 1, 1), by_location=True)
+    for deadline, report in zip(deadlines, reports):
+        alone, = table.replacement_windows(deadline, start=date(2024, 1, 1), by_location=True)
+        assert report.end == deadline and report.count == alone.count
+        assert report.primary_keys == alone.primary_keys
+        assert report.total_cost == alone.total_cost and report.cost_by_location == alone.cost_by_location
+    # the windows share one list of primary keys instead of each copying the ones before it
+    assert len({id(report._ReplacementReport__primary_keys) for report in reports}) == 1
+
+def test_write_table_to_txt_file_streams_the_lines(tmp_path, monkeypatch):
+    import AssetManagementTable as asset_management_table
+    table = new_table()
+    formatted = list()
+    format_asset_line = asset_management_table.format_asset_line
+
+    def counted(record) -> str:
+        formatted.append(record)
+        return format_asset_line(record)
+
+    class Output:
+        def __init__(self, *arguments) -> None:
+            self.lines = list()
+        def __enter__(self) -> 'Output':
+            return self
+        def __exit__(self, *exception) -> None:
+            pass
+        def writelines(self, lines) -> None:
+            for line in lines:
+                # each line is written before the next record is formatted
+                assert len(formatted) == len(self.lines) + 1
+                self.lines.append(line)
+
+    monkeypatch.setattr(asset_management_table, 'format_asset_line', counted)
+    monkeypatch.setattr(asset_management_table, 'open', Output, raising=False)
+    table.write_table_to_txt_file(str(tmp_path), 'assets')
+    assert len(formatted) == 2
@@ -0,0 +1,180 @@
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from KeySet import KeySet
+from Table import Table
+from asset_server import AssetClient, AssetServer, RequestError, _dumps, _table_result
+from datetime import date
+import json
+import pytest
+import socket
+import threading
+
+def asset(number: int) -> tuple:
+    return (f'Laptop-{number}', ('Recruiting', 'Accounting')[number % 2], date(2020, 1, 1), Money(100 + number),
+            date(2024, 1 + number % 12, 1), Percent(0.1))
+
+@pytest.fixture
+def server():
+    table = AssetManagementTable(KeySet(1, 10**6), concurrent=True)
+    table.add_records(tuple(asset(number) for number in range(100)))
+    table.create_index('Location')
+    server = AssetServer({'assets': table}, port=0).start_in_thread()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def client(server):
+    with AssetClient(port=server.port, timeout=10) as client:
+        yield client
+
+def http(server, *requests: bytes) -> list:
+    '''
+    Sends raw HTTP requests over one connection, and returns the (status line, JSON body) of each response.
+    '''
+    with socket.create_connection(('127.0.0.1', server.port), timeout=10) as connection:
+        connection.sendall(b''.join(requests))
+        stream = connection.makefile('rb')
+        responses = list()
+        for request in requests:
+            status = stream.readline().decode().strip()
+            headers = dict()
+            while (line := stream.readline()) not in (b'\r\n', b''):
+                name, value = line.decode().split(':', 1)
+                headers[name.lower()] = value.strip()
+            responses.append((status, json.loads(stream.read(int(headers['content-length'])))))
+        return responses
+
+def test_get_and_tables(client):
+    assert client.get('assets', 1) == {'Asset Description': 'Laptop-0', 'Location': 'Recruiting', 'Purchase Date': '2020-01-01',
+                                       'Purchase Price': 100, 'End of Life (EOL)': '2024-01-01', '% Value at EOL': 0.1}
+    tables = client.tables()
+    assert tables['assets']['records'] == 100 and tables['assets']['indexes']['Location'] == 'hash'
+
+def test_pipelined_responses_keep_the_order_of_the_requests(client):
+    requests = list()
+    for number in range(300):
+        if number % 50 == 0:
+            requests.append({'op': 'add', 'table': 'assets', 'records': [f'Added-{number}, Sales, 2021-1-1, 10, 2025-1-1, 0.2']})
+        elif number % 7 == 0:
+            requests.append({'op': 'query', 'table': 'assets', 'where': {'Location': 'Accounting'}, 'limit': 3})
+        else:
+            requests.append({'op': 'get', 'table': 'assets', 'key': 1 + number % 100})
+    responses = client.pipeline(requests, window=40)
+    assert [response['id'] for response in responses] == list(range(1, 301))
+    assert all(response['ok'] for response in responses)
+    for request, response in zip(requests, responses):
+        if request['op'] == 'get':
+            assert response['result']['record']['Asset Description'] == f'Laptop-{request["key"] - 1}'
+
+def test_errors_are_answered_and_the_connection_goes_on(client, server):
+    responses = client.pipeline((
+        {'op': 'nothing'},
+        {'op': 'get', 'table': 'nowhere', 'key': 1},
+        {'op': 'get', 'table': 'assets'},
+        {'op': 'get', 'table': 'assets', 'key': 10**5},
+        {'op': 'add', 'table': 'assets', 'records': [['Laptop', 'Sales', 'not a date', 1, '2025-1-1', 0.1]]},
+        {'op': 'report', 'table': 'assets', 'kind': 'nothing'},
+        {'op': 'get', 'table': 'assets', 'key': 2},
+    ))
+    assert [response['ok'] for response in responses] == [False] * 6 + [True]
+    assert 'Unknown operation' in responses[0]['error']
+    assert "'key'" in responses[2]['error']
+    assert 'is not the primary key' in responses[3]['error']
+    with pytest.raises(RequestError):
+        client.get('assets', 10**5)
+    # a line that is not JSON is answered with an error too
+    with socket.create_connection(('127.0.0.1', server.port), timeout=10) as connection:
+        connection.sendall(b'{not json\n{"op": "get", "table": "assets", "key": 3}\n')
+        stream = connection.makefile('rb')
+        assert json.loads(stream.readline())['ok'] is False
+        assert json.loads(stream.readline())['result']['key'] == 3
+
+def test_http(server):
+    body = json.dumps({'table': 'assets', 'kind': 'rollup'}).encode()
+    responses = http(server,
+                     b'GET /get?table=assets&key=5 HTTP/1.1\r\nHost: test\r\n\r\n',
+                     b'POST /report HTTP/1.1\r\nHost: test\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body),
+                     b'GET /get?table=assets&key=999999 HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n')
+    (first_status, first), (second_status, second), (third_status, third) = responses
+    assert first_status == 'HTTP/1.1 200 OK' and first['result']['record']['Asset Description'] == 'Laptop-4'
+    assert second_status == 'HTTP/1.1 200 OK'
+    assert second['result']['categories'][:2] == ['Location', 'month']
+    assert sum(record[2] for record in second['result']['records']) == 100
+    assert third_status == 'HTTP/1.1 400 Bad Request' and third['ok'] is False
+
+def test_queries_racing_adds_see_whole_records(server):
+    stop = threading.Event()
+    failures = list()
+
+    def add() -> None:
+        try:
+            with AssetClient(port=server.port, timeout=10) as client:
+                for batch in range(40):
+                    client.add('assets', [f'Racing-{batch}-{number}, Sales, 2021-1-1, 10, 2025-1-1, 0.2' for number in range(25)])
+        except Exception as error:
+            failures.append(error)
+        finally:
+            stop.set()
+
+    adder = threading.Thread(target=add)
+    adder.start()
+    counts = list()
+    with AssetClient(port=server.port, timeout=10) as client:
+        while not stop.is_set():
+            result = client.query('assets', where={'Location': 'Sales'})
+            assert all(len(record) == 6 and record[0].startswith('Racing-') for record in result['records'])
+            assert len(result['keys']) == len(set(result['keys']))
+            counts.append(len(result['keys']))
+        adder.join()
+        assert not failures
+        assert counts == sorted(counts)
+        assert len(client.query('assets', where={'Location': 'Sales'})['keys']) == 1_000
+
+def test_get_does_not_wait_for_writers(server, client):
+    table = server.tables['assets']
+    paused = threading.Event()
+    release = threading.Event()
+
+    def hold_writers() -> None:
+        # the commit gate and every key lock, as held by writers in the middle of changes
+        with table.paused_writes():
+            for lock in table._KeyTable__key_locks:
+                lock.acquire()
+            paused.set()
+            release.wait()
+            for lock in table._KeyTable__key_locks:
+                lock.release()
+
+    holder = threading.Thread(target=hold_writers)
+    holder.start()
+    try:
+        assert paused.wait(10)
+        # the client times out after 10 seconds if get waits for the writers
+        assert client.get('assets', 7)['Asset Description'] == 'Laptop-6'
+    finally:
+        release.set()
+        holder.join()
+
+@pytest.mark.parametrize('storage', ('rows', 'columns'))
+def test_result_tables_are_sent_as_records(storage):
+    table = Table(('Name', 'Bought'), storage=storage)
+    table.add_records(('a', date(2020, 1, 2)), ('b', date(2021, 3, 4)))
+    assert json.loads(_dumps(_table_result(table))) == {'categories': ['Name', 'Bought'], 'records': [['a', '2020-01-02'], ['b', '2021-03-04']]}
+
+def test_stopping_returns_the_reserved_keys():
+    table = AssetManagementTable(KeySet(1, 10**6), concurrent=True)
+    server = AssetServer({'assets': table}, port=0).start_in_thread()
+    with AssetClient(port=server.port, timeout=10) as client:
+        client.add('assets', ['Laptop, Sales, 2021-1-1, 10, 2025-1-1, 0.2'])
+    server.stop()
+    assert len(table.primary_key_set) == len(table.records) == 1
+
+@pytest.mark.parametrize('request_line', (b'GET /get?table=assets&key=5\r\n', b'POST a b c HTTP/1.1\r\n', b'GET / HTTP/1.1 extra\r\n'))
+def test_a_malformed_http_request_is_answered(server, request_line):
+    (status, response), = http(server, request_line + b'Host: test\r\n\r\n')
+    assert status == 'HTTP/1.1 400 Bad Request' and response['ok'] is False
+    assert 'is not an HTTP request line' in response['error']
+
+def test_a_bad_content_length_is_answered(server):
+    (status, response), = http(server, b'POST /get HTTP/1.1\r\nHost: test\r\nContent-Length: lots\r\n\r\n')
+    assert status == 'HTTP/1.1 400 Bad Request' and 'Content-Length' in response['error']
@@ -0,0 +1,169 @@
+from ChangeLog import ENTRY_HEADER, ChangeLog, _segments, read_changes
+from TableFile import TableFileError
+from zlib import crc32
+from KeySet import KeySet
+from KeyTable import KeyTable
+import ChangeLog as change_log_module
+import TableFile
+import os
+import pytest
+
+class Crash(Exception):
+    pass
+
+def crash(*arguments, **keywords):
+    raise Crash()
+
+def new_table(count: int = 100, concurrent: bool = False) -> KeyTable:
+    table = KeyTable(('Number', 'Name'), KeySet(0, 10**6), concurrent=concurrent)
+    table.add_records(tuple((number, f'name-{number}') for number in range(count)))
+    return table
+
+def change(table: KeyTable) -> None:
+    table.add_records(((1_000, 'added'), (1_001, 'added')))
+    table.update_record(5, {'Name': 'updated'})
+    table.remove_records(6, 7)
+
+def contents(table) -> dict:
+    return {primary_key: tuple(record) for primary_key, record in table.records.items()}
+
+def reopened(file_name: str) -> dict:
+    with ChangeLog.open(file_name, compact_bytes=None) as change_log:
+        return contents(change_log.table)
+
+def test_changes_are_replayed(tmp_path, capsys):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table()
+    with ChangeLog.create(table, file_name):
+        change(table)
+    capsys.readouterr()
+    assert reopened(file_name) == contents(table)
+    # replaying the removals is quiet
+    assert capsys.readouterr().out == ''
+    with ChangeLog.open(file_name) as change_log:
+        assert change_log.table.primary_key_set.next_key == table.primary_key_set.next_key
+
+def test_a_torn_entry_ends_the_log(tmp_path):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table()
+    with ChangeLog.create(table, file_name):
+        change(table)
+    expected = contents(table)
+    (segment_name, number), = _segments(file_name)
+    # a crash in the middle of writing an entry leaves its header and part of its payload
+    with open(segment_name, 'ab') as segment:
+        segment.write(b'\x40\x00\x00\x00\x00\x00\x00\x00partial')
+    assert reopened(file_name) == expected
+
+    # the torn entry was cut off, so the entries logged after reopening are replayed too
+    with ChangeLog.open(file_name) as change_log:
+        change_log.table.update_record(8, {'Name': 'after'})
+        expected = contents(change_log.table)
+    assert reopened(file_name) == expected
+
+def test_a_crash_before_the_new_snapshot_keeps_the_old_table(tmp_path, monkeypatch):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table()
+    with ChangeLog.create(table, file_name):
+        change(table)
+    expected = contents(table)
+
+    monkeypatch.setattr(TableFile.os, 'replace', crash)
+    with pytest.raises(Crash):
+        ChangeLog.create(new_table(10), file_name)
+    monkeypatch.undo()
+    assert reopened(file_name) == expected
+
+def test_a_crash_before_the_old_segments_are_removed_keeps_the_new_table(tmp_path, monkeypatch):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table()
+    with ChangeLog.create(table, file_name):
+        change(table)
+    replacement = new_table(10)
+
+    monkeypatch.setattr(change_log_module.os, 'remove', crash)
+    with pytest.raises(Crash):
+        ChangeLog.create(replacement, file_name)
+    monkeypatch.undo()
+    # the old segment is still there, but the new snapshot does not replay it
+    assert len(_segments(file_name)) == 1
+    assert reopened(file_name) == contents(replacement)
+
+def test_a_crash_during_compaction_loses_nothing(tmp_path, monkeypatch):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table()
+    change_log = ChangeLog.create(table, file_name, compact_bytes=None)
+    change(table)
+    monkeypatch.setattr(TableFile.os, 'replace', crash)
+    with pytest.raises(Crash):
+        change_log.compact(background=False)
+    monkeypatch.undo()
+    table.update_record(9, {'Name': 'after the crash'})
+    change_log.close()
+    assert reopened(file_name) == contents(table)
+
+@pytest.mark.parametrize('concurrent', (False, True))
+def test_compaction_keeps_every_change(tmp_path, concurrent):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table(concurrent=concurrent)
+    with ChangeLog.create(table, file_name, compact_bytes=None) as change_log:
+        change(table)
+        change_log.compact()
+        # changes made while the snapshot is written go to the new segment
+        for number in range(200):
+            table.add_records((2_000 + number, 'during'))
+        change_log.wait_for_compaction()
+        table.update_record(10, {'Name': 'after'})
+    assert [number for name, number in _segments(file_name)] == [2]
+    assert not os.path.exists(f'{file_name}.tmp')
+    assert reopened(file_name) == contents(table)
+
+def test_closing_returns_the_reserved_keys(tmp_path):
+    file_name = str(tmp_path / 'numbers.table')
+    table = new_table(concurrent=True)
+    with ChangeLog.create(table, file_name):
+        table.add_records((1_000, 'added'))
+        assert len(table.primary_key_set) > len(table.records)
+    assert len(table.primary_key_set) == len(table.records) == 101
+
+class Payload:
+    '''
+    Unpickling this calls Payload.run(), which records that it ran.
+    '''
+    ran = list()
+
+    @classmethod
+    def run(cls) -> None:
+        cls.ran.append(True)
+
+    def __reduce__(self):
+        return (Payload.run, ())
+
+def test_a_pickled_entry_is_rejected_without_running_it(tmp_path):
+    import pickle
+    file_name = str(tmp_path / 'numbers.table')
+    with ChangeLog.create(new_table(), file_name):
+        pass
+    (segment_name, number), = _segments(file_name)
+    payload = pickle.dumps((1, 'remove', (Payload(),)))
+    with open(segment_name, 'ab') as segment:
+        segment.write(ENTRY_HEADER.pack(len(payload), crc32(payload)) + payload)
+    with pytest.raises(TableFileError):
+        reopened(file_name)
+    with pytest.raises(TableFileError):
+        list(read_changes(file_name))
+    assert not Payload.ran
+
+def test_logged_values_keep_their_types(tmp_path):
+    from AssetManagementTable import AssetManagementTable
+    from AssetTypes import Money, Percent
+    from datetime import date
+    file_name = str(tmp_path / 'assets.table')
+    table = AssetManagementTable(KeySet(1, 10**5))
+    with ChangeLog.create(table, file_name):
+        table.add_records(('Laptop', 'Sales', date(2020, 1, 1), Money(100), date(2024, 1, 1), Percent(0.1)))
+        table.update_record(1, {'End of Life (EOL)': None, 'Purchase Price': Money(90)})
+    with ChangeLog.open(file_name) as change_log:
+        record = change_log.table.retrieve_by_key(1)
+    assert tuple(record) == ('Laptop', 'Sales', date(2020, 1, 1), 90, None, 0.1)
+    assert type(record['Purchase Price']) is Money and type(record['% Value at EOL']) is Percent
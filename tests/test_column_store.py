@@ -0,0 +1,106 @@
+from AssetTypes import Money, Percent
+from ColumnStore import ColumnarRecords, ColumnStore
+from Table import record_type
+from datetime import date
+import ColumnStore as column_store_module
+import pytest
+import random
+
+CATEGORIES = ('Name', 'Location', 'Purchase Date', 'Price', 'Rate', 'Note')
+LOCATIONS = ('Recruiting', 'Accounting', 'Sales')
+
+@pytest.fixture(params=('python', 'numpy'))
+def backend(request, monkeypatch):
+    '''
+    Runs a test once with the pure-array fallback and once with the NumPy scans.
+    '''
+    if request.param == 'numpy':
+        monkeypatch.setattr(column_store_module, 'numpy', pytest.importorskip('numpy'))
+    else:
+        monkeypatch.setattr(column_store_module, 'numpy', None)
+    return request.param
+
+def records(count: int = 300) -> dict:
+    generator = random.Random(11)
+    return {primary_key: record_type(CATEGORIES)((f'Laptop-{primary_key}', generator.choice(LOCATIONS), date(2020, 1, 1 + generator.randrange(28)),
+                                                  Money(generator.randrange(100, 120)), Percent(generator.randrange(10) / 10),
+                                                  None if primary_key % 4 == 0 else f'note-{primary_key % 3}'))
+            for primary_key in range(1_000, 1_000 + count)}
+
+def columnar(rows: dict) -> ColumnarRecords:
+    stored = ColumnarRecords(CATEGORIES, record_type(CATEGORIES))
+    stored.update(rows.items())
+    # dead rows, which every scan has to skip
+    for primary_key in list(rows)[::7]:
+        del stored[primary_key]
+        del rows[primary_key]
+    return stored
+
+def test_column_kinds():
+    stored = columnar(records())
+    kinds = {category: stored.store.column(category).kind for category in CATEGORIES}
+    assert kinds == {'Name': 'str', 'Location': 'str', 'Purchase Date': 'date', 'Price': 'int', 'Rate': 'float', 'Note': 'object'}
+
+@pytest.mark.parametrize('category, value', (
+    ('Location', 'Sales'), ('Location', 'Nowhere'), ('Purchase Date', date(2020, 1, 5)), ('Price', Money(110)),
+    ('Price', 110.0), ('Rate', Percent(0.5)), ('Note', None), ('Note', 'note-1'),
+))
+def test_keys_equal(backend, category, value):
+    rows = records()
+    stored = columnar(rows)
+    assert stored.keys_equal(category, value) == [primary_key for primary_key, record in rows.items() if record[category] == value]
+
+@pytest.mark.parametrize('category, low, high', (
+    ('Purchase Date', date(2020, 1, 3), date(2020, 1, 9)), ('Price', Money(105), Money(108)),
+    ('Rate', Percent(0.2), Percent(0.6)), ('Note', 'note-0', 'note-1'), ('Price', 200, 300),
+))
+def test_keys_between(backend, category, low, high):
+    rows = records()
+    stored = columnar(rows)
+    expected = [primary_key for primary_key, record in rows.items() if record[category] is not None and low <= record[category] <= high]
+    assert stored.keys_between(category, low, high) == expected
+
+@pytest.mark.parametrize('category', ('Purchase Date', 'Price', 'Rate', 'Location'))
+@pytest.mark.parametrize('descending', (False, True))
+def test_keys_ordered_by_is_stable(backend, category, descending):
+    rows = records()
+    stored = columnar(rows)
+    assert stored.keys_ordered_by(category, descending) == sorted(rows, key=lambda primary_key: rows[primary_key][category], reverse=descending)
+
+def test_total_keeps_the_column_type(backend):
+    rows = records()
+    stored = columnar(rows)
+    total = stored.total('Price')
+    assert total == sum(record['Price'] for record in rows.values()) and type(total) is Money
+    some_keys = list(rows)[:20]
+    assert stored.total('Price', some_keys) == sum(rows[primary_key]['Price'] for primary_key in some_keys)
+    assert stored.total('Rate') == pytest.approx(sum(record['Rate'] for record in rows.values()))
+
+def test_scans_after_compaction(backend):
+    rows = records()
+    stored = columnar(rows)
+    # removing most of the rows compacts the columns
+    for primary_key in list(rows)[:200]:
+        del stored[primary_key]
+        del rows[primary_key]
+    assert dict(stored.items()) == rows
+    assert stored.keys_equal('Location', 'Sales') == [primary_key for primary_key, record in rows.items() if record['Location'] == 'Sales']
+    assert stored.keys_between('Price', 110, 115) == [primary_key for primary_key, record in rows.items() if 110 <= record['Price'] <= 115]
+
+def test_a_none_turns_a_typed_column_into_an_object_column(backend):
+    store = ColumnStore(('Price',), record_type(('Price',)))
+    store.extend(((Money(5),), (Money(7),)))
+    assert store.column('Price').kind == 'int'
+    store.append((None,))
+    assert store.column('Price').kind == 'object'
+    assert list(store.positions_equal('Price', None)) == [2]
+    assert list(store.positions_between('Price', 0, 6)) == [0]
+    assert list(store.order('Price', positions=[0, 1])) == [0, 1]
+
+def test_column_array():
+    numpy = pytest.importorskip('numpy')
+    rows = records()
+    stored = columnar(rows)
+    prices = stored.column_array('Price')
+    assert prices.dtype == numpy.int64 and prices.tolist() == [int(record['Price']) for record in rows.values()]
+    assert stored.column_array('Note') is None
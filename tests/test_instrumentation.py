@@ -0,0 +1,86 @@
+from KeySet import KeySet
+from KeyTable import KeyTable
+from Snapshot import PagedRecords, RecordsSnapshot
+from Table import Table
+import instrumentation
+import pytest
+import threading
+import time
+
+@pytest.fixture
+def instrumented():
+    instrumentation.reset()
+    with instrumentation.instrumented():
+        yield
+    instrumentation.reset()
+
+class Interleaved:
+    '''
+    A listener that, in the middle of the first commit to a table, has another thread add five
+    records, and waits until they are in.
+    '''
+    def __init__(self, table: KeyTable) -> None:
+        self.table = table
+        self.thread = None
+
+    def add_many(self, pairs) -> None:
+        if self.thread is None:
+            count = len(self.table._KeyTable__records)
+            self.thread = threading.Thread(target=self.table.add_records, args=(((9,),) * 5,))
+            self.thread.start()
+            while len(self.table._KeyTable__records) < count + 5:
+                time.sleep(0.001)
+
+    def update(self, primary_key, old_record, new_record) -> None:
+        pass
+
+    def remove(self, primary_key, record) -> None:
+        pass
+
+def test_rows_are_the_records_each_call_changed(instrumented):
+    table = KeyTable(('Number',), KeySet(0, 10**6), concurrent=True)
+    listener = Interleaved(table)
+    table.add_listener(listener)
+    table.add_records(tuple((number,) for number in range(10)))
+    listener.thread.join()
+    table.remove_records(0, 1, 10**5)
+    table.restore_records((10**5,), ((7,),))
+    stats = instrumentation.stats()
+    assert stats['KeyTable.add_records']['calls'] == 2 and stats['KeyTable.add_records']['rows'] == 15
+    assert stats['KeyTable.remove_records']['rows'] == 2
+    assert stats['KeyTable.restore_records']['rows'] == 1
+
+def test_changed_records_are_counted_per_thread():
+    table = KeyTable(('Number',), KeySet(0, 10**6), concurrent=True)
+    start = threading.Barrier(4)
+    counts = list()
+
+    def add() -> None:
+        start.wait()
+        for number in range(50):
+            table.add_records(((number,), (number,), (number,)))
+        counts.append(table.changed_records)
+
+    threads = [threading.Thread(target=add) for count in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert counts == [150] * 4 and table.changed_records == 0
+
+def test_rows_of_a_concurrent_table_are_not_counted_from_the_records(instrumented, monkeypatch):
+    table = KeyTable(('Number',), KeySet(0, 10**6), concurrent=True)
+    table.add_records(tuple((number,) for number in range(10_000)))
+
+    def walk(records) -> int:
+        raise AssertionError('the records were counted')
+
+    monkeypatch.setattr(PagedRecords, '__len__', walk)
+    monkeypatch.setattr(RecordsSnapshot, '__len__', walk)
+    table.add_records((1,))
+    table.remove_records(5)
+    assert instrumentation.stats()['KeyTable.remove_records']['rows'] == 1
+
+def test_rows_of_a_table(instrumented):
+    table = Table(('Number',))
+    table.add_records((1,), (2,))
+    assert table.changed_records == 2
+    assert instrumentation.stats()['Table.add_records']['rows'] == 2
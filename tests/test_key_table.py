@@ -0,0 +1,15 @@
+from KeySet import KeySet
+from KeyTable import KeyTable
+import pytest
+
+@pytest.mark.parametrize('storage, concurrent', (('rows', False), ('rows', True), ('columns', False)))
+def test_a_key_table_freezes_to_its_records(storage, concurrent):
+    table = KeyTable(('Name', 'Count'), KeySet(0, 10**6), storage=storage, concurrent=concurrent)
+    table.add_records((('a', 1), ('b', 2), ('c', 3)))
+    table.remove_records(1)
+    frozen = table.freeze()
+    assert frozen == (('a', 1), ('c', 3)) and frozen[1]['Name'] == 'c'
+    table.add_records(('d', 4))
+    assert len(frozen) == 2 and len(table.freeze()) == 3
+    # the records live in the KeyTable's own store only
+    assert table._Table__records is None
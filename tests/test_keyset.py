@@ -0,0 +1,194 @@
+from KeySet import FreeIntervals, KeyBatches, KeySet, KeySetFull, KeyUnavailable, FailureToLowerMaximum
+import KeySet as key_set_module
+import contextlib
+import gc
+import io
+import pytest
+import random
+import threading
+
+@pytest.fixture
+def small_nodes(monkeypatch):
+    # small leaves and nodes, so that a few hundred intervals already split the tree several levels deep
+    monkeypatch.setattr(key_set_module, 'LEAF_SIZE', 4)
+    monkeypatch.setattr(key_set_module, 'NODE_SIZE', 4)
+
+def quietly_remove(key_set: KeySet, *keys: int) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        key_set.remove_key(*keys)
+
+class Model:
+    '''
+    A plain set of the used keys, which a KeySet must agree with.
+    '''
+    def __init__(self, minimum: int, maximum: int) -> None:
+        self.minimum, self.maximum = minimum, maximum
+        self.used = set()
+        self.next_key = minimum
+
+    def generate_new(self) -> int:
+        for key in list(range(self.next_key, self.maximum + 1)) + list(range(self.minimum, self.next_key)):
+            if key not in self.used:
+                self.used.add(key)
+                self.next_key = key + 1 if key < self.maximum else self.minimum
+                return key
+        raise KeySetFull()
+
+def test_generate_new_fills_in_order():
+    key_set = KeySet(0, 9)
+    assert [int(key_set.generate_new()) for count in range(10)] == list(range(10))
+    assert key_set.is_full()
+    with pytest.raises(KeySetFull):
+        key_set.generate_new()
+
+def test_generate_new_reuses_released_keys_after_wrapping():
+    key_set = KeySet(0, 9)
+    key_set.generate_many(10)
+    quietly_remove(key_set, 7, 2, 3)
+    assert [int(key_set.generate_new()) for count in range(3)] == [2, 3, 7]
+    assert list(key_set) == list(range(10))
+
+def test_random_operations_match_a_model(small_nodes):
+    rng = random.Random(7)
+    key_set = KeySet(0, 999)
+    model = Model(0, 999)
+    for step in range(3_000):
+        if rng.random() < 0.55 and len(model.used) < 1_000:
+            assert int(key_set.generate_new()) == model.generate_new()
+        else:
+            keys = [rng.randint(0, 999) for count in range(3)]
+            quietly_remove(key_set, *keys)
+            model.used.difference_update(keys)
+        assert len(key_set) == len(model.used)
+    assert list(key_set) == sorted(model.used)
+    assert all((key in key_set) == (key in model.used) for key in range(-1, 1_001))
+    assert key_set.smallest_key == min(model.used)
+    assert key_set.largest_key == max(model.used)
+    # the tree's intervals are exactly the gaps between the used keys
+    free = [key for key in range(1_000) if key not in model.used]
+    assert [key for start, end in key_set._free for key in range(start, end + 1)] == free
+
+def test_generate_many_takes_one_run_when_it_fits():
+    key_set = KeySet(0, 99)
+    key_set.reserve(range(10, 12))
+    key_set.next_key = 0
+    # [0...9] is too short for 20 keys, so the block comes from [12...31]
+    assert list(key_set.generate_many(20)) == list(range(12, 32))
+
+def test_generate_many_spans_runs_and_wraps():
+    key_set = KeySet(0, 19)
+    key_set.reserve(range(0, 20, 2))
+    key_set.next_key = 15
+    assert list(key_set.generate_many(5)) == [15, 17, 19, 1, 3]
+    with pytest.raises(KeySetFull):
+        key_set.generate_many(6)
+
+def test_reserve_requires_free_keys():
+    key_set = KeySet(0, 99)
+    assert list(key_set.reserve(range(5, 10))) == list(range(5, 10))
+    with pytest.raises(KeyUnavailable):
+        key_set.reserve(range(8, 12))
+    assert list(key_set) == list(range(5, 10))
+
+def test_bounds_resize_the_free_intervals():
+    key_set = KeySet(10, 20)
+    key_set.reserve((12, 15))
+    key_set.set_minimum_valid_key(5)
+    key_set.set_maximum_valid_key(30)
+    key_set.next_key = 5
+    assert [int(key_set.generate_new()) for count in range(3)] == [5, 6, 7]
+    with pytest.raises(FailureToLowerMaximum):
+        key_set.set_maximum_valid_key(14)
+    key_set.set_maximum_valid_key(15)
+    quietly_remove(key_set, 5, 6)
+    key_set.set_minimum_valid_key(7)
+    assert key_set.free_count() == 9 - 3
+    assert list(key_set._free) == [(8, 11), (13, 14)]
+
+def test_free_intervals_stay_ordered_through_splits(small_nodes):
+    rng = random.Random(3)
+    free = FreeIntervals()
+    expected = dict()
+    starts = rng.sample(range(0, 100_000, 10), 500)
+    for start in starts:
+        free.add(start, start + 4)
+        expected[start] = start + 4
+    for start in starts[::2]:
+        free.remove(start)
+        del expected[start]
+    for start in starts[1::4]:
+        free.replace(start, start + 1, start + 2)
+        expected[start + 1] = start + 2
+        del expected[start]
+    assert list(free) == sorted(expected.items())
+    assert len(free) == len(expected)
+    for probe in rng.sample(range(100_000), 200):
+        below = [start for start in expected if start <= probe]
+        assert free.floor(probe) == ((max(below), expected[max(below)]) if below else None)
+
+def test_key_batches_release_the_unused_keys():
+    key_set = KeySet(0, 10**6)
+    batches = KeyBatches(key_set, batch_size=100)
+    taken = list()
+
+    def take() -> None:
+        for count in range(5):
+            taken.extend(batches.take(7))
+        batches.release()
+
+    threads = [threading.Thread(target=take) for count in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len(taken) == len(set(taken)) == 140
+    assert sorted(key_set) == sorted(taken)
+
+def test_key_batches_return_the_keys_of_a_thread_that_ends():
+    key_set = KeySet(0, 10**6)
+    batches = KeyBatches(key_set, batch_size=100)
+    taken = list()
+    thread = threading.Thread(target=lambda: taken.extend(batches.take(7)))
+    thread.start()
+    thread.join()
+    del thread
+    gc.collect()
+    assert sorted(key_set) == sorted(taken) and len(taken) == 7
+
+def test_key_batches_close_returns_the_keys_of_every_thread():
+    key_set = KeySet(0, 10**6)
+    batches = KeyBatches(key_set, batch_size=100)
+    taken = list(batches.take(3))
+    started, stop = threading.Barrier(2), threading.Event()
+
+    def take() -> None:
+        taken.extend(batches.take(5))
+        started.wait()
+        stop.wait()
+
+    thread = threading.Thread(target=take)
+    thread.start()
+    started.wait()
+    assert len(key_set) == 200
+    batches.close()
+    assert sorted(key_set) == sorted(taken)
+    # a thread goes on with a new batch, and the keys it took stay taken
+    taken.extend(batches.take(2))
+    assert len(set(taken)) == 10 and len(key_set) == 108
+    stop.set()
+    thread.join()
+
+def test_removing_members_prints_nothing(capsys):
+    key_set = KeySet(0, 100)
+    key_set.reserve(range(50))
+    key_set.remove_key(*range(10))
+    assert capsys.readouterr().out == ''
+    assert sorted(key_set) == list(range(10, 50))
+
+def test_fragmented_allocation_scales():
+    # every other key is taken, so each new key comes from a different free interval; with O(n)
+    # interval updates this run is quadratic
+    size = 200_000
+    key_set = KeySet(0, 2 * size - 1)
+    key_set.reserve(range(1, 2 * size, 2))
+    key_set.next_key = 0
+    assert [int(key_set.generate_new()) for count in range(size)][-3:] == [2 * size - 6, 2 * size - 4, 2 * size - 2]
+    assert key_set.is_full()
@@ -0,0 +1,148 @@
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from KeySet import KeySet
+from KeyTable import KeyTable
+from datetime import date
+import gc
+import pytest
+import threading
+import time
+
+def asset(number: int) -> tuple:
+    return (f'Laptop-{number}', 'Recruiting', date(2020, 1, 1), Money(number), date(2024, 1, 1 + number % 28), Percent(0.1))
+
+def slowly(iterable):
+    '''
+    Yields from an iterable while giving the writer thread a turn and collecting garbage now and
+    then, which is when a snapshot that is no longer referenced would release its pages.
+    '''
+    for count, item in enumerate(iterable):
+        if count % 500 == 0:
+            gc.collect()
+            time.sleep(0.0005)
+        yield item
+
+class Writer:
+    '''
+    Adds batches of records to a table in another thread until stopped, or until it has added its limit.
+    '''
+    def __init__(self, table, make_record, batches: int = 500, size: int = 20) -> None:
+        self.table = table
+        self.make_record = make_record
+        self.batches = batches
+        self.size = size
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+    # END __init__()
+
+    def run(self) -> None:
+        for batch in range(self.batches):
+            if self.stopped.is_set():
+                return
+            self.table.add_records(tuple(self.make_record(batch) for record in range(self.size)))
+
+    def __enter__(self) -> 'Writer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+@pytest.mark.parametrize('concurrent', (False, True))
+def test_snapshot_iteration_survives_a_writer(concurrent):
+    table = KeyTable(('Number',), KeySet(0, 10**7), concurrent=concurrent)
+    table.add_records(tuple((number,) for number in range(5_000)))
+    with Writer(table, lambda batch: (batch,)):
+        for attempt in range(5):
+            # the snapshot is a temporary; only the iterator keeps its pages
+            assert sum(1 for record in slowly(table.snapshot().records.values())) >= 5_000
+            assert sum(1 for pair in slowly(table.snapshot().records.items())) >= 5_000
+
+def test_concurrent_reads_survive_a_writer():
+    table = KeyTable(('Number',), KeySet(0, 10**7), concurrent=True)
+    table.add_records(tuple((number,) for number in range(5_000)))
+    with Writer(table, lambda batch: (batch,)):
+        for attempt in range(3):
+            assert sum(1 for key in slowly(table.records)) >= 5_000
+            assert sum(1 for line in slowly(table.iter_lines())) >= 5_002
+            assert sum(1 for pair in slowly(table.query().items())) >= 5_000
+
+def test_export_survives_a_writer(tmp_path):
+    table = AssetManagementTable(KeySet(0, 10**7), concurrent=True)
+    table.add_records(tuple(asset(number) for number in range(5_000)))
+    with Writer(table, asset, batches=200):
+        table.write_table_to_txt_file(str(tmp_path), 'export')
+    with open(tmp_path / 'export.txt') as export:
+        assert sum(1 for line in export) >= 5_000
+
+def test_snapshot_is_isolated_from_later_changes():
+    table = KeyTable(('Number', 'Name'), KeySet(0, 10**6))
+    table.add_records(tuple((number, str(number)) for number in range(1_000)))
+    before = {primary_key: tuple(record) for primary_key, record in table.records.items()}
+    snapshot = table.snapshot()
+
+    table.add_records(tuple((number, 'new') for number in range(300)))
+    table.update_record(3, {'Name': 'changed'})
+    table.remove_records(*range(100, 400))
+
+    assert {primary_key: tuple(record) for primary_key, record in snapshot.records.items()} == before
+    assert len(snapshot) == 1_000
+    assert snapshot.retrieve_by_key(3)['Name'] == '3'
+    assert table.retrieve_by_key(3)['Name'] == 'changed'
+    assert snapshot.retrieve_by_key(150) is not None and table.retrieve_by_key(150) is None
+    assert len(snapshot.find('Name', '5')) == 1
+
+def test_pages_are_released_with_the_last_snapshot():
+    table = KeyTable(('Number',), KeySet(0, 10**6))
+    table.add_records(tuple((number,) for number in range(1_000)))
+    records = table._KeyTable__records
+    snapshot = table.snapshot()
+    iterator = snapshot.records.values()
+    next(iterator)
+    del snapshot
+    gc.collect()
+    # the iterator still holds the snapshot's pages
+    assert records.snapshots == 1
+    del iterator
+    gc.collect()
+    assert records.snapshots == 0
+
+def test_columnar_snapshot_is_a_copy():
+    table = KeyTable(('Number',), storage='columns')
+    table.add_records(((1,), (2,)))
+    snapshot = table.snapshot()
+    table.add_records((3,))
+    assert len(snapshot) == 2 and len(table.records) == 3
+
+def test_concurrent_reads_do_not_wait_for_the_writers():
+    table = AssetManagementTable(KeySet(0, 10**6), concurrent=True)
+    table.add_records(tuple(asset(number) for number in range(1_000)))
+    paused, release = threading.Event(), threading.Event()
+
+    def hold_writers() -> None:
+        with table.paused_writes():
+            paused.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold_writers)
+    holder.start()
+    try:
+        assert paused.wait(10)
+        reader = threading.Thread(target=lambda: (len(table.records), table.freeze(), str(table), table.snapshot()))
+        reader.start()
+        reader.join(10)
+        assert not reader.is_alive()
+    finally:
+        release.set()
+        holder.join()
+
+def test_concurrent_snapshots_see_each_change_whole():
+    table = KeyTable(('Number',), KeySet(0, 10**7), concurrent=True)
+    # each batch spans several pages of records
+    with Writer(table, lambda batch: (batch,), batches=2_000, size=700) as writer:
+        sizes = set()
+        while writer.thread.is_alive() and len(sizes) < 50:
+            sizes.add(len(table.snapshot()))
+            time.sleep(0)
+    assert len(sizes) > 1 and all(size % 700 == 0 for size in sizes)
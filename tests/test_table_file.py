@@ -0,0 +1,95 @@
+from AssetManagementTable import AssetManagementTable
+from AssetTypes import Money, Percent
+from KeySet import KeySet
+from KeyTable import KeyTable
+from TableFile import MAGIC, TableFileError, UnsupportedValue, decode_value, encode_value, load_table, open_table, save_table
+from datetime import date, datetime
+import json
+import pytest
+import struct
+
+def assets(count: int) -> tuple:
+    return tuple((f'Laptop-{number}', f'Location-{number % 3}', date(2018, 1, 1 + number % 28), Money(1_000 + number),
+                  date(2022, 1 + number % 12, 1), Percent(number / 100)) for number in range(count))
+
+def rewrite_header(file_name, change) -> None:
+    '''
+    Rewrites the JSON header of a table file in place, as a tampered file would have it.
+    '''
+    with open(file_name, 'r+b') as table_file:
+        table_file.seek(len(MAGIC))
+        length = struct.unpack('<I', table_file.read(4))[0]
+        header = json.loads(table_file.read(length))
+        change(header)
+        encoded = json.dumps(header).encode('utf-8')
+        assert len(encoded) <= length
+        table_file.seek(len(MAGIC) + 4)
+        table_file.write(encoded.ljust(length))
+
+@pytest.mark.parametrize('storage', ('rows', 'columns'))
+def test_asset_table_round_trip(tmp_path, storage):
+    table = AssetManagementTable(KeySet(0, 10**5), storage=storage)
+    table.add_records(assets(500))
+    table.remove_records(*range(100, 150))
+    table.create_index('Purchase Price', 'sorted')
+    file_name = str(tmp_path / 'assets.table')
+    save_table(table, file_name)
+
+    loaded = load_table(file_name)
+    assert type(loaded) is AssetManagementTable and loaded.storage == storage
+    assert dict(loaded.records.items()) == dict(table.records.items())
+    assert [type(value) for value in loaded.retrieve_by_key(3)] == [str, str, date, Money, date, Percent]
+    assert set(loaded.indexes) == set(table.indexes)
+    assert loaded.primary_key_set.next_key == table.primary_key_set.next_key
+    with open_table(file_name) as mapped:
+        assert sorted(mapped.keys_between('Purchase Price', Money(1_010), Money(1_020))) == list(range(10, 21))
+
+def test_object_columns_round_trip_without_pickle(tmp_path):
+    values = ['text', None, 7, 2**70, 1.5, True, date(2020, 2, 29), Money(12), Percent(0.25), '']
+    table = KeyTable(('Mixed', 'Name'), KeySet(0, 100))
+    table.add_records(tuple((value, None if number % 2 else f'name-{number}') for number, value in enumerate(values)))
+    file_name = str(tmp_path / 'mixed.table')
+    save_table(table, file_name)
+    with open_table(file_name) as mapped:
+        assert mapped.header['columns'][0]['kind'] == mapped.header['columns'][1]['kind'] == 'object'
+        loaded = [mapped.retrieve_by_key(primary_key) for primary_key in mapped]
+    assert [record['Mixed'] for record in loaded] == values
+    assert [type(record['Mixed']) for record in loaded] == list(map(type, values))
+    assert [record['Name'] for record in loaded] == [None if number % 2 else f'name-{number}' for number in range(len(values))]
+
+def test_value_codec():
+    for value in (None, False, -3, 1.25, 'é', date(1, 1, 1), Money(-5), Percent(1.0)):
+        decoded = decode_value(memoryview(encode_value(value)))
+        assert decoded == value and type(decoded) is type(value)
+    assert encode_value(datetime(2020, 1, 1)) is None
+    assert encode_value(object()) is None
+
+def test_unsupported_values_are_not_saved(tmp_path):
+    table = KeyTable(('When',), KeySet(0, 100))
+    table.add_records(((datetime(2020, 1, 1, 12),), (date(2020, 1, 1),)))
+    with pytest.raises(UnsupportedValue):
+        save_table(table, str(tmp_path / 'when.table'))
+    assert not (tmp_path / 'when.table').exists()
+
+def test_a_subclass_is_saved_as_the_class_it_inherits_from(tmp_path):
+    class Inventory(KeyTable):
+        pass
+    table = Inventory(('Name',), KeySet(0, 100))
+    table.add_records((('a',), ('b',)))
+    save_table(table, str(tmp_path / 'inventory.table'))
+    loaded = load_table(str(tmp_path / 'inventory.table'))
+    assert type(loaded) is KeyTable and list(loaded.column('Name')) == ['a', 'b']
+
+@pytest.mark.parametrize('change', (
+    lambda header: header.update(table_class='os:system'),
+    lambda header: header['columns'][3].update(type='subprocess:Popen'),
+    lambda header: header.update(version=1),
+))
+def test_a_tampered_header_is_refused(tmp_path, change):
+    table = AssetManagementTable(KeySet(0, 100))
+    table.add_records(assets(5))
+    file_name = str(tmp_path / 'assets.table')
+    save_table(table, file_name)
+    rewrite_header(file_name, change)
+    with pytest.raises(TableFileError):
+        load_table(file_name)